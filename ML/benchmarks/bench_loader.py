@@ -0,0 +1,95 @@
+"""Benchmark the whole-file dataset loader against the chunked streaming one.
+
+Run from the ML directory:
+    python -m benchmarks.bench_loader --rows 5000000
+
+Generates a synthetic main dataset of about --rows rows (see
+dataset/dataset.py) unless --main is given, then loads it in a fresh
+process per mode so peak RSS is not shared between them:
+
+    whole       one pd.read_csv with type inference (the original loader)
+    chunked     chunked reads with explicit dtypes, concatenated in memory
+    partitions  chunked reads streamed into a partition store (build only)
+    pair        reading one commodity's partitions back from that store
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+from src.training.profiler import peak_rss_mb, reset_peak_rss
+
+MODES = ["whole", "chunked", "partitions", "pair"]
+
+
+def run_mode(mode, main_path, partitions_dir, chunk_rows, result):
+    from src.training.train_model import ModelTrainer
+
+    reset_peak_rss()
+    baseline = peak_rss_mb()
+    # main dataset only: an empty warehouse path is skipped as missing
+    trainer = ModelTrainer(main_path=main_path, warehouse_path="",
+                           partitions_dir=partitions_dir if mode in ("partitions", "pair") else None)
+    start = time.perf_counter()
+    if mode == "whole":
+        rows = len(trainer.load_and_prepare(chunk_rows=None))
+    elif mode == "chunked":
+        rows = len(trainer.load_and_prepare(chunk_rows=chunk_rows))
+    elif mode == "partitions":
+        store = trainer.build_partitions(chunk_rows, force=True)
+        rows = sum(p["rows"] for p in store.partitions())
+    else:
+        rows = len(trainer.load_and_prepare(commodities=["Onion"]))
+    result.put((time.perf_counter() - start, rows, baseline, peak_rss_mb()))
+
+
+def measure(mode, main_path, partitions_dir, chunk_rows):
+    ctx = multiprocessing.get_context("spawn")
+    result = ctx.Queue()
+    proc = ctx.Process(target=run_mode, args=(mode, main_path, partitions_dir, chunk_rows, result))
+    proc.start()
+    seconds, rows, baseline, peak = result.get()
+    proc.join()
+    return seconds, rows, baseline, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=2_000_000,
+                        help="approximate size of the generated dataset")
+    parser.add_argument("--main", default=None, help="existing main dataset CSV instead of generating one")
+    parser.add_argument("--chunk-rows", type=int, default=250_000)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        main_path = args.main
+        if main_path is None:
+            sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                            "dataset"))
+            import dataset
+
+            main_path = os.path.join(tmp, "commodity_dataset.csv")
+            pairs_per_day = len(dataset.COMMODITIES) * 100
+            dataset.generate_data(n_markets=100, days=max(1, args.rows // pairs_per_day), seed=0,
+                                  output_file=main_path)
+        partitions_dir = os.path.join(tmp, "partitions")
+        size_mb = os.path.getsize(main_path) / (1024 * 1024)
+
+        print(f"\n{main_path} ({size_mb:.0f} MB)")
+        print(f"{'mode':>11} {'rows':>10} {'seconds':>9} {'peak_rss_mb':>12} {'over_baseline_mb':>17}")
+        for mode in args.modes:
+            if mode == "pair" and not os.path.exists(partitions_dir):
+                measure("partitions", main_path, partitions_dir, args.chunk_rows)
+            seconds, rows, baseline, peak = measure(mode, main_path, partitions_dir, args.chunk_rows)
+            if peak is None or baseline is None:
+                # no peak RSS counter on this platform
+                print(f"{mode:>11} {rows:>10} {seconds:9.2f} {'-':>12} {'-':>17}")
+            else:
+                print(f"{mode:>11} {rows:>10} {seconds:9.2f} {peak:12.0f} {peak - baseline:17.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Benchmark per-pair masked preparation against the grouped pass.
+
+Run from the ML directory:
+    python -m benchmarks.bench_prepare --scales 1 10 100
+
+Scaled datasets replicate the prepared frame under renamed markets, so
+both rows and commodity/market pairs grow with the scale factor. The
+masked path is O(pairs x rows); use --masked-max-scale to skip it on
+large inputs.
+"""
+import argparse
+import time
+
+import pandas as pd
+
+from src.training.train_model import ModelTrainer
+
+MAIN_DATA_PATH = "dataset/commodity_dataset.csv"
+WAREHOUSE_DATA_PATH = "dataset/sih_warehouse_data_1400.csv"
+
+
+def scale_frame(df, factor):
+    if factor == 1:
+        return df
+    copies = []
+    for i in range(factor):
+        part = df.copy()
+        part['market'] = part['market'].astype(str) + f"_{i}"
+        copies.append(part)
+    return pd.concat(copies, ignore_index=True).sort_values('date').reset_index(drop=True)
+
+
+def time_iterator(iterator):
+    start = time.perf_counter()
+    prepared = sum(1 for item in iterator if item[3] is not None)
+    return time.perf_counter() - start, prepared
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--masked-max-scale", type=int, default=10,
+                        help="largest scale at which the masked path is also timed")
+    args = parser.parse_args()
+
+    trainer = ModelTrainer(main_path=MAIN_DATA_PATH, warehouse_path=WAREHOUSE_DATA_PATH)
+    base = trainer.load_and_prepare()
+
+    print(f"{'scale':>6} {'rows':>10} {'pairs':>7} {'masked_s':>10} {'grouped_s':>10} {'speedup':>8}")
+    for factor in args.scales:
+        df = scale_frame(base, factor)
+        pairs = df.groupby(['commodity', 'market']).ngroups
+
+        grouped_s, _ = time_iterator(trainer.iter_prepared_pairs(df))
+        if factor <= args.masked_max_scale:
+            masked_s, _ = time_iterator(trainer.iter_prepared_pairs_masked(df))
+            speedup = f"{masked_s / grouped_s:7.1f}x"
+            masked = f"{masked_s:10.2f}"
+        else:
+            masked, speedup = f"{'skipped':>10}", f"{'-':>8}"
+        print(f"{factor:>6} {len(df):>10} {pairs:>7} {masked} {grouped_s:10.2f} {speedup}")
+
+
+if __name__ == "__main__":
+    main()
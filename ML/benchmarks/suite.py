@@ -0,0 +1,292 @@
+"""Benchmark suite for training, model loading, prediction and the API.
+
+Run from the ML directory:
+    python -m benchmarks.suite                       # everything
+    python -m benchmarks.suite -k forecast -k api    # names containing either
+    python -m benchmarks.suite --compare base.json new.json
+
+Each case is timed `--repeat` times after one warm-up call (fewer for the
+slow Prophet fit) and the min/median/mean/max are written to
+benchmarks/results/<commit>-<timestamp>.json together with the machine
+and package versions, so runs can be compared over time with --compare.
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+from datetime import datetime
+
+import joblib
+
+ML_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ML_DIR, "benchmarks", "results")
+MAIN_DATA_PATH = os.path.join(ML_DIR, "dataset", "commodity_dataset.csv")
+MODELS_DIR = os.path.join(ML_DIR, "saved_models")
+
+PREPARE_MARKETS = [4, 40, 400]      # dataset scales: markets x 22 commodities x 400 days
+FORECAST_HORIZONS = [7, 15, 90]
+LOAD_MODELS = 20                    # model files loaded per model_load call
+FIT_PAIR = ("Onion", "Azadpur_APMC")
+PREDICT_PAIR = {"commodity": "Onion", "market": "Azadpur APMC"}
+
+
+class Case:
+    """One timed call; `setup` runs untimed before every call."""
+
+    def __init__(self, name, func, setup=None, repeat=None, **info):
+        self.name = name
+        self.func = func
+        self.setup = setup
+        self.repeat = repeat
+        self.info = info
+
+
+# ---------- scenarios ----------
+def prepare_cases(tmp):
+    sys.path.insert(0, os.path.join(ML_DIR, "dataset"))
+    import dataset
+    from src.training.train_model import ModelTrainer
+
+    cases = []
+    for n_markets in PREPARE_MARKETS:
+        path = os.path.join(tmp, f"dataset_{n_markets}.csv")
+        rows = dataset.generate_data(n_markets=n_markets, seed=0, output_file=path)
+        trainer = ModelTrainer(main_path=path, warehouse_path="")
+        cases.append(Case(f"prepare[{n_markets}_markets]", trainer.load_and_prepare,
+                          repeat=3 if n_markets >= 100 else None, rows=rows))
+    return cases
+
+
+def fit_cases(tmp):
+    from src.training.pooled_trainer import PooledTrainer
+    from src.training.train_model import ModelTrainer
+
+    # Prophet and Stan log every fit (cmdstanpy resets its level lazily)
+    for name in ("prophet", "cmdstanpy"):
+        logging.getLogger(name).disabled = True
+
+    trainer = ModelTrainer(main_path=MAIN_DATA_PATH, warehouse_path="")
+    commodity, market = FIT_PAIR
+    df = trainer.load_and_prepare(commodities=[commodity], markets=[market])
+    merged, reason = trainer.prepare_pair(df, commodity, market)
+    if merged is None:
+        raise RuntimeError(reason)
+
+    def fit():
+        trainer.build_model(len(merged)).fit(merged[['ds', 'y', 'buffer_stock_qty_kg']])
+
+    # one pooled model over every pair of the same dataset
+    pooled_trainer = PooledTrainer(trainer)
+    series = list(pooled_trainer.prepared_series(trainer.load_and_prepare()))
+    return [
+        Case("fit_pair", fit, repeat=3, rows=len(merged)),
+        Case(f"fit_pooled[{len(series)}_pairs]", lambda: pooled_trainer.fit(series), repeat=3,
+             rows=sum(len(frame) for _, _, frame in series)),
+    ]
+
+
+def model_files():
+    paths = sorted(glob.glob(os.path.join(MODELS_DIR, "*.pkl")))
+    if not paths:
+        raise RuntimeError(f"No .pkl models in {MODELS_DIR}")
+    return paths
+
+
+def model_load_cases(tmp):
+    paths = model_files()[:LOAD_MODELS]
+
+    def load_all():
+        for path in paths:
+            joblib.load(path)
+    return [Case(f"model_load[{len(paths)}_pickles]", load_all, models=len(paths))]
+
+
+def forecast_cases(tmp):
+    from src.prediction.baseline import BaselineForecaster
+    from src.prediction.fast_predict import load_fast_predictor
+    from src.prediction.forecast import make_forecast
+    from src.storage.price_store import PriceStore
+
+    model = None
+    for path in model_files():
+        candidate = joblib.load(path)
+        if getattr(candidate, "history", None) is not None and make_forecast(candidate, 1) is not None:
+            model = candidate
+            break
+    if model is None:
+        raise RuntimeError(f"No usable fitted model in {MODELS_DIR}")
+    fast = load_fast_predictor(model)
+
+    # statistical baseline over the price history of every series
+    store = PriceStore(os.path.join(tmp, "baseline_prices.csv"))
+    with open(MAIN_DATA_PATH, "rb") as src, open(store.csv_path, "wb") as dst:
+        dst.write(src.read())
+    store.refresh()
+    baseline = BaselineForecaster()
+    baseline.attach(store)
+    baseline_model = baseline.predictor(PREDICT_PAIR["commodity"], PREDICT_PAIR["market"])
+
+    cases = [Case(f"baseline_fit[{len(baseline.commodities)}_series]", lambda: baseline.fit(store))]
+    for days in FORECAST_HORIZONS:
+        cases.append(Case(f"make_forecast[prophet-{days}d]", lambda d=days: make_forecast(model, d)))
+        if fast is not None:
+            cases.append(Case(f"make_forecast[fast-{days}d]", lambda d=days: make_forecast(fast, d)))
+        cases.append(Case(f"make_forecast[baseline-{days}d]", lambda d=days: baseline_model.forecast(d)))
+    return cases
+
+
+def api_cases(tmp):
+    from src.prediction import forecast_flask
+
+    forecast_flask.MODELS_DIR = MODELS_DIR
+    forecast_flask.CSV_FILE_PATH = os.path.join(tmp, "api_commodities.csv")
+    with open(MAIN_DATA_PATH, "rb") as src, open(forecast_flask.CSV_FILE_PATH, "wb") as dst:
+        dst.write(src.read())
+    client = forecast_flask.app.test_client()
+
+    def request(method, url, **kwargs):
+        def call():
+            response = client.open(url, method=method, **kwargs)
+            if response.status_code != 200:
+                raise RuntimeError(f"{method} {url} -> {response.status_code}")
+            return response.get_data()
+        return call
+
+    def cold_models():
+        forecast_flask.model_cache.invalidate()
+
+    def cold_responses():
+        with forecast_flask._response_cache_lock:
+            forecast_flask._response_cache.clear()
+
+    predict = request("POST", "/predict", json=dict(PREDICT_PAIR, days=7))
+    commodities = request("GET", "/api/commodities")
+    filtered = request("GET", "/api/commodities?commodity=Onion&fields=date,modal_price&limit=500")
+    return [
+        Case("api_predict[warm]", predict),
+        Case("api_predict[cold_model]", predict, setup=cold_models),
+        Case("api_commodities[all]", commodities, setup=cold_responses),
+        Case("api_commodities[all_cached]", commodities),
+        Case("api_commodities[filtered]", filtered, setup=cold_responses),
+    ]
+
+
+SCENARIOS = [
+    ("prepare", prepare_cases),
+    ("fit", fit_cases),
+    ("model_load", model_load_cases),
+    ("forecast", forecast_cases),
+    ("api", api_cases),
+]
+
+
+# ---------- running ----------
+def time_case(case, repeat):
+    if case.setup:
+        case.setup()
+    case.func()  # warm-up
+    times = []
+    for _ in range(case.repeat or repeat):
+        if case.setup:
+            case.setup()
+        start = time.perf_counter()
+        case.func()
+        times.append(time.perf_counter() - start)
+    return {
+        "repeat": len(times),
+        "min": min(times),
+        "median": statistics.median(times),
+        "mean": statistics.fmean(times),
+        "max": max(times),
+        **case.info,
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ML_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = "unknown"
+    packages = {}
+    for name in ("numpy", "pandas", "prophet", "flask"):
+        try:
+            packages[name] = __import__(name).__version__
+        except (ImportError, AttributeError):
+            packages[name] = None
+    return {
+        "commit": commit,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "packages": packages,
+    }
+
+
+def run(patterns, repeat):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for scenario, make_cases in SCENARIOS:
+            if patterns and not any(p in scenario for p in patterns):
+                continue
+            try:
+                cases = make_cases(tmp)
+            except Exception as e:
+                print(f"⚠️ Skipping {scenario}: {e}")
+                continue
+            for case in cases:
+                results[case.name] = time_case(case, repeat)
+                r = results[case.name]
+                print(f"{case.name:<36} {r['median'] * 1000:11.2f} ms  (min {r['min'] * 1000:.2f}, n={r['repeat']})")
+    return results
+
+
+def compare(base_path, new_path):
+    with open(base_path) as f:
+        base = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{'case':<36} {base['environment']['commit']:>12} {new['environment']['commit']:>12} {'ratio':>7}")
+    for name in sorted(set(base["results"]) | set(new["results"])):
+        old = base["results"].get(name, {}).get("median")
+        cur = new["results"].get(name, {}).get("median")
+        fmt = lambda v: f"{v * 1000:10.2f}ms" if v is not None else f"{'-':>12}"
+        ratio = f"{cur / old:6.2f}x" if old and cur else f"{'-':>7}"
+        print(f"{name:<36} {fmt(old)} {fmt(cur)} {ratio}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-k", dest="patterns", action="append", default=[],
+                        help="only scenarios whose name contains this (repeatable)")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--output", default=None, help="result file (default: benchmarks/results/...)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="compare two result files")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    warnings.filterwarnings("ignore")
+    env = environment()
+    results = run(args.patterns, args.repeat)
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{env['commit']}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"environment": env, "results": results}, f, indent=2)
+    print(f"✅ Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
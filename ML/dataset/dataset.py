@@ -1,7 +1,6 @@
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-import random
 import os
 
 # --- CONFIGURATION ---
@@ -43,87 +42,178 @@ MARKETS = [
     {"state": "Uttar Pradesh", "district": "Lucknow", "market": "Dubagga Mandi"}
 ]
 
-def generate_data():
-    if not os.path.exists("dataset"):
-        os.makedirs("dataset")
+# --- 3. SYNTHETIC MARKETS FOR LOAD TESTING ---
+# Centres beyond the real markets above are spread over these states
+EXTRA_STATES = [
+    "Andhra Pradesh", "Assam", "Bihar", "Gujarat", "Haryana", "Kerala", "Madhya Pradesh",
+    "Odisha", "Punjab", "Rajasthan", "Tamil Nadu", "Telangana", "West Bengal"
+]
+VOLATILE_COMMODITIES = ["Onion", "Tomato", "Potato"]
+DAYS_TO_GENERATE = 400
+CHUNK_ROWS = 1_000_000
+COLUMNS = ["commodity", "variety", "grade", "min_price", "modal_price", "max_price",
+           "date", "state", "district", "market", "buffer_stock_qty_kg"]
 
-    data = []
-    end_date = datetime.now()
-    # We go back ~1.5 years to ensure we cross 14,000 rows with good history
-    days_to_generate = 400 
-    start_date = end_date - timedelta(days=days_to_generate)
-    
-    print(f"🚀 Generating dataset for {len(COMMODITIES)} commodities across {len(MARKETS)} markets...")
-
-    for day in range(days_to_generate):
-        curr_date = start_date + timedelta(days=day)
-        date_str = curr_date.strftime("%Y-%m-%d")
-        
-        # Seasonality Factor (Sine wave to simulate yearly price trends)
-        day_of_year = curr_date.timetuple().tm_yday
+
+def build_markets(n_markets=len(MARKETS)):
+    """The real APMC markets followed by synthetic centres up to `n_markets`."""
+    markets = list(MARKETS[:n_markets])
+    for i in range(len(markets), n_markets):
+        state = EXTRA_STATES[i % len(EXTRA_STATES)]
+        markets.append({"state": state, "district": f"District {i:04d}", "market": f"Centre {i:04d} APMC"})
+    return markets
+
+
+def build_commodities(names=None):
+    """COMMODITIES restricted to `names` (all when None), in definition order."""
+    if names is None:
+        return dict(COMMODITIES)
+    unknown = [n for n in names if n not in COMMODITIES]
+    if unknown:
+        raise ValueError(f"Unknown commodities: {unknown}")
+    return {n: d for n, d in COMMODITIES.items() if n in names}
+
+
+def _categorical(values, codes):
+    """Categorical of values[codes] without materializing the strings."""
+    value_codes, categories = pd.factorize(pd.Series(values))
+    return pd.Categorical.from_codes(value_codes[codes], categories)
+
+
+def generate_chunks(markets, commodities, days, start_date, rng, chunk_rows=CHUNK_ROWS):
+    """Yield DataFrames of whole days, about `chunk_rows` rows each.
+
+    Rows of a day are ordered market x commodity, and every value follows
+    the same relationships as the original per-row loop: yearly sine
+    seasonality (30% for volatile vegetables, 10% otherwise), 5%/year
+    inflation, 5% Gaussian noise, a 50% price floor, min/max spreads and a
+    buffer stock that falls as the price rises.
+    """
+    names = list(commodities)
+    base = np.array([commodities[n]["base"] for n in names], dtype=float)
+    amplitude = np.where(np.isin(names, VOLATILE_COMMODITIES), 0.3, 0.1) * base
+    n_pairs = len(markets) * len(names)
+    days_per_chunk = max(1, chunk_rows // max(n_pairs, 1))
+
+    # per (market, commodity) pair
+    pair_commodity = np.tile(np.arange(len(names)), len(markets))
+    pair_market = np.repeat(np.arange(len(markets)), len(names))
+    pair_base = base[pair_commodity]
+    pair_amplitude = amplitude[pair_commodity]
+
+    start = np.datetime64(start_date.date(), 'D')
+    for first_day in range(0, days, days_per_chunk):
+        day_index = np.arange(first_day, min(days, first_day + days_per_chunk))
+        dates = start + day_index.astype('timedelta64[D]')
+        n_days = len(day_index)
+        shape = (n_days, n_pairs)
+
+        # 1-2. Base price + seasonality (sine over the day of year)
+        day_of_year = (dates - dates.astype('datetime64[Y]')).astype(int) + 1
         season_factor = np.sin(2 * np.pi * day_of_year / 365)
+        variation = season_factor[:, None] * pair_amplitude
+        # 3. Inflation (prices go up slightly over time)
+        inflation = (day_index[:, None] / 365) * (pair_base * 0.05)
+        # 4. Random daily noise (supply/demand shocks)
+        noise = rng.standard_normal(shape) * (pair_base * 0.05)
+
+        modal_price = np.round(np.maximum(pair_base * 0.5, pair_base + variation + inflation + noise), 2)
+        min_price = np.round(modal_price * rng.uniform(0.90, 0.95, shape), 2)
+        max_price = np.round(modal_price * rng.uniform(1.05, 1.10, shape), 2)
 
-        for mkt in MARKETS:
-            for name, details in COMMODITIES.items():
-                
-                # 1. Base Price Calculation
-                base = details["base"]
-                
-                # 2. Add Seasonality (Onion/Tomato fluctuate more)
-                if name in ["Onion", "Tomato", "Potato"]:
-                    variation = season_factor * (base * 0.3) # 30% variation
-                else:
-                    variation = season_factor * (base * 0.1) # 10% variation (stable crops)
-                
-                # 3. Add Inflation (Prices go up slightly over time)
-                inflation = (day / 365) * (base * 0.05)
-                
-                # 4. Random Daily Noise (Supply/Demand shocks)
-                noise = np.random.normal(0, base * 0.05)
-                
-                # Calculate Modal Price
-                modal_price = base + variation + inflation + noise
-                modal_price = max(details["base"] * 0.5, modal_price) # Can't drop too low
-                modal_price = round(modal_price, 2)
-                
-                # Min and Max Prices relative to Modal
-                min_price = round(modal_price * random.uniform(0.90, 0.95), 2)
-                max_price = round(modal_price * random.uniform(1.05, 1.10), 2)
-
-                # 5. Buffer Stock Logic (Crucial for your ML Model)
-                # When stock is HIGH, Price is LOW (Inverse relationship)
-                # Base stock ~5000 tonnes +/- random
-                stock_impact = (base - modal_price) * 100 # If price is high, stock is likely low
-                buffer_stock = int(5000 + stock_impact + random.randint(-500, 500))
-                buffer_stock = max(0, buffer_stock)
-
-                row = {
-                    "commodity": name,
-                    "variety": details["variety"],
-                    "grade": "FAQ", # Fair Average Quality
-                    "min_price": min_price,
-                    "modal_price": modal_price,
-                    "max_price": max_price,
-                    "date": date_str,
-                    "state": mkt["state"],
-                    "district": mkt["district"],
-                    "market": mkt["market"],
-                    "buffer_stock_qty_kg": buffer_stock
-                }
-                data.append(row)
-
-    # Convert to DataFrame
-    df = pd.DataFrame(data)
-    
-    # Shuffle rows so it looks like real collected data
-    df = df.sample(frac=1).reset_index(drop=True)
-    
-    print(f"📊 Generated {len(df)} rows.")
-    
-    # Save
-    df.to_csv(OUTPUT_FILE, index=False)
-    print(f"✅ Saved to: {OUTPUT_FILE}")
+        # 5. Buffer stock: high price -> low stock
+        stock_impact = (pair_base - modal_price) * 100
+        buffer_stock = np.maximum(0, np.trunc(5000 + stock_impact + rng.integers(-500, 501, shape)))
+
+        rows = np.tile(np.arange(n_pairs), n_days)
+        row_commodity = pair_commodity[rows]
+        row_market = pair_market[rows]
+        yield pd.DataFrame({
+            "commodity": _categorical(names, row_commodity),
+            "variety": _categorical([commodities[n]["variety"] for n in names], row_commodity),
+            "grade": "FAQ",  # Fair Average Quality
+            "min_price": min_price.ravel(),
+            "modal_price": modal_price.ravel(),
+            "max_price": max_price.ravel(),
+            "date": pd.Categorical.from_codes(np.repeat(np.arange(n_days), n_pairs),
+                                              np.datetime_as_string(dates, unit='D')),
+            "state": _categorical([m["state"] for m in markets], row_market),
+            "district": _categorical([m["district"] for m in markets], row_market),
+            "market": _categorical([m["market"] for m in markets], row_market),
+            "buffer_stock_qty_kg": buffer_stock.ravel().astype(np.int64),
+        }, columns=COLUMNS)
+
+
+def generate_data(n_markets=len(MARKETS), commodities=None, days=DAYS_TO_GENERATE, seed=None,
+                  output_file=OUTPUT_FILE, chunk_rows=CHUNK_ROWS, shuffle=True):
+    """Generate the dataset and stream it to `output_file` (.csv or .parquet).
+
+    Memory is bounded by `chunk_rows`. With `shuffle`, rows are shuffled
+    across the whole file when it fits in one chunk and within each chunk
+    otherwise. Returns the number of rows written.
+    """
+    out_dir = os.path.dirname(output_file)
+    if out_dir and not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+
+    markets = build_markets(n_markets)
+    selected = build_commodities(commodities)
+    rng = np.random.default_rng(seed)
+    end_date = datetime.now()
+    # Default ~400 days (~1.1 years) of history per pair
+    start_date = end_date - timedelta(days=days)
+    parquet = output_file.endswith(".parquet")
+
+    print(f"🚀 Generating dataset for {len(selected)} commodities across {len(markets)} markets, {days} days...")
+
+    writer = None
+    total = 0
+    for i, chunk in enumerate(generate_chunks(markets, selected, days, start_date, rng, chunk_rows)):
+        if shuffle:
+            # Shuffle rows so it looks like real collected data
+            chunk = chunk.take(rng.permutation(len(chunk))).reset_index(drop=True)
+        if parquet:
+            writer = _write_parquet_chunk(writer, output_file, chunk)
+        else:
+            chunk.to_csv(output_file, mode="w" if i == 0 else "a", header=(i == 0), index=False)
+        total += len(chunk)
+    if writer is not None:
+        writer.close()
+
+    print(f"📊 Generated {total} rows.")
+    print(f"✅ Saved to: {output_file}")
     print("👉 Now run 'python -m src.training.train_model' to re-train your AI with this new data!")
+    return total
+
+
+def _write_parquet_chunk(writer, output_file, chunk):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Parquet output needs pyarrow: pip install pyarrow")
+    # plain strings keep the schema identical across chunks
+    table = pa.Table.from_pandas(chunk.astype({c: str for c in chunk.select_dtypes("category")}),
+                                 preserve_index=False)
+    if writer is None:
+        writer = pq.ParquetWriter(output_file, table.schema)
+    writer.write_table(table)
+    return writer
+
 
 if __name__ == "__main__":
-    generate_data()
\ No newline at end of file
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generate synthetic commodity price data")
+    parser.add_argument("--markets", type=int, default=len(MARKETS),
+                        help="number of market centres (first %d are real APMCs)" % len(MARKETS))
+    parser.add_argument("--commodities", nargs="+", default=None, help="subset of commodity names")
+    parser.add_argument("--days", type=int, default=DAYS_TO_GENERATE)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output", default=OUTPUT_FILE, help="output .csv or .parquet file")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--no-shuffle", action="store_true")
+    args = parser.parse_args()
+
+    generate_data(n_markets=args.markets, commodities=args.commodities, days=args.days, seed=args.seed,
+                  output_file=args.output, chunk_rows=args.chunk_rows, shuffle=not args.no_shuffle)
@@ -0,0 +1,367 @@
+import math
+import threading
+from collections import deque
+
+import numpy as np
+
+from src.preprocessing.keys import commodity_key, market_key
+from src.storage.price_store import NO_DATE
+
+VALUE_COLUMN = "modal_price"
+STOCK_COLUMN = "buffer_stock_qty_kg"
+LEVELS = ("green", "yellow", "red")     # Stable, Watch, High Volatility
+EWMA_ALPHA = 0.2
+VOLATILITY_WINDOW = 14      # daily returns in the rolling standard deviation
+MIN_RETURNS = 5             # fewer returns give no volatility yet
+# alert thresholds: rolling std of daily returns, and percent outside the forecast band
+YELLOW_VOLATILITY = 0.05
+RED_VOLATILITY = 0.10
+RED_DEVIATION = 15.0
+# band around the forecast when it has no yhat_lower / yhat_upper
+BAND_PCT = 0.10
+BAND_DAYS = 15
+# once a pair's band has run out, ask for a new forecast at most this often
+BAND_RETRY_DAYS = 7
+# a full reload replays each pair's last days only: enough for the window
+# and for the EWMA to forget its start (0.8^45 < 0.01%)
+REPLAY_DAYS = 45
+MAX_CHANGES = 1000
+
+
+class PairAlert:
+    """Streaming statistics and alert state of one commodity/market series.
+
+    Prices are daily: rows for the day already being tracked are averaged
+    into it, and that day's return and EWMA step are redone, so every row
+    costs O(1) however it arrives.
+    """
+
+    __slots__ = ("commodity", "market", "day", "price", "day_sum", "day_count", "prev_price",
+                 "ewma", "prev_ewma", "returns", "return_sum", "return_sq", "stock",
+                 "band", "band_checked", "volatility", "deviation", "level", "since", "action")
+
+    def __init__(self, commodity, market):
+        self.commodity, self.market = commodity, market
+        self.day = self.price = self.prev_price = None
+        self.day_sum, self.day_count = 0.0, 0
+        self.ewma = self.prev_ewma = None
+        self.returns = deque()
+        self.return_sum = self.return_sq = 0.0
+        self.stock = None
+        # (first day, lower, upper) of the pair's forecast band, or None
+        self.band = None
+        self.band_checked = None
+        self.volatility = self.deviation = None
+        self.level, self.since, self.action = "green", None, "hold"
+
+    def observe(self, day, price, stock=None):
+        """Fold one price row in. Returns False for rows older than the
+        current day (late history does not rewrite streaming state)."""
+        if self.day is not None and day < self.day:
+            return False
+        if self.day is None or day > self.day:
+            self.prev_price, self.prev_ewma = self.price, self.ewma
+            self.day, self.day_sum, self.day_count = day, 0.0, 0
+        elif self.prev_price is not None:
+            self._drop_return()     # the day's price changes: redo its return
+
+        self.day_sum += price
+        self.day_count += 1
+        self.price = self.day_sum / self.day_count
+        if self.prev_price is not None:
+            self._add_return(self.price / self.prev_price - 1)
+        self.ewma = self.price if self.prev_ewma is None else \
+            EWMA_ALPHA * self.price + (1 - EWMA_ALPHA) * self.prev_ewma
+        if stock is not None:
+            self.stock = stock
+
+        n = len(self.returns)
+        if n >= MIN_RETURNS:
+            variance = (self.return_sq - self.return_sum ** 2 / n) / (n - 1)
+            self.volatility = math.sqrt(max(variance, 0.0))
+        else:
+            self.volatility = None
+        return True
+
+    def _add_return(self, value):
+        if len(self.returns) == VOLATILITY_WINDOW:
+            old = self.returns.popleft()
+            self.return_sum -= old
+            self.return_sq -= old * old
+        self.returns.append(value)
+        self.return_sum += value
+        self.return_sq += value * value
+
+    def _drop_return(self):
+        old = self.returns.pop()
+        self.return_sum -= old
+        self.return_sq -= old * old
+
+    def band_at(self, day):
+        """(lower, upper) expected for `day`, or None outside the band."""
+        if self.band is None:
+            return None
+        first, lower, upper = self.band
+        i = day - first
+        return (lower[i], upper[i]) if 0 <= i < len(lower) else None
+
+    def as_dict(self):
+        return {
+            "commodity": self.commodity,
+            "market": self.market,
+            "level": self.level,
+            "since": _date(self.since),
+            "action": self.action,
+            "date": _date(self.day),
+            "price": self.price,
+            "ewma": self.ewma,
+            "volatility_pct": None if self.volatility is None else self.volatility * 100,
+            "band_deviation_pct": self.deviation,
+            "buffer_stock_qty_kg": self.stock,
+        }
+
+
+class AlertEngine:
+    """Red/yellow/green volatility alerts per commodity/market, kept up to
+    date row by row.
+
+    Each pair keeps an EWMA of its daily price, a rolling standard deviation
+    of daily returns over VOLATILITY_WINDOW days (running sums over a
+    bounded window) and the percent by which the price lies outside its
+    forecast band, so an appended row updates its pair in O(1) and reading
+    a pair's state is a dict lookup.
+
+    A pair is red at RED_VOLATILITY or when its price is RED_DEVIATION
+    percent outside the band, yellow at YELLOW_VOLATILITY or anywhere
+    outside the band, green otherwise. Red with the price above its band
+    (or EWMA, without a band) and buffer stock on hand recommends
+    "release", anything else "hold"; diverting expiring stock needs
+    inventory age, which the price rows do not carry.
+
+    `forecaster(commodity, market, days)` supplies bands: a ds / yhat frame
+    (yhat_lower / yhat_upper used when present, else yhat +/- BAND_PCT) or
+    None. It is asked lazily, when a pair's alert is read, once per pair and
+    again only after the band runs out; until then the pair is judged on
+    volatility alone.
+
+    Attached to a PriceStore, appended rows are folded in and a full reload
+    replays each pair's last REPLAY_DAYS days. Level changes are kept as
+    numbered events (`changes`) and passed to `subscribe`d callbacks.
+    """
+
+    def __init__(self, forecaster=None, value_column=VALUE_COLUMN):
+        self.forecaster = forecaster
+        self.value_column = value_column
+        self._lock = threading.RLock()
+        self._pairs = {}        # (commodity_key, market_key) -> PairAlert
+        self.counts = dict.fromkeys(LEVELS, 0)
+        self._changes = deque(maxlen=MAX_CHANGES)
+        self.sequence = 0
+        self.rows_seen = 0
+        self._listeners = []
+
+    def attach(self, store):
+        store.subscribe(self.on_change)
+        if store.n_rows:
+            self.rebuild(store)
+
+    def on_change(self, store, rows):
+        if rows is None:
+            self.rebuild(store)
+        else:
+            self.update(store, rows)
+
+    def subscribe(self, callback):
+        """`callback(change)` for every level change (not during a rebuild)."""
+        self._listeners.append(callback)
+
+    # ---------- maintenance ----------
+    def rebuild(self, store):
+        rows = self._replay_rows(store)
+        with self._lock:
+            self._pairs = {}
+            self.counts = dict.fromkeys(LEVELS, 0)
+            self._apply(store, rows, notify=False)
+            # one evaluation per pair: the replayed days are history
+            for state in self._pairs.values():
+                self._evaluate(state, notify=False)
+            self.rows_seen = store.n_rows
+
+    def update(self, store, rows):
+        if len(rows) == 0:
+            return
+        rows = np.asarray(rows)
+        # apply in date order so a batch may arrive unsorted
+        rows = rows[np.argsort(np.asarray(store.date_days)[rows], kind="stable")]
+        with self._lock:
+            self._apply(store, rows, notify=True)
+            self.rows_seen += len(rows)
+
+    def _replay_rows(self, store):
+        """Row ids within each pair's last REPLAY_DAYS days, in date order."""
+        if self.value_column not in store.numeric or "commodity" not in store.codes \
+                or "market" not in store.codes:
+            return np.empty(0, dtype=np.int64)
+        days = np.asarray(store.date_days, dtype=np.int64)
+        # codes shifted by one so that missing values (-1) get their own group
+        pair = (np.asarray(store.codes["commodity"], dtype=np.int64) + 1) * (len(store.categories["market"]) + 1) \
+            + np.asarray(store.codes["market"], dtype=np.int64) + 1
+        rows = np.flatnonzero(days != NO_DATE)
+        _, series = np.unique(pair[rows], return_inverse=True)
+        series = series.ravel()
+        last = np.full(series.max() + 1 if len(series) else 0, np.iinfo(np.int64).min)
+        np.maximum.at(last, series, days[rows])
+        rows = rows[days[rows] > last[series] - REPLAY_DAYS]
+        return rows[np.argsort(days[rows], kind="stable")]
+
+    def _apply(self, store, rows, notify):
+        if self.value_column not in store.numeric or "commodity" not in store.codes \
+                or "market" not in store.codes:
+            return
+        values = np.asarray(store.numeric[self.value_column])[rows].astype(float)
+        days = np.asarray(store.date_days)[rows].astype(np.int64)
+        commodity = np.asarray(store.codes["commodity"])[rows]
+        market = np.asarray(store.codes["market"])[rows]
+        stock = np.asarray(store.numeric[STOCK_COLUMN])[rows].astype(float) \
+            if STOCK_COLUMN in store.numeric else np.full(len(rows), np.nan)
+        commodities, markets = store.categories["commodity"], store.categories["market"]
+
+        # prices are stored as 0 when missing or invalid
+        valid = (days != NO_DATE) & (commodity >= 0) & (market >= 0) & np.isfinite(values) & (values > 0)
+        by_code = {}
+        for c, m, day, price, qty in zip(commodity[valid].tolist(), market[valid].tolist(), days[valid].tolist(),
+                                         values[valid].tolist(), stock[valid].tolist()):
+            state = by_code.get((c, m))
+            if state is None:
+                state = by_code[(c, m)] = self._pair(commodities[c], markets[m])
+            # NaN stock (qty != qty) keeps the last known level
+            if state.observe(day, price, qty if qty == qty else None) and notify:
+                self._evaluate(state, notify)
+
+    def _pair(self, commodity, market):
+        key = (commodity_key(commodity), market_key(market))
+        state = self._pairs.get(key)
+        if state is None:
+            state = self._pairs[key] = PairAlert(commodity, market)
+            self.counts[state.level] += 1
+        return state
+
+    def _evaluate(self, state, notify):
+        bounds = state.band_at(state.day)
+        if bounds is None:
+            state.deviation = None
+        else:
+            lower, upper = bounds
+            if state.price > upper:
+                state.deviation = (state.price - upper) / upper * 100
+            elif state.price < lower:
+                state.deviation = (state.price - lower) / lower * 100
+            else:
+                state.deviation = 0.0
+
+        volatility = state.volatility or 0.0
+        deviation = abs(state.deviation or 0.0)
+        if volatility >= RED_VOLATILITY or deviation >= RED_DEVIATION:
+            level = "red"
+        elif volatility >= YELLOW_VOLATILITY or deviation > 0:
+            level = "yellow"
+        else:
+            level = "green"
+
+        high = state.deviation > 0 if state.deviation is not None else state.price > state.ewma
+        state.action = "release" if level == "red" and high and (state.stock or 0) > 0 else "hold"
+
+        if level != state.level or state.since is None:
+            # a pair seen for the first time has no previous level
+            previous = state.level if state.since is not None else None
+            self.counts[state.level] -= 1
+            self.counts[level] += 1
+            state.level, state.since = level, state.day
+            if notify:
+                self._emit(state, previous)
+
+    def _band_due(self, state):
+        return self.forecaster is not None and state.day is not None and state.band_at(state.day) is None \
+            and (state.band_checked is None or state.day >= state.band_checked + BAND_RETRY_DAYS)
+
+    def _fetch_bands(self, states):
+        """Fetch the bands `states` are missing and re-evaluate those pairs.
+
+        Bands are only fetched when alerts are read, never while rows are
+        applied, and the forecaster runs outside the lock so a slow forecast
+        does not hold up ingestion or other readers.
+        """
+        with self._lock:
+            due = [state for state in states if self._band_due(state)]
+            for state in due:
+                # claimed: concurrent readers do not fetch the same band again
+                state.band_checked = state.day
+        if not due:
+            return
+        bands = [self._band(state.commodity, state.market) for state in due]
+        with self._lock:
+            for state, band in zip(due, bands):
+                state.band = band
+                self._evaluate(state, notify=True)
+
+    def _band(self, commodity, market):
+        try:
+            forecast = self.forecaster(commodity, market, BAND_DAYS)
+        except Exception as e:
+            print(f"⚠️ Alert band forecast failed for {commodity} at {market}: {e}")
+            return None
+        if forecast is None or forecast.empty:
+            return None
+        yhat = forecast['yhat'].to_numpy(dtype=float)
+        lower = forecast['yhat_lower'].to_numpy(dtype=float) if 'yhat_lower' in forecast else yhat * (1 - BAND_PCT)
+        upper = forecast['yhat_upper'].to_numpy(dtype=float) if 'yhat_upper' in forecast else yhat * (1 + BAND_PCT)
+        first = forecast['ds'].to_numpy(dtype='datetime64[D]').astype(np.int64)[0]
+        return int(first), lower, upper
+
+    def _emit(self, state, previous):
+        self.sequence += 1
+        change = dict(state.as_dict(), sequence=self.sequence, previous=previous)
+        self._changes.append(change)
+        for callback in self._listeners:
+            try:
+                callback(change)
+            except Exception as e:
+                print(f"⚠️ Alert listener failed: {e}")
+
+    # ---------- queries ----------
+    def state(self, commodity, market):
+        """Current alert of a pair (any spelling), or None if never priced."""
+        with self._lock:
+            state = self._pairs.get((commodity_key(commodity), market_key(market)))
+        if state is None:
+            return None
+        self._fetch_bands([state])
+        with self._lock:
+            return state.as_dict()
+
+    def states(self, levels=None, commodities=None, markets=None):
+        """Current alerts, optionally only some levels / commodities / markets,
+        red first."""
+        commodities = {commodity_key(c) for c in commodities} if commodities else None
+        markets = {market_key(m) for m in markets} if markets else None
+        with self._lock:
+            selected = [state for (c, m), state in self._pairs.items()
+                        if (commodities is None or c in commodities) and (markets is None or m in markets)]
+        self._fetch_bands(selected)
+        with self._lock:
+            results = [state.as_dict() for state in selected if levels is None or state.level in levels]
+        results.sort(key=lambda r: (-LEVELS.index(r["level"]), r["commodity"], r["market"]))
+        return results
+
+    def changes(self, since=0):
+        """Level changes numbered after `since` (the last MAX_CHANGES at most)."""
+        with self._lock:
+            return [change for change in self._changes if change["sequence"] > since]
+
+    def stats(self):
+        with self._lock:
+            return {"pairs": len(self._pairs), "sequence": self.sequence, **self.counts}
+
+
+def _date(day):
+    return None if day is None else str(np.datetime64(day, 'D'))
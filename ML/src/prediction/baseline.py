@@ -0,0 +1,277 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from src.prediction.fast_predict import NS_PER_DAY
+from src.preprocessing.keys import commodity_key, market_key
+from src.storage.price_store import NO_DATE
+
+VALUE_COLUMN = "modal_price"
+# most recent days of each series used for fitting; with alpha >= 0.1 the
+# smoothing state no longer depends on where it started (0.9^64 < 0.1%)
+HISTORY_DAYS = 120
+SEASON = 7              # seasonal-naive period (weekly market cycle)
+EVAL_DAYS = 56          # one-step errors over the last days pick each series' method
+# exponential smoothing grid; beta 0 is simple exponential smoothing
+ALPHAS = (0.1, 0.3, 0.5, 0.8)
+BETAS = (0.0, 0.05, 0.2)
+PHIS = (0.9, 0.98)
+METHODS = ("seasonal_naive", "ses", "damped_trend")
+
+
+def smoothing_grid():
+    """(alpha, beta, phi) candidates; phi is irrelevant without a trend."""
+    return [(alpha, beta, phi if beta else 1.0)
+            for alpha in ALPHAS for beta in BETAS for phi in (PHIS if beta else (1.0,))]
+
+
+class BaselineSeries:
+    """One series' fitted baseline, with FastPredictor's evaluation methods."""
+
+    __slots__ = ("method", "level", "trend", "phi", "season", "last_date_ns")
+
+    def __init__(self, method, level, trend, phi, season, last_date_ns):
+        self.method = method
+        self.level = float(level)
+        self.trend = float(trend)
+        self.phi = float(phi)
+        self.season = np.asarray(season, dtype=float)
+        self.last_date_ns = int(last_date_ns)
+
+    def future_dates(self, days):
+        return self.last_date_ns + NS_PER_DAY * np.arange(1, days + 1, dtype=np.int64)
+
+    def predict_yhat(self, dates_ns):
+        steps = (np.asarray(dates_ns, dtype=np.int64) - self.last_date_ns) // NS_PER_DAY
+        return _extrapolate(self.method, self.level, self.trend, self.phi, self.season, steps)
+
+    def forecast(self, days=7):
+        """ds/yhat frame like make_forecast, or None if not finite."""
+        dates_ns = self.future_dates(days)
+        yhat = self.predict_yhat(dates_ns)
+        if not np.isfinite(yhat).all():
+            return None
+        return pd.DataFrame({'ds': pd.to_datetime(dates_ns), 'yhat': yhat})
+
+
+def _extrapolate(method, level, trend, phi, season, steps):
+    """Forecasts `steps` (>= 1) days ahead; arguments broadcast over series
+    (`season` has SEASON values on its last axis)."""
+    steps = np.asarray(steps)
+    if method == "seasonal_naive":
+        yhat = np.take(season, (steps - 1) % SEASON, axis=-1)
+    else:
+        # damped trend: level + (phi + phi^2 + ... + phi^h) * trend
+        phi = np.asarray(phi, dtype=float)
+        damping = np.where(phi == 1.0, steps, phi * (1 - phi ** steps) / np.where(phi == 1.0, 1.0, 1 - phi))
+        yhat = level + damping * trend
+    return np.maximum(yhat, 0.0)
+
+
+class BaselineForecaster:
+    """Seasonal-naive / exponential smoothing forecasts for every
+    commodity/market series in a PriceStore.
+
+    The store's modal prices are laid out as one dense (series x day)
+    matrix over each series' last HISTORY_DAYS days, and every smoothing
+    candidate in `smoothing_grid()` runs over all series at once, one
+    vectorized step per day. Each series keeps the candidate (or the
+    weekly seasonal-naive forecast) with the lowest one-step error over
+    its last EVAL_DAYS days, so a forecast is a few arithmetic operations
+    on stored state.
+
+    Attached to a store, the fit is marked stale on every change and
+    redone on the next lookup.
+    """
+
+    def __init__(self, value_column=VALUE_COLUMN):
+        self.value_column = value_column
+        self.store = None
+        self._lock = threading.Lock()
+        self._stale = True
+        self._index = {}
+        self.commodities = []
+        self.markets = []
+        self.method = np.empty(0, dtype=np.int8)
+        self.level = self.trend = self.phi = self.error = np.empty(0)
+        self.season = np.empty((0, SEASON))
+        self.last_day = np.empty(0, dtype=np.int64)
+
+    def attach(self, store):
+        self.store = store
+        store.subscribe(self.on_change)
+
+    def on_change(self, store, rows):
+        self._stale = True
+
+    def _current(self):
+        if self._stale and self.store is not None:
+            with self._lock:
+                if self._stale:
+                    self.fit(self.store)
+
+    # ---------- fitting ----------
+    def fit(self, store):
+        """Refit every series from the store's current rows."""
+        self._stale = False
+        if (self.value_column not in store.numeric or "commodity" not in store.codes
+                or "market" not in store.codes):
+            self._set([], [], *([np.empty(0)] * 5), np.empty((0, SEASON)), np.empty(0, dtype=np.int64))
+            return
+
+        values = np.asarray(store.numeric[self.value_column], dtype=float)
+        days = np.asarray(store.date_days, dtype=np.int64)
+        commodity = np.asarray(store.codes["commodity"], dtype=np.int64)
+        market = np.asarray(store.codes["market"], dtype=np.int64)
+        # prices are stored as 0 when missing or invalid
+        valid = (days != NO_DATE) & (commodity >= 0) & (market >= 0) & np.isfinite(values) & (values > 0)
+        pair = commodity[valid] * len(store.categories["market"]) + market[valid]
+        pairs, series = np.unique(pair, return_inverse=True)
+        series = series.ravel()
+        values, days = values[valid], days[valid]
+        n_series = len(pairs)
+
+        # dense daily matrix over each series' last HISTORY_DAYS days (mean of same-day rows)
+        last_day = np.full(n_series, np.iinfo(np.int64).min)
+        np.maximum.at(last_day, series, days)
+        column = days - (last_day[series] - HISTORY_DAYS + 1)
+        keep = column >= 0
+        cell = series[keep] * HISTORY_DAYS + column[keep]
+        total = np.bincount(cell, weights=values[keep], minlength=n_series * HISTORY_DAYS)
+        count = np.bincount(cell, minlength=n_series * HISTORY_DAYS)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            prices = (total / count).reshape(n_series, HISTORY_DAYS)
+
+        method, level, trend, phi, error, season = fit_matrix(prices)
+        self._set(store.categories["commodity"][pairs // len(store.categories["market"])].tolist(),
+                  store.categories["market"][pairs % len(store.categories["market"])].tolist(),
+                  method, level, trend, phi, error, season, last_day)
+
+    def _set(self, commodities, markets, method, level, trend, phi, error, season, last_day):
+        index = {(commodity_key(c), market_key(m)): i for i, (c, m) in enumerate(zip(commodities, markets))}
+        self.commodities, self.markets = commodities, markets
+        self.method, self.level, self.trend, self.phi = method, level, trend, phi
+        self.error, self.season, self.last_day = error, season, last_day
+        self._index = index
+
+    # ---------- forecasting ----------
+    def lookup(self, commodity, market):
+        """Series index for a pair (any spelling), or None."""
+        self._current()
+        return self._index.get((commodity_key(commodity), market_key(market)))
+
+    def predictor(self, commodity, market):
+        """BaselineSeries for a pair, or None without price history."""
+        i = self.lookup(commodity, market)
+        if i is None:
+            return None
+        return BaselineSeries(METHODS[self.method[i]], self.level[i], self.trend[i], self.phi[i],
+                              self.season[i], int(self.last_day[i]) * NS_PER_DAY)
+
+    def forecast(self, commodity, market, days=7):
+        """ds/yhat frame for a pair, or None without price history."""
+        predictor = self.predictor(commodity, market)
+        return predictor.forecast(days) if predictor is not None else None
+
+    def forecast_all(self, days=7):
+        """(commodities, markets, first forecast day per series as
+        datetime64[D], yhat matrix series x days) for every series."""
+        self._current()
+        yhat = extrapolate_matrix(self.method, self.level, self.trend, self.phi, self.season, days)
+        first = (self.last_day + 1).astype('datetime64[D]')
+        return list(self.commodities), list(self.markets), first, yhat
+
+    def stats(self):
+        self._current()
+        return {"series": len(self.commodities),
+                **{name: int((self.method == i).sum()) for i, name in enumerate(METHODS)}}
+
+
+def _mean_scored(errors, scored):
+    count = scored.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(count > 0, np.where(scored, errors, 0.0).sum(axis=1) / count, np.inf)
+
+
+def fit_matrix(prices):
+    """Fit a (series x day) price matrix whose last column is each series'
+    last day, NaN where a day has no price. Returns (method index, level,
+    trend, phi, mean absolute one-step error, last SEASON prices) per series.
+    """
+    prices = np.asarray(prices, dtype=float)
+    n_series, n_days = prices.shape
+
+    # carry the last observed price over gaps; before a series' first
+    # observation its first price is used, which leaves smoothing at rest
+    observed = np.isfinite(prices)
+    first = observed.argmax(axis=1)
+    filled = np.maximum.accumulate(np.where(observed, np.arange(n_days), 0), axis=1)
+    filled = np.maximum(filled, first[:, None])
+    prices = np.take_along_axis(prices, filled, axis=1)
+
+    level, trend, phi, errors = _smooth(prices, first)
+    # seasonal naive: the value one season earlier, scored once that exists
+    eval_from = n_days - EVAL_DAYS
+    seasonal = np.abs(prices[:, eval_from:] - prices[:, eval_from - SEASON:-SEASON])
+    scored = np.arange(eval_from, n_days) - SEASON >= first[:, None]
+    errors = np.column_stack([_mean_scored(seasonal, scored), errors])
+
+    # series too short to score anything use the latest price (SES state)
+    errors[~np.isfinite(errors).any(axis=1), 1] = 0.0
+    best = np.nanargmin(np.where(np.isfinite(errors), errors, np.nan), axis=1)
+    smoothing = np.maximum(best - 1, 0)
+    rows = np.arange(n_series)
+    grid = smoothing_grid()
+    method = np.where(best == 0, 0, np.where(np.array([b for _, b, _ in grid])[smoothing] > 0, 2, 1))
+
+    return (method.astype(np.int8), level[rows, smoothing], trend[rows, smoothing],
+            phi[smoothing], errors[rows, best], prices[:, -SEASON:])
+
+
+def extrapolate_matrix(method, level, trend, phi, season, days):
+    """yhat (series x days) for the next `days` days of every series fitted
+    by `fit_matrix`."""
+    steps = np.arange(1, days + 1)
+    seasonal = _extrapolate("seasonal_naive", None, None, None, season, steps)
+    smoothed = _extrapolate("damped_trend", level[:, None], trend[:, None], phi[:, None], None, steps)
+    return np.where((method == 0)[:, None], seasonal, smoothed)
+
+
+def _smooth(prices, first):
+    """Run every grid candidate over every series. Returns final level
+    and trend (series x candidate), phi per candidate and the mean
+    absolute one-step error over the last EVAL_DAYS days (from each
+    series' first observation on)."""
+    grid = np.array(smoothing_grid())
+    alpha, beta, phi = grid[:, 0], grid[:, 1], grid[:, 2]
+    n_days = prices.shape[1]
+    by_day = np.ascontiguousarray(prices.T)
+    level = np.repeat(prices[:, :1], len(grid), axis=1)
+    trend = np.zeros_like(level)
+    error_sum = np.zeros_like(level)
+    damped, predicted, work = np.empty_like(level), np.empty_like(level), np.empty_like(level)
+    eval_from = n_days - EVAL_DAYS
+
+    # in-place updates: this loop is most of the fitting time
+    for t in range(1, n_days):
+        y = by_day[t][:, None]
+        np.multiply(trend, phi, out=damped)
+        np.add(level, damped, out=predicted)
+        np.subtract(y, predicted, out=work)
+        if t >= eval_from:
+            error_sum += np.abs(work) * (t > first)[:, None]
+        # level' = predicted + alpha * (y - predicted)
+        work *= alpha
+        work += predicted
+        # trend' = beta * (level' - level) + (1 - beta) * phi * trend
+        np.subtract(work, level, out=trend)
+        trend *= beta
+        damped *= 1 - beta
+        trend += damped
+        level, work = work, level
+
+    scored = np.clip(n_days - np.maximum(first + 1, eval_from), 0, None)[:, None]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        errors = np.where(scored > 0, error_sum / scored, np.inf)
+    return level, trend, phi, errors
@@ -0,0 +1,145 @@
+import os
+import sys
+import glob
+import json
+
+import numpy as np
+
+from src.prediction.fast_predict import FastPredictor
+
+COMPACT_FORMAT = "pricepulse-compact"
+COMPACT_VERSION = 1
+# a bundle is <name>.model.json (scalars + spec) next to <name>.model.npy (arrays)
+COMPACT_SUFFIX = ".model.json"
+ARRAY_SUFFIX = ".model.npy"
+ARRAY_FIELDS = ('deltas', 'changepoints_t', 'beta')
+
+
+def compact_base(path):
+    """Strip a bundle or pickle extension, leaving the shared base path."""
+    for suffix in (COMPACT_SUFFIX, ARRAY_SUFFIX, ".pkl"):
+        if path.endswith(suffix):
+            return path[:-len(suffix)]
+    return path
+
+
+def bundle_to_bytes(predictor):
+    """(header_json_bytes, float64_array) describing `predictor`."""
+    arrays = [np.asarray(getattr(predictor, name), dtype=np.float64).ravel() for name in ARRAY_FIELDS]
+    offsets = {}
+    pos = 0
+    for name, arr in zip(ARRAY_FIELDS, arrays):
+        offsets[name] = [pos, int(arr.size)]
+        pos += arr.size
+
+    header = {
+        "format": COMPACT_FORMAT,
+        "version": COMPACT_VERSION,
+        "growth": predictor.growth,
+        "k": predictor.k,
+        "m": predictor.m,
+        "start_ns": predictor.start_ns,
+        "t_scale_ns": predictor.t_scale_ns,
+        "y_scale": predictor.y_scale,
+        "floor": predictor.floor,
+        "last_date_ns": predictor.last_date_ns,
+        "seasonalities": predictor.seasonalities,
+        "regressors": predictor.regressors,
+        "arrays": offsets,
+    }
+    data = np.concatenate(arrays) if arrays else np.zeros(0)
+    return json.dumps(header, sort_keys=True).encode("utf-8"), data
+
+
+def predictor_from_bundle(header, data):
+    """Rebuild a FastPredictor from a parsed header and its flat array."""
+    if header.get("format") != COMPACT_FORMAT:
+        raise ValueError("Not a compact model bundle")
+    if header.get("version") != COMPACT_VERSION:
+        raise ValueError(f"Unsupported compact model version: {header.get('version')}")
+
+    arrays = {name: data[start:start + size] for name, (start, size) in header["arrays"].items()}
+    return FastPredictor(
+        growth=header["growth"],
+        k=header["k"],
+        m=header["m"],
+        deltas=arrays["deltas"],
+        changepoints_t=arrays["changepoints_t"],
+        start_ns=header["start_ns"],
+        t_scale_ns=header["t_scale_ns"],
+        y_scale=header["y_scale"],
+        floor=header["floor"],
+        seasonalities=header["seasonalities"],
+        regressors=header["regressors"],
+        beta=arrays["beta"],
+        last_date_ns=header["last_date_ns"],
+    )
+
+
+def save_compact(predictor, base_path):
+    """Write `predictor` as <base_path>.model.json + <base_path>.model.npy.
+
+    The array file is written first and the header last (both via
+    write-then-rename), so a reader never sees a header without its data.
+    """
+    base_path = compact_base(base_path)
+    header, data = bundle_to_bytes(predictor)
+
+    tmp_npy = base_path + ARRAY_SUFFIX + ".tmp"
+    with open(tmp_npy, "wb") as f:
+        np.save(f, data)
+    os.replace(tmp_npy, base_path + ARRAY_SUFFIX)
+
+    tmp_json = base_path + COMPACT_SUFFIX + ".tmp"
+    with open(tmp_json, "wb") as f:
+        f.write(header)
+    os.replace(tmp_json, base_path + COMPACT_SUFFIX)
+    return base_path + COMPACT_SUFFIX
+
+
+def load_compact(path, mmap=True):
+    """Load a compact bundle; arrays are memory-mapped unless `mmap` is False."""
+    base_path = compact_base(path)
+    with open(base_path + COMPACT_SUFFIX, "rb") as f:
+        header = json.loads(f.read())
+    data = np.load(base_path + ARRAY_SUFFIX, mmap_mode="r" if mmap else None)
+    return predictor_from_bundle(header, data)
+
+
+def export_compact(model, base_path):
+    """Convert a fitted Prophet model to a compact bundle.
+
+    Raises ValueError if the model uses features FastPredictor cannot evaluate.
+    """
+    return save_compact(FastPredictor.from_prophet(model), base_path)
+
+
+def migrate_pickles(models_dir, out_dir=None):
+    """Convert every <name>.pkl in `models_dir` to a compact bundle.
+
+    Returns (converted, unsupported) lists of file names; unsupported
+    pickles are left as they are and keep being served through Prophet.
+    """
+    import joblib
+
+    out_dir = out_dir or models_dir
+    os.makedirs(out_dir, exist_ok=True)
+    converted, unsupported = [], []
+    for path in sorted(glob.glob(os.path.join(models_dir, "*.pkl"))):
+        name = os.path.basename(path)
+        try:
+            export_compact(joblib.load(path), os.path.join(out_dir, compact_base(name)))
+            converted.append(name)
+        except ValueError as e:
+            print(f"⚠️ Keeping pickle for {name}: {e}")
+            unsupported.append(name)
+    return converted, unsupported
+
+
+if __name__ == "__main__":
+    # python -m src.prediction.compact_model <models_dir> [out_dir]
+    if len(sys.argv) < 2:
+        print("Usage: python -m src.prediction.compact_model <models_dir> [out_dir]")
+        sys.exit(1)
+    done, skipped = migrate_pickles(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
+    print(f"\n✅ Converted {len(done)} models ({len(skipped)} kept as pickles)")
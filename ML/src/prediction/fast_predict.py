@@ -0,0 +1,254 @@
+import os
+import sys
+import glob
+import warnings
+
+import numpy as np
+import pandas as pd
+
+NS_PER_DAY = 24 * 60 * 60 * 10**9
+DEFAULT_REGRESSOR_VALUE = 5000.0
+
+
+class FastPredictor:
+    """Point-forecast engine evaluated directly from fitted Prophet parameters.
+
+    `make_forecast` only needs yhat with uncertainty sampling disabled, so
+    the trend + seasonality + regressor sum can be computed with a handful
+    of NumPy operations instead of `Prophet.predict`, which assembles a full
+    pandas feature matrix on every call. Parameters are extracted once with
+    `from_prophet` and the result matches `Prophet.predict` yhat up to
+    floating point rounding.
+
+    Only the features our trainer uses are supported (linear/flat growth,
+    unconditional seasonalities, extra regressors, no holidays);
+    `from_prophet` raises ValueError for anything else so callers can keep
+    the Prophet object instead.
+    """
+
+    def __init__(self, growth, k, m, deltas, changepoints_t, start_ns, t_scale_ns,
+                 y_scale, floor, seasonalities, regressors, beta, last_date_ns):
+        self.growth = growth
+        self.k = float(k)
+        self.m = float(m)
+        self.deltas = np.asarray(deltas, dtype=float)
+        self.changepoints_t = np.asarray(changepoints_t, dtype=float)
+        self.start_ns = int(start_ns)
+        self.t_scale_ns = int(t_scale_ns)
+        self.y_scale = float(y_scale)
+        self.floor = float(floor)
+        # [{'name', 'period', 'fourier_order', 'mode'}] in Prophet column order
+        self.seasonalities = [dict(s) for s in seasonalities]
+        # [{'name', 'fill', 'mu', 'std', 'mode'}]; `fill` is the value make_forecast uses
+        self.regressors = [dict(r) for r in regressors]
+        self.beta = np.asarray(beta, dtype=float)
+        self.last_date_ns = int(last_date_ns)
+
+        # derived evaluation arrays
+        frequencies = []
+        fourier_additive = []
+        for props in self.seasonalities:
+            additive = props['mode'] == 'additive'
+            for i in range(props['fourier_order']):
+                frequencies.append((i + 1) / props['period'])
+                fourier_additive.extend([additive, additive])
+        n_fourier = len(fourier_additive)
+        n_features = n_fourier + len(self.regressors)
+        # Prophet adds a single dummy zero column when there are no features
+        if n_features and self.beta.shape[0] != n_features:
+            raise ValueError(f"Expected {n_features} coefficients, found {self.beta.shape[0]}")
+
+        # one entry per Fourier term, (i + 1) / period
+        self.frequencies = np.asarray(frequencies, dtype=float)
+        # one entry per feature column (sin, cos interleaved)
+        self.fourier_additive = np.asarray(fourier_additive, dtype=bool)
+        self.beta_fourier = self.beta[:n_fourier]
+        # standardized regressor values used for the whole horizon
+        self.regressor_values = np.asarray(
+            [(r['fill'] - r['mu']) / r['std'] for r in self.regressors], dtype=float)
+        self.regressor_additive = np.asarray(
+            [r['mode'] == 'additive' for r in self.regressors], dtype=bool)
+        self.beta_regressors = self.beta[n_fourier:n_features]
+
+    # ---------- extraction ----------
+    @classmethod
+    def from_prophet(cls, model):
+        """Pull the fitted parameters out of a Prophet model."""
+        params = model.params
+        if params is None or 'k' not in params or len(params['k']) == 0:
+            raise ValueError("Model appears to be unfitted/empty parameters.")
+        if model.growth not in ('linear', 'flat'):
+            raise ValueError(f"Unsupported growth: {model.growth}")
+        if model.logistic_floor:
+            raise ValueError("Logistic floor is not supported.")
+        if model.holidays is not None or getattr(model, 'country_holidays', None):
+            raise ValueError("Holiday features are not supported.")
+
+        seasonalities = []
+        for name, props in model.seasonalities.items():
+            if props['condition_name'] is not None:
+                raise ValueError("Conditional seasonalities are not supported.")
+            seasonalities.append({'name': name, 'period': float(props['period']),
+                                  'fourier_order': int(props['fourier_order']),
+                                  'mode': props['mode']})
+
+        # make_forecast fills every future row with the history mean of the regressor
+        regressors = []
+        history = model.history
+        for name, props in model.extra_regressors.items():
+            if props.get('predictor') is not None:
+                raise ValueError("Regressor models are not supported.")
+            fill = DEFAULT_REGRESSOR_VALUE
+            if history is not None and name in history:
+                hist_mean = history[name].mean()
+                if not pd.isna(hist_mean):
+                    fill = hist_mean
+            regressors.append({'name': name, 'fill': float(fill), 'mu': float(props['mu']),
+                               'std': float(props['std']), 'mode': props['mode']})
+
+        if history is not None and not history.empty:
+            last_date = history['ds'].max()
+        else:
+            last_date = pd.Timestamp.now()
+
+        if model.scaling == 'minmax':
+            floor = model.y_min
+        else:
+            floor = 0.0
+
+        # broken fits have empty parameter arrays; they evaluate to NaN like in Prophet
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            k = np.nanmean(params['k'])
+            m = np.nanmean(params['m'])
+            deltas = np.nanmean(params['delta'], axis=0)
+            beta = np.nanmean(params['beta'], axis=0)
+
+        return cls(
+            growth=model.growth,
+            k=k,
+            m=m,
+            deltas=deltas,
+            changepoints_t=model.changepoints_t,
+            start_ns=pd.Timestamp(model.start).value,
+            t_scale_ns=pd.Timedelta(model.t_scale).value,
+            y_scale=model.y_scale,
+            floor=floor,
+            seasonalities=seasonalities,
+            regressors=regressors,
+            beta=beta,
+            last_date_ns=pd.Timestamp(last_date).value,
+        )
+
+    # ---------- evaluation ----------
+    def future_dates(self, days):
+        """Daily int64 nanosecond timestamps following the last history date."""
+        return self.last_date_ns + NS_PER_DAY * np.arange(1, days + 1, dtype=np.int64)
+
+    def predict_yhat(self, dates_ns):
+        """yhat for an array of int64 nanosecond timestamps."""
+        dates_ns = np.asarray(dates_ns, dtype=np.int64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = (dates_ns - self.start_ns) / self.t_scale_ns
+
+        if self.growth == 'flat':
+            trend = np.full(t.shape, self.m)
+        else:
+            deltas_t = (self.changepoints_t[None, :] <= t[:, None]) * self.deltas
+            k_t = deltas_t.sum(axis=1) + self.k
+            m_t = (deltas_t * -self.changepoints_t).sum(axis=1) + self.m
+            trend = k_t * t + m_t
+        trend = trend * self.y_scale + self.floor
+
+        additive = np.zeros(t.shape)
+        multiplicative = np.zeros(t.shape)
+
+        if self.frequencies.size:
+            x_T = np.pi * 2 * (dates_ns * 1e-9 / 86400.0)
+            c = x_T[:, None] * self.frequencies[None, :]
+            X = np.empty((t.shape[0], 2 * self.frequencies.size))
+            X[:, 0::2] = np.sin(c)
+            X[:, 1::2] = np.cos(c)
+            additive += X[:, self.fourier_additive] @ self.beta_fourier[self.fourier_additive]
+            multiplicative += X[:, ~self.fourier_additive] @ self.beta_fourier[~self.fourier_additive]
+
+        if self.regressor_values.size:
+            contrib = self.regressor_values * self.beta_regressors
+            additive += contrib[self.regressor_additive].sum()
+            multiplicative += contrib[~self.regressor_additive].sum()
+
+        return trend * (1 + multiplicative) + additive * self.y_scale
+
+    def forecast(self, days=7):
+        """Same contract as `make_forecast`: a ds/yhat frame, or None on NaNs."""
+        dates_ns = self.future_dates(days)
+        yhat = self.predict_yhat(dates_ns)
+        if not np.isfinite(yhat).all():
+            return None
+        return pd.DataFrame({'ds': pd.to_datetime(dates_ns), 'yhat': yhat})
+
+    @property
+    def nbytes(self):
+        return sum(v.nbytes for v in vars(self).values() if isinstance(v, np.ndarray))
+
+
+def load_fast_predictor(model):
+    """FastPredictor for `model`, or None if it uses unsupported features."""
+    try:
+        return FastPredictor.from_prophet(model)
+    except ValueError:
+        return None
+
+
+def verify_models(models_dir, days=(7, 15), tolerance=1e-6):
+    """Compare FastPredictor against Prophet.predict for every saved model.
+
+    Returns a list of (filename, status, max_abs_error) tuples; status is
+    'match', 'mismatch', 'unsupported' or 'both_failed'.
+    """
+    import joblib
+    from src.prediction.forecast import make_forecast
+
+    results = []
+    for path in sorted(glob.glob(os.path.join(models_dir, "*.pkl"))):
+        name = os.path.basename(path)
+        model = joblib.load(path)
+        fast = load_fast_predictor(model)
+        if fast is None:
+            results.append((name, 'unsupported', None))
+            continue
+
+        worst = 0.0
+        status = 'match'
+        for horizon in days:
+            expected = make_forecast(model, horizon)
+            actual = fast.forecast(horizon)
+            if expected is None and actual is None:
+                status = 'both_failed'
+                continue
+            if expected is None or actual is None:
+                status = 'mismatch'
+                worst = float('inf')
+                break
+            if not (expected['ds'].values == actual['ds'].values).all():
+                status = 'mismatch'
+                worst = float('inf')
+                break
+            err = np.abs(expected['yhat'].values - actual['yhat'].values)
+            scale = np.maximum(1.0, np.abs(expected['yhat'].values))
+            worst = max(worst, float((err / scale).max()))
+            if worst > tolerance:
+                status = 'mismatch'
+        results.append((name, status, worst))
+    return results
+
+
+if __name__ == "__main__":
+    # python -m src.prediction.fast_predict <models_dir>
+    target = sys.argv[1] if len(sys.argv) > 1 else "saved_models"
+    report = verify_models(target)
+    for name, status, err in report:
+        print(f"{status:12s} {name} {'' if err is None else f'{err:.2e}'}")
+    failed = [r for r in report if r[1] == 'mismatch']
+    print(f"\n{len(report) - len(failed)}/{len(report)} models consistent with Prophet.predict")
+    sys.exit(1 if failed else 0)
@@ -5,6 +5,11 @@ import numpy as np
 from prophet import Prophet
 import sys
 
+from src.prediction.fast_predict import FastPredictor
+from src.prediction.compact_model import COMPACT_SUFFIX, load_compact
+from src.preprocessing.keys import commodity_key, market_key, request_pair
+from src.storage.model_store import MODEL_STORE_NAME, ModelStore, model_files
+
 MODELS_DIR = r"C:\Users\swaru\Downloads\avfs303_backend\avfs303_backend\saved_models"
 
 def get_demo_fallback_data(days=7):
@@ -23,6 +28,10 @@ def get_demo_fallback_data(days=7):
 
 def make_forecast(model, days=7):
 
+    # Compact bundles load as FastPredictor and evaluate in closed form
+    if isinstance(model, FastPredictor):
+        return model.forecast(days)
+
     model.uncertainty_samples = 0
 
     if model.params is None or 'k' not in model.params or len(model.params['k']) == 0:
@@ -67,28 +76,48 @@ def make_forecast(model, days=7):
         print(f"⚠️ Prediction logic error: {e}")
         return None
 
+def load_model(commodity, market):
+    """Model for a pair from the model store, else from loose files.
+
+    Returns (model, source); model is None if nothing was found and source
+    is then the last path tried.
+    """
+    store_path = os.path.join(MODELS_DIR, MODEL_STORE_NAME)
+    if os.path.exists(store_path):
+        store = ModelStore(store_path)
+        entry = store.lookup(commodity, market)
+        if entry is not None:
+            return store.load(entry), f"{MODEL_STORE_NAME} ({entry['commodity']}, {entry['market']})"
+
+    # Prefer the compact bundle, fall back to the full Prophet pickle
+    found = model_files(MODELS_DIR).get((commodity_key(commodity), market_key(market))) \
+        if os.path.isdir(MODELS_DIR) else None
+    if found is None:
+        return None, os.path.join(MODELS_DIR, f"{commodity}_{market}.pkl")
+    filepath = found[0]
+    if filepath.endswith(COMPACT_SUFFIX):
+        return load_compact(filepath), os.path.basename(filepath)
+    return joblib.load(filepath), os.path.basename(filepath)
+
 def main():
     if len(sys.argv) < 4:
-        print("Usage: python forecast.py <Commodity> <Market> <Days>")
-        print("Example: python forecast.py Onion Pune_APMC 7")
+        print("Usage: python -m src.prediction.forecast <Commodity> <Market> <Days>")
+        print("Example: python -m src.prediction.forecast Onion Pune_APMC 7")
         return
 
     # Handle inputs
-    commodity = sys.argv[1].replace(" ", "_")
-    market = sys.argv[2].replace(" ", "_")
+    commodity, market, _, _ = request_pair(sys.argv[1], sys.argv[2])
     days = int(sys.argv[3])
 
-    # Load trained model
-    filename = f"{commodity}_{market}.pkl"
-    filepath = os.path.join(MODELS_DIR, filename)
+    try:
+        # Load trained model
+        model, source = load_model(commodity, market)
 
-    if not os.path.exists(filepath):
-        print(f"❌ Model not found: {filepath}")
-        return
+        if model is None:
+            print(f"❌ Model not found: {source}")
+            return
 
-    try:
-        model = joblib.load(filepath)
-        print(f"✅ Model loaded: {filename}")
+        print(f"✅ Model loaded: {source}")
 
         # Make forecast
         forecast = make_forecast(model, days)
@@ -0,0 +1,214 @@
+import os
+import sys
+import json
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+
+# Pool and queue limits
+WORKERS = max(1, min(4, os.cpu_count() or 1))
+MAX_PENDING = 64            # distinct computations queued or running before 503s
+PRELOAD_MODELS = True       # warm each worker's model cache at start-up
+RETRY_AFTER_SECONDS = 1
+PORT = 5002
+
+
+# ---------- worker process ----------
+def _init_worker(models_dir, preload):
+    """Pin BLAS/Stan to one thread and optionally preload every model."""
+    for var in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'STAN_NUM_THREADS'):
+        os.environ[var] = '1'
+
+    from src.prediction import forecast_flask
+    if models_dir:
+        forecast_flask.MODELS_DIR = models_dir
+    if preload:
+        from src.prediction.forecast_cache import list_model_sources
+        sources = list_model_sources(forecast_flask.MODELS_DIR)
+        for commodity, market, _, _ in sources[:forecast_flask.MODEL_CACHE_MAX_ENTRIES]:
+            try:
+                forecast_flask.get_model(commodity, market)
+            except Exception:
+                pass
+
+
+def _run_view(view, payload):
+    """Run a forecast_flask view on `payload` in this worker; (status, body)."""
+    from src.prediction import forecast_flask
+
+    with forecast_flask.app.test_request_context(method="POST", json=payload):
+        response = forecast_flask.app.make_response(getattr(forecast_flask, view)())
+        return response.status_code, response.get_data()
+
+
+# ---------- service ----------
+class ForecastService:
+    """Runs forecast views in a process pool with coalescing and backpressure.
+
+    Identical requests that arrive while one is being computed await the
+    same future. At most `max_pending` distinct computations are queued
+    or running; beyond that `submit` raises `Overloaded`.
+    """
+
+    def __init__(self, models_dir=None, workers=WORKERS, max_pending=MAX_PENDING, preload=PRELOAD_MODELS):
+        self.models_dir = models_dir
+        self.workers = workers
+        self.max_pending = max_pending
+        self.preload = preload
+        self.pool = None
+        self._in_flight = {}
+        self.computed = 0
+        self.coalesced = 0
+        self.rejected = 0
+
+    def start(self):
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                            initargs=(self.models_dir, self.preload))
+
+    def stop(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=True, cancel_futures=True)
+            self.pool = None
+
+    async def submit(self, key, view, payload):
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+        if len(self._in_flight) >= self.max_pending:
+            self.rejected += 1
+            raise Overloaded()
+
+        self.start()
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.pool, _run_view, view, payload)
+        self._in_flight[key] = future
+        # released when the pool job ends, not when this caller stops waiting
+        future.add_done_callback(lambda done: self._finished(key, done))
+        return await asyncio.shield(future)
+
+    def _finished(self, key, future):
+        if self._in_flight.get(key) is future:
+            del self._in_flight[key]
+        if not future.cancelled() and future.exception() is None:
+            self.computed += 1
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "pending": len(self._in_flight),
+            "max_pending": self.max_pending,
+            "computed": self.computed,
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+        }
+
+
+class Overloaded(Exception):
+    pass
+
+
+def request_key(path, payload):
+    """Coalescing key: the normalized request, so equivalent bodies share work."""
+    from src.preprocessing.keys import request_pair
+
+    # bodies the view rejects (pair values that are not strings, days that
+    # is not an integer) are keyed as given
+    days = payload.get('days', 7)
+    if (path == "/predict" and isinstance(days, int) and not isinstance(days, bool)
+            and all(isinstance(payload.get(field), (str, type(None))) for field in ('commodity', 'market'))):
+        commodity, market, ck, mk = request_pair(payload.get('commodity'), payload.get('market'))
+        return (path, commodity, market, ck, mk, days, str(payload.get('engine') or ""))
+    return (path, json.dumps(payload, sort_keys=True))
+
+
+# ---------- ASGI app ----------
+ROUTES = {"/predict": "predict", "/predict/batch": "predict_batch"}
+
+
+class ForecastApp:
+    """Plain ASGI application exposing /predict, /predict/batch and /health.
+
+    Request and response bodies are the same as the Flask service; the
+    event loop only parses, coalesces and forwards, so slow model loads or
+    Prophet predictions never block other requests.
+    """
+
+    def __init__(self, service=None):
+        self.service = service or ForecastService()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self.service.start()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.service.stop()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _http(self, scope, receive, send):
+        path, method = scope["path"], scope["method"]
+        if method == "OPTIONS":
+            return await _respond(send, 204, b"")
+        if path == "/health" and method == "GET":
+            return await _respond_json(send, 200, {"status": "success", "service": self.service.stats()})
+        if path not in ROUTES:
+            return await _respond_json(send, 404, {"status": "error", "message": "Not found"})
+        if method != "POST":
+            return await _respond_json(send, 405, {"status": "error", "message": "Method not allowed"})
+
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        try:
+            payload = json.loads(body or b"null")
+        except ValueError:
+            payload = None
+        if not isinstance(payload, dict):
+            return await _respond_json(send, 400, {"status": "error", "message": "No JSON data provided"})
+
+        try:
+            status, data = await self.service.submit(request_key(path, payload), ROUTES[path], payload)
+        except Overloaded:
+            return await _respond_json(send, 503, {"status": "error", "message": "Server busy, retry later"},
+                                       [(b"retry-after", str(RETRY_AFTER_SECONDS).encode())])
+        except Exception as e:
+            return await _respond_json(send, 500, {"status": "error", "message": str(e)})
+        await _respond(send, status, data)
+
+
+async def _respond(send, status, body, headers=()):
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json"),
+                            (b"access-control-allow-origin", b"*"),
+                            (b"access-control-allow-headers", b"content-type"),
+                            (b"content-length", str(len(body)).encode()), *headers]})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _respond_json(send, status, payload, headers=()):
+    await _respond(send, status, json.dumps(payload).encode("utf-8"), headers)
+
+
+app = ForecastApp()
+
+
+if __name__ == "__main__":
+    # python -m src.prediction.forecast_asgi   (or: uvicorn src.prediction.forecast_asgi:app)
+    try:
+        import uvicorn
+    except ImportError:
+        print("❌ uvicorn is not installed: pip install uvicorn")
+        sys.exit(1)
+    uvicorn.run(app, port=PORT)
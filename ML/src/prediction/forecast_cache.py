@@ -0,0 +1,267 @@
+import os
+import sys
+import time
+import sqlite3
+import threading
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import numpy as np
+
+from src.prediction.fast_predict import FastPredictor, load_fast_predictor
+from src.prediction.compact_model import COMPACT_SUFFIX, load_compact
+from src.preprocessing.keys import commodity_key, market_key
+from src.storage.model_store import MODEL_STORE_NAME, ModelStore, model_files
+
+FORECAST_CACHE_NAME = "forecasts.sqlite"
+# longest horizon materialized; longer requests are computed live
+FORECAST_HORIZON = 30
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS forecasts (
+    commodity_key TEXT NOT NULL,
+    market_key    TEXT NOT NULL,
+    commodity     TEXT NOT NULL,
+    market        TEXT NOT NULL,
+    version       TEXT NOT NULL,         -- model version the forecast was computed from
+    status        TEXT NOT NULL,         -- success | failed (model produced NaNs)
+    start_ns      INTEGER,               -- first forecast day
+    horizon       INTEGER NOT NULL,
+    yhat          BLOB,                  -- float64[horizon]
+    created_at    TEXT NOT NULL,
+    PRIMARY KEY (commodity_key, market_key)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+NS_PER_DAY = 24 * 60 * 60 * 10**9
+
+
+def store_version(entry):
+    """Version string of a model served from the model store."""
+    return f"store:{entry['version']}"
+
+
+def file_version(path):
+    """Version string of a loose model file (name + modification time)."""
+    return f"file:{os.path.basename(path)}:{os.stat(path).st_mtime_ns}"
+
+
+class ForecastCache:
+    """SQLite-backed table of precomputed forecasts, one row per pair.
+
+    Each row holds yhat for days 1..horizon after the model's last history
+    date, tagged with the version of the model it came from. Readers keep
+    the table in memory and reload it only when a writer bumps the
+    `generation` counter, so `get` is a dict lookup plus a slice.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._generation = None
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        with self._conn() as conn:
+            conn.executescript(SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # ---------- writing ----------
+    def write(self, forecasts, remove=()):
+        """Upsert forecast dicts (commodity, market, version, status, start_ns,
+        yhat) and delete the (commodity_key, market_key) pairs in `remove`,
+        in one transaction."""
+        created = datetime.now().isoformat(timespec="seconds")
+        rows = []
+        for f in forecasts:
+            yhat = None if f["yhat"] is None else np.asarray(f["yhat"], dtype=np.float64)
+            rows.append((commodity_key(f["commodity"]), market_key(f["market"]),
+                         f["commodity"], f["market"], f["version"], f["status"], f["start_ns"],
+                         0 if yhat is None else len(yhat),
+                         None if yhat is None else sqlite3.Binary(yhat.tobytes()), created))
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany("DELETE FROM forecasts WHERE commodity_key = ? AND market_key = ?",
+                             list(remove))
+            conn.executemany("INSERT OR REPLACE INTO forecasts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            conn.execute("INSERT INTO meta (key, value) VALUES ('generation', '1') "
+                         "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1")
+
+    def versions(self):
+        """{(commodity_key, market_key): version} of everything cached."""
+        return {(r[0], r[1]): r[2] for r in self._conn().execute(
+            "SELECT commodity_key, market_key, version FROM forecasts")}
+
+    # ---------- reading ----------
+    def _refresh(self):
+        row = self._conn().execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+        generation = row[0] if row else None
+        if generation == self._generation:
+            return
+        with self._lock:
+            if generation == self._generation:
+                return
+            entries = {}
+            for ck, mk, version, status, start_ns, yhat in self._conn().execute(
+                    "SELECT commodity_key, market_key, version, status, start_ns, yhat FROM forecasts"):
+                values = None if yhat is None else np.frombuffer(yhat, dtype=np.float64)
+                entries[(ck, mk)] = (version, status, start_ns, values)
+            self._entries = entries
+            self._generation = generation
+
+    def get(self, commodity, market, version, days):
+        """(status, dates_ns, yhat) for the first `days` days, or None when the
+        pair is missing, was computed from another model version, or the
+        cached horizon is too short."""
+        self._refresh()
+        entry = self._entries.get((commodity_key(commodity), market_key(market)))
+        if entry is None or (entry[1] == "success" and len(entry[3]) < days):
+            self.misses += 1
+            return None
+        if entry[0] != version:
+            self.stale += 1
+            return None
+        self.hits += 1
+        cached_version, status, start_ns, yhat = entry
+        if status != "success":
+            return status, None, None
+        dates = start_ns + NS_PER_DAY * np.arange(days, dtype=np.int64)
+        return status, dates, yhat[:days]
+
+    def stats(self):
+        self._refresh()
+        lookups = self.hits + self.misses + self.stale
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+# ---------- materialization ----------
+def list_model_sources(models_dir):
+    """(commodity, market, version, source) for every servable model.
+
+    Mirrors how the forecast service resolves a pair: the published model
+    store run first, then loose files (see `model_files`) for pairs the
+    store does not have. `source` is ("store", rowid) or
+    ("file", path).
+    """
+    sources = {}
+    store_path = os.path.join(models_dir, MODEL_STORE_NAME)
+    if os.path.exists(store_path):
+        store = ModelStore(store_path)
+        for entry in store.entries():
+            key = (commodity_key(entry["commodity"]), market_key(entry["market"]))
+            sources[key] = (entry["commodity"], entry["market"], store_version(entry),
+                            ("store", entry["rowid"]))
+        store.close()
+
+    for key, (path, commodity, market) in sorted(model_files(models_dir).items()):
+        if key not in sources:
+            sources[key] = (commodity, market, file_version(path), ("file", path))
+    return list(sources.values())
+
+
+_worker_stores = {}
+
+def _load_source(models_dir, source):
+    kind, ref = source
+    if kind == "store":
+        store_path = os.path.join(models_dir, MODEL_STORE_NAME)
+        store = _worker_stores.get(store_path)
+        if store is None:
+            store = _worker_stores[store_path] = ModelStore(store_path)
+        return store.load({"rowid": ref})
+    if ref.endswith(COMPACT_SUFFIX):
+        return load_compact(ref, mmap=False)
+    return joblib.load(ref)
+
+
+def compute_forecast(models_dir, commodity, market, version, source, horizon):
+    """Forecast dict for one pair, as written by `ForecastCache.write`."""
+    from src.prediction.forecast import make_forecast
+
+    model = _load_source(models_dir, source)
+    if not isinstance(model, FastPredictor):
+        model = load_fast_predictor(model) or model
+    forecast = make_forecast(model, horizon)
+    result = {"commodity": commodity, "market": market, "version": version,
+              "status": "failed", "start_ns": None, "yhat": None}
+    if forecast is not None:
+        result.update(status="success",
+                      start_ns=int(forecast['ds'].values[0].astype('datetime64[ns]').astype(np.int64)),
+                      yhat=forecast['yhat'].to_numpy(dtype=np.float64))
+    return result
+
+
+def materialize_forecasts(models_dir, cache_path=None, horizon=FORECAST_HORIZON, workers=1, force=False):
+    """Compute forecasts up to `horizon` days for every model in `models_dir`.
+
+    Pairs whose cached forecast already comes from the current model
+    version are skipped unless `force`. Pairs whose model disappeared are
+    dropped. Returns (computed, skipped) counts.
+    """
+    cache = ForecastCache(cache_path or os.path.join(models_dir, FORECAST_CACHE_NAME))
+    sources = list_model_sources(models_dir)
+    cached = cache.versions()
+    current = {(commodity_key(c), market_key(m)) for c, m, _, _ in sources}
+
+    todo = [s for s in sources
+            if force or cached.get((commodity_key(s[0]), market_key(s[1]))) != s[2]]
+    results = []
+    if workers is None or workers <= 1:
+        for commodity, market, version, source in todo:
+            results.append(compute_forecast(models_dir, commodity, market, version, source, horizon))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(compute_forecast, models_dir, c, m, v, s, horizon) for c, m, v, s in todo]
+            results = [f.result() for f in futures]
+
+    gone = [key for key in cached if key not in current]
+    if results or gone:
+        cache.write(results, remove=gone)
+    return len(results), len(sources) - len(todo)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Precompute forecasts for every trained model")
+    parser.add_argument("models_dir")
+    parser.add_argument("--cache", default=None,
+                        help=f"forecast cache file (default: <models_dir>/{FORECAST_CACHE_NAME})")
+    parser.add_argument("--horizon", type=int, default=FORECAST_HORIZON)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--force", action="store_true", help="recompute pairs that are up to date")
+    parser.add_argument("--every", type=float, default=None,
+                        help="keep running and refresh every N seconds")
+    args = parser.parse_args()
+
+    while True:
+        started = time.perf_counter()
+        computed, skipped = materialize_forecasts(args.models_dir, args.cache, args.horizon,
+                                                  args.workers, args.force)
+        print(f"✅ Forecast cache: {computed} computed, {skipped} up to date "
+              f"({time.perf_counter() - started:.1f}s)")
+        if not args.every:
+            sys.exit(0)
+        time.sleep(args.every)
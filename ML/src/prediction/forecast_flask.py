@@ -1,11 +1,31 @@
 import os
+import gzip
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
 import joblib
 import pandas as pd
 import numpy as np
 from prophet import Prophet
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g
 from flask_cors import CORS  # Optional: For allowing frontend requests
 
+from src.prediction.model_cache import ModelCache
+from src.prediction.metrics import CONTENT_TYPE, REGISTRY
+from src.prediction.fast_predict import FastPredictor, load_fast_predictor
+from src.prediction.compact_model import COMPACT_SUFFIX, load_compact
+from src.prediction.pooled_model import POOLED_MODEL_NAME
+from src.prediction.alerts import LEVELS, AlertEngine
+from src.prediction.baseline import BaselineForecaster, BaselineSeries
+from src.prediction.forecast_cache import FORECAST_CACHE_NAME, ForecastCache, file_version, store_version
+from src.preprocessing.keys import request_pair
+from src.storage.model_store import MODEL_STORE_NAME, ModelStore, model_files
+from src.storage.price_store import PriceStore
+from src.storage.aggregates import DIMENSIONS, TIME_BUCKETS, AggregateTable, summary
+
 # Initialize Flask App
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes (useful if connecting to React/Vue/etc.)
@@ -14,9 +34,69 @@ CORS(app)  # Enable CORS for all routes (useful if connecting to React/Vue/etc.)
 MODELS_DIR = r"C:\Users\swaru\Downloads\avfs303_backend\avfs303_backend\saved_models"
 CSV_FILE_PATH = r'D:\code\PricePulse\backend\dataset\commodity_dataset.csv'  
 
+# Model cache limits (entries and approximate bytes held in memory)
+MODEL_CACHE_MAX_ENTRIES = 128
+MODEL_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# forecasting engines: one Prophet model per pair, the pooled model (pooled_trainer.py),
+# or the statistical baseline over the price history (fast mode, also the fallback tier)
+ENGINES = ("prophet", "pooled", "baseline")
+DEFAULT_ENGINE = "prophet"
+
+def wrap_model(model):
+    """Swap a Prophet model for its fast predictor when supported"""
+    if isinstance(model, FastPredictor):
+        return model
+    return load_fast_predictor(model) or model
+
+def load_model(filepath):
+    """Deserialize a model file (compact bundle or pickle)"""
+    if filepath.endswith(COMPACT_SUFFIX):
+        return load_compact(filepath)
+    return wrap_model(joblib.load(filepath))
+
+def model_size(model):
+    """In-memory size of fast predictors; None lets the cache use the file size"""
+    if isinstance(model, FastPredictor):
+        return model.nbytes
+    return None
+
+model_cache = ModelCache(loader=load_model,
+                         max_entries=MODEL_CACHE_MAX_ENTRIES,
+                         max_bytes=MODEL_CACHE_MAX_BYTES,
+                         sizeof=model_size)
+
+# ---------- metrics (served on /metrics) ----------
+REQUEST_SECONDS = REGISTRY.histogram(
+    "pricepulse_request_seconds", "Request latency by endpoint", ["endpoint"])
+REQUESTS = REGISTRY.counter(
+    "pricepulse_requests_total", "Requests by endpoint and HTTP status code", ["endpoint", "code"])
+STAGE_SECONDS = REGISTRY.histogram(
+    "pricepulse_stage_seconds",
+    "Latency of request stages (forecast_cache, model_load, future_frame, model_predict, fast_predict, "
+    "serialize, fallback_baseline, commodities_select, commodities_records, json_encode, gzip)", ["stage"])
+FORECASTS = REGISTRY.counter(
+    "pricepulse_forecasts_total", "Forecasts served by endpoint and status (success or fallback_*)",
+    ["endpoint", "status"])
+RESPONSE_CACHE_LOOKUPS = REGISTRY.counter(
+    "pricepulse_response_cache_lookups_total", "/api/commodities response body cache lookups", ["result"])
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    started = g.get("request_started")
+    if started is not None and request.endpoint != "metrics":
+        endpoint = request.endpoint or "not_found"
+        REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+        REQUESTS.inc(endpoint=endpoint, code=str(response.status_code))
+    return response
+
 def get_demo_fallback_data(days=7):
-    """Generates plausible dummy data if the model is broken"""
-    print("⚠️ Model prediction failed (NaNs). Switching to Demo Fallback calculation.")
+    """Generates plausible dummy data when nothing better is available"""
+    print("⚠️ No usable model or price history. Switching to Demo Fallback calculation.")
     dates = pd.date_range(start=pd.Timestamp.now(), periods=days)
     
     # Generate random prices around 35 range
@@ -33,6 +113,11 @@ def get_demo_fallback_data(days=7):
 
 def make_forecast(model, days=7):
     """Core logic to generate forecast from a loaded model"""
+    # Fast path: closed-form evaluation of the extracted parameters
+    if isinstance(model, (FastPredictor, BaselineSeries)):
+        with STAGE_SECONDS.time(stage="fast_predict"):
+            return model.forecast(days)
+
     # 1. CRITICAL FIX: Disable uncertainty sampling
     model.uncertainty_samples = 0
 
@@ -40,29 +125,31 @@ def make_forecast(model, days=7):
     if model.params is None or 'k' not in model.params or len(model.params['k']) == 0:
         return None
 
-    # 3. Create future dataframe
-    if model.history is not None and not model.history.empty:
-        last_date = model.history['ds'].max()
-    else:
-        last_date = pd.Timestamp.now()
-        
-    future = pd.DataFrame({'ds': pd.date_range(start=last_date + pd.Timedelta(days=1), periods=days)})
+    with STAGE_SECONDS.time(stage="future_frame"):
+        # 3. Create future dataframe
+        if model.history is not None and not model.history.empty:
+            last_date = model.history['ds'].max()
+        else:
+            last_date = pd.Timestamp.now()
 
-    # 4. Fill regressors (Buffer Stock) ROBUSTLY
-    if hasattr(model, 'extra_regressors') and model.extra_regressors:
-        for reg in model.extra_regressors:
-            avg_val = 5000.0 # Default fallback
-            
-            if hasattr(model, 'history') and reg in model.history:
-                hist_mean = model.history[reg].mean()
-                if not pd.isna(hist_mean):
-                    avg_val = hist_mean
-            
-            future[reg] = float(avg_val)
+        future = pd.DataFrame({'ds': pd.date_range(start=last_date + pd.Timedelta(days=1), periods=days)})
+
+        # 4. Fill regressors (Buffer Stock) ROBUSTLY
+        if hasattr(model, 'extra_regressors') and model.extra_regressors:
+            for reg in model.extra_regressors:
+                avg_val = 5000.0 # Default fallback
+
+                if hasattr(model, 'history') and reg in model.history:
+                    hist_mean = model.history[reg].mean()
+                    if not pd.isna(hist_mean):
+                        avg_val = hist_mean
+
+                future[reg] = float(avg_val)
 
     # 5. Predict
     try:
-        forecast = model.predict(future)
+        with STAGE_SECONDS.time(stage="model_predict"):
+            forecast = model.predict(future)
         
         # Check for NaNs in result
         if forecast['yhat'].isna().any():
@@ -79,36 +166,469 @@ def make_forecast(model, days=7):
         print(f"⚠️ Prediction logic error: {e}")
         return None
 
+_price_store = None
+_aggregates = None
+_baseline = None
+_alerts = None
+
+# /api/commodities paging and response caching
+MAX_PAGE_SIZE = 5000
+GZIP_MIN_BYTES = 1024
+RESPONSE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+_response_cache = OrderedDict()     # etag -> [body, gzipped body or None]
+_response_cache_lock = threading.Lock()
+
+def get_price_store():
+    """Columnar copy of CSV_FILE_PATH, reloaded when the file changes"""
+    global _price_store, _aggregates, _baseline, _alerts
+    if _price_store is None or _price_store.csv_path != CSV_FILE_PATH:
+        _price_store = PriceStore(CSV_FILE_PATH)
+        _aggregates = AggregateTable()
+        _aggregates.attach(_price_store)
+        _baseline = BaselineForecaster()
+        _baseline.attach(_price_store)
+        _alerts = AlertEngine(forecast_band)
+        _alerts.attach(_price_store)
+    _price_store.refresh()
+    return _price_store
+
+def query_list(name):
+    """Values of a query parameter given repeated and/or comma separated"""
+    values = []
+    for raw in request.args.getlist(name):
+        values.extend(v.strip() for v in raw.split(",") if v.strip())
+    return values
+
+def _cached_body(etag, build):
+    with _response_cache_lock:
+        entry = _response_cache.get(etag)
+        if entry is not None:
+            _response_cache.move_to_end(etag)
+            RESPONSE_CACHE_LOOKUPS.inc(result="hit")
+            return entry
+    RESPONSE_CACHE_LOOKUPS.inc(result="miss")
+    payload = build()
+    with STAGE_SECONDS.time(stage="json_encode"):
+        entry = [(app.json.dumps(payload) + "\n").encode("utf-8"), None]
+    with _response_cache_lock:
+        _response_cache[etag] = entry
+        total = sum(len(e[0]) + len(e[1] or b"") for e in _response_cache.values())
+        while total > RESPONSE_CACHE_MAX_BYTES and len(_response_cache) > 1:
+            _, old = _response_cache.popitem(last=False)
+            total -= len(old[0]) + len(old[1] or b"")
+    return entry
+
+def cached_json_response(etag, build):
+    """JSON response for `build()`, reused per ETag, with 304 and gzip support"""
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag, weak=True)
+        return response
+
+    entry = _cached_body(etag, build)
+    body = entry[0]
+    use_gzip = "gzip" in request.accept_encodings and len(body) >= GZIP_MIN_BYTES
+    if use_gzip:
+        if entry[1] is None:
+            with STAGE_SECONDS.time(stage="gzip"):
+                entry[1] = gzip.compress(body, compresslevel=6)
+        body = entry[1]
+
+    response = app.response_class(body, mimetype="application/json")
+    if use_gzip:
+        response.headers["Content-Encoding"] = "gzip"
+    response.headers["Vary"] = "Accept-Encoding"
+    response.set_etag(etag, weak=True)
+    return response
+
 @app.route("/api/commodities", methods=["GET"])
 def get_commodities():
+    """
+    Query parameters (all optional, values may be comma separated):
+      commodity, market, state   exact match on any of the values
+      start_date, end_date       inclusive YYYY-MM-DD bounds on `date`
+      fields                     columns to return
+      limit, cursor              page size and the `next_cursor` of the previous page
+    """
     try:
         # Check if file exists first to avoid crashing
         if not os.path.exists(CSV_FILE_PATH):
             return jsonify({"success": False, "error": "Data file not found"}), 404
 
-        # 1. Read the CSV file
-        df = pd.read_csv(CSV_FILE_PATH)
+        store = get_price_store()
 
-        # 2. Ensure numeric fields are numbers (Logic matching your original loop)
-        # This converts errors (like empty strings) to NaN, then fills NaN with 0
-        numeric_cols = ["min_price", "modal_price", "max_price"]
-        
-        for col in numeric_cols:
-            if col in df.columns:
-                # Force conversion to numeric, turn errors into NaN
-                df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-            else:
-                # If the column is missing in CSV, create it with 0s
-                df[col] = 0.0
+        filters = {}
+        for col in ("commodity", "market", "state"):
+            values = query_list(col)
+            if values:
+                if col not in store.indexes:
+                    return jsonify({"success": False, "error": f"Cannot filter on '{col}'"}), 400
+                filters[col] = values
+
+        start_date = request.args.get("start_date") or None
+        end_date = request.args.get("end_date") or None
+        try:
+            for value in (start_date, end_date):
+                if value is not None:
+                    pd.Timestamp(value)
+        except ValueError:
+            return jsonify({"success": False, "error": "Dates must be YYYY-MM-DD"}), 400
+
+        fields = query_list("fields") or None
+        try:
+            limit = int(request.args["limit"]) if request.args.get("limit") else None
+            cursor = int(request.args["cursor"]) if request.args.get("cursor") else None
+        except ValueError:
+            return jsonify({"success": False, "error": "'limit' and 'cursor' must be integers"}), 400
+        if limit is not None and not 1 <= limit <= MAX_PAGE_SIZE:
+            return jsonify({"success": False,
+                            "error": f"'limit' must be between 1 and {MAX_PAGE_SIZE}"}), 400
+
+        # same data file + same query -> same ETag, checked before any work is done
+        query = json.dumps([store.signature, sorted(filters.items()), start_date, end_date,
+                            fields, limit, cursor])
+        etag = hashlib.sha1(query.encode("utf-8")).hexdigest()
+
+        def build():
+            with STAGE_SECONDS.time(stage="commodities_select"):
+                # Rows come from the typed column store (price columns already coerced to numbers)
+                rows = store.select(filters, start_date, end_date)
+                next_cursor = None
+                if cursor is not None or limit is not None:
+                    if rows is None:
+                        rows = np.arange(store.n_rows)
+                    if cursor is not None:
+                        # cursor is the last row id of the previous page
+                        rows = rows[np.searchsorted(rows, cursor, side="right"):]
+                    if limit is not None and len(rows) > limit:
+                        rows = rows[:limit]
+                        next_cursor = str(int(rows[-1]))
+
+            with STAGE_SECONDS.time(stage="commodities_records"):
+                payload = {"success": True, "data": store.records(rows, fields)}
+            if limit is not None:
+                payload["next_cursor"] = next_cursor
+            return payload
+
+        return cached_json_response(etag, build)
+
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+# Upper bound on rows accepted by one ingest call
+MAX_INGEST_ROWS = 10000
+
+@app.route("/api/commodities/ingest", methods=["POST"])
+def ingest_commodities():
+    """
+    Append price rows to the dataset; aggregates and alerts update incrementally.
+    Expected JSON Input: {"rows": [{"commodity": "Onion", "market": "Pune APMC", ...}]}
+    """
+    try:
+        if not os.path.exists(CSV_FILE_PATH):
+            return jsonify({"success": False, "error": "Data file not found"}), 404
+
+        data = request.get_json(silent=True)
+        rows = data.get("rows") if isinstance(data, dict) else None
+        if not isinstance(rows, list) or not all(isinstance(r, dict) for r in rows):
+            return jsonify({"success": False, "error": "Expected a 'rows' list of objects"}), 400
+        if len(rows) > MAX_INGEST_ROWS:
+            return jsonify({"success": False, "error": f"At most {MAX_INGEST_ROWS} rows per call"}), 400
+
+        store = get_price_store()
+        for i, row in enumerate(rows):
+            error = store.invalid_row(row)
+            if error:
+                return jsonify({"success": False, "error": f"Row {i}: {error}"}), 400
+
+        added = store.append(rows)
+        return jsonify({"success": True, "ingested": int(len(added))})
+
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route("/api/aggregates", methods=["GET"])
+def get_aggregates():
+    """
+    Precomputed modal_price count/mean/min/max/latest per group.
+    Query parameters:
+      group_by                   comma separated subset of state, market, commodity
+      bucket                     optional time bucket: week or month (by default)
+      commodity, market, state   restrict to these values of grouped dimensions
+    """
+    try:
+        if not os.path.exists(CSV_FILE_PATH):
+            return jsonify({"success": False, "error": "Data file not found"}), 404
+
+        store = get_price_store()
+        dims = query_list("group_by")
+        bucket = request.args.get("bucket") or None
+        unknown = [d for d in dims if d not in DIMENSIONS]
+        if unknown or (bucket and bucket not in TIME_BUCKETS):
+            return jsonify({"success": False,
+                            "error": f"group_by must be within {list(DIMENSIONS)}, bucket within {list(TIME_BUCKETS)}"}), 400
+        if not _aggregates.has_grouping(dims, bucket):
+            return jsonify({"success": False,
+                            "error": f"Grouping {dims} by {bucket or 'no bucket'} is not materialized"}), 400
 
-        # 3. Convert DataFrame to a list of dictionaries
-        data = df.to_dict(orient='records')
+        filters = {d: query_list(d) for d in DIMENSIONS if query_list(d)}
+        dims = [d for d in DIMENSIONS if d in dims]
+        query = json.dumps(["aggregates", store.signature, dims, bucket, sorted(filters.items())])
+        etag = hashlib.sha1(query.encode("utf-8")).hexdigest()
+
+        return cached_json_response(etag, lambda: {
+            "success": True,
+            "group_by": dims,
+            "bucket": bucket,
+            "data": _aggregates.query(dims, bucket, filters),
+        })
+
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route("/api/stats", methods=["GET"])
+def get_stats():
+    """Record count and distinct commodities, markets and states."""
+    try:
+        if not os.path.exists(CSV_FILE_PATH):
+            return jsonify({"success": False, "error": "Data file not found"}), 404
+        return jsonify({"success": True, "stats": summary(get_price_store())})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route("/api/alerts", methods=["GET"])
+def get_alerts():
+    """
+    Current volatility alert (green / yellow / red) per commodity and market.
+    Query parameters (all optional, values may be comma separated):
+      commodity, market   only these pairs (any spelling)
+      level               only these alert levels
+    """
+    try:
+        if not os.path.exists(CSV_FILE_PATH):
+            return jsonify({"success": False, "error": "Data file not found"}), 404
+
+        get_price_store()
+        commodities, markets, levels = query_list("commodity"), query_list("market"), query_list("level")
+        if any(level not in LEVELS for level in levels):
+            return jsonify({"success": False, "error": f"level must be within {list(LEVELS)}"}), 400
+
+        if len(commodities) == 1 and len(markets) == 1:
+            # a single pair is one lookup
+            state = _alerts.state(commodities[0], markets[0])
+            data = [state] if state is not None and (not levels or state["level"] in levels) else []
+        else:
+            data = _alerts.states(levels or None, commodities or None, markets or None)
+        return jsonify({"success": True, "counts": _alerts.stats(), "data": data})
+
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route("/api/alerts/changes", methods=["GET"])
+def get_alert_changes():
+    """
+    Alert level changes in order; pass the last seen `sequence` as `since`
+    to get only newer ones.
+    """
+    try:
+        if not os.path.exists(CSV_FILE_PATH):
+            return jsonify({"success": False, "error": "Data file not found"}), 404
+        try:
+            since = int(request.args.get("since") or 0)
+        except ValueError:
+            return jsonify({"success": False, "error": "'since' must be an integer"}), 400
 
-        return jsonify({"success": True, "data": data})
+        get_price_store()
+        return jsonify({"success": True, "sequence": _alerts.sequence, "changes": _alerts.changes(since)})
 
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
+# Upper bound on pairs accepted by /predict/batch
+MAX_BATCH_PAIRS = 500
+
+_loose_models = (None, None, {})  # (models dir, its mtime, model_files index)
+
+def loose_model_files():
+    """model_files(MODELS_DIR), rescanned when files are added or removed"""
+    global _loose_models
+    try:
+        mtime = os.stat(MODELS_DIR).st_mtime_ns
+    except OSError:
+        return {}
+    if _loose_models[:2] != (MODELS_DIR, mtime):
+        _loose_models = (MODELS_DIR, mtime, model_files(MODELS_DIR))
+    return _loose_models[2]
+
+def loose_model_path(commodity, market):
+    """Loose model file for a pair under any spelling; the trainer's file
+    name when there is none"""
+    _, _, ck, mk = request_pair(commodity, market)
+    found = loose_model_files().get((ck, mk))
+    if found is not None:
+        return found[0]
+    return os.path.join(MODELS_DIR, f"{commodity}_{market}.pkl")
+
+_model_store = None
+
+def get_model_store():
+    """Model store in MODELS_DIR, or None while only loose files exist"""
+    global _model_store
+    path = os.path.join(MODELS_DIR, MODEL_STORE_NAME)
+    if _model_store is None or _model_store.path != path:
+        if not os.path.exists(path):
+            return None
+        _model_store = ModelStore(path)
+    return _model_store
+
+_forecast_cache = None
+
+def get_forecast_cache():
+    """Precomputed forecasts in MODELS_DIR, or None if never materialized"""
+    global _forecast_cache
+    path = os.path.join(MODELS_DIR, FORECAST_CACHE_NAME)
+    if _forecast_cache is None or _forecast_cache.path != path:
+        if not os.path.exists(path):
+            return None
+        _forecast_cache = ForecastCache(path)
+    return _forecast_cache
+
+def model_version(commodity, market):
+    """Version of the model get_model would serve for a pair, None if missing"""
+    store = get_model_store()
+    if store is not None:
+        entry = store.lookup(commodity, market)
+        if entry is not None:
+            return store_version(entry)
+    filepath = loose_model_path(commodity, market)
+    if os.path.exists(filepath):
+        return file_version(filepath)
+    return None
+
+def cached_forecast(commodity, market, days):
+    """(status, dates, yhat) from the forecast cache when it matches the
+    current model version, else None"""
+    cache = get_forecast_cache()
+    if cache is None:
+        return None
+    version = model_version(commodity, market)
+    if version is None:
+        return None
+    return cache.get(commodity, market, version, days)
+
+def get_model(commodity, market):
+    """Cached model for a normalized pair; raises FileNotFoundError if missing"""
+    store = get_model_store()
+    if store is not None:
+        entry = store.lookup(commodity, market)
+        if entry is not None:
+            key = ("store", entry['commodity'], entry['market'])
+            return model_cache.get_versioned(
+                key, entry['version'], lambda: wrap_model(store.load(entry)), entry['size'])
+
+    # loose files: prefer the compact bundle, fall back to the full Prophet pickle
+    return model_cache.get((commodity, market), loose_model_path(commodity, market))
+
+_pooled_model = (None, None, None)     # (path, mtime, PooledModel)
+
+def get_pooled_model():
+    """Pooled model in MODELS_DIR (reloaded when the file changes), or None"""
+    global _pooled_model
+    path = os.path.join(MODELS_DIR, POOLED_MODEL_NAME)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    if _pooled_model[:2] != (path, mtime):
+        _pooled_model = (path, mtime, joblib.load(path))
+    return _pooled_model[2]
+
+def get_pooled_predictor(commodity, market):
+    """Cached predictor for a pair's series in the pooled model; raises
+    FileNotFoundError if there is none"""
+    pooled = get_pooled_model()
+    if pooled is None or pooled.lookup(commodity, market) is None:
+        raise FileNotFoundError(f"{commodity}_{market} is not in the pooled model")
+    return model_cache.get_versioned(("pooled", commodity, market), _pooled_model[1],
+                                     lambda: pooled.predictor(commodity, market))
+
+def get_baseline_predictor(commodity, market):
+    """Baseline forecaster for a pair's price history; raises
+    FileNotFoundError if the price data has no such series"""
+    get_price_store()
+    predictor = _baseline.predictor(commodity, market)
+    if predictor is None:
+        raise FileNotFoundError(f"No price history for {commodity}_{market}")
+    return predictor
+
+def load_engine_model(commodity, market, engine):
+    if engine == "pooled":
+        return get_pooled_predictor(commodity, market)
+    if engine == "baseline":
+        return get_baseline_predictor(commodity, market)
+    return get_model(commodity, market)
+
+def fallback_forecast(commodity, market, days):
+    """Baseline forecast from the pair's price history when its model is
+    missing or broken; demo data only if there is no history either"""
+    try:
+        with STAGE_SECONDS.time(stage="fallback_baseline"):
+            forecast = get_baseline_predictor(commodity, market).forecast(days)
+        if forecast is not None:
+            return forecast
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"⚠️ Baseline forecast failed: {e}")
+    return get_demo_fallback_data(days)
+
+def forecast_band(commodity, market, days):
+    """Precomputed forecast of a price-data pair as the alert engine's
+    expected range, or None when none is materialized. Never loads a model:
+    alert reads stay cheap however many pairs they cover"""
+    commodity, market = request_pair(commodity, market)[:2]
+    hit = cached_forecast(commodity, market, days)
+    if hit is None or hit[0] != "success":
+        return None
+    _, dates, yhat = hit
+    return pd.DataFrame({'ds': pd.to_datetime(dates), 'yhat': yhat})
+
+def forecast_pair(commodity, market, days, engine=DEFAULT_ENGINE):
+    """Forecast one pair, falling back to demo data. Returns (forecast, status)"""
+    try:
+        # precomputed forecasts exist for the per-pair models only
+        if engine == "prophet":
+            with STAGE_SECONDS.time(stage="forecast_cache"):
+                hit = cached_forecast(commodity, market, days)
+            if hit is not None:
+                status, dates, yhat = hit
+                if status == "success":
+                    return pd.DataFrame({'ds': pd.to_datetime(dates), 'yhat': yhat}), "success"
+                return fallback_forecast(commodity, market, days), "fallback_model_error"
+
+        with STAGE_SECONDS.time(stage="model_load"):
+            model = load_engine_model(commodity, market, engine)
+
+        forecast = make_forecast(model, days)
+        status = "success"
+
+        if forecast is None:
+            forecast = fallback_forecast(commodity, market, days)
+            status = "fallback_model_error"
+
+    except FileNotFoundError:
+        print(f"❌ Model not found: {commodity}_{market}.pkl")
+        # Fallback for missing model
+        forecast = fallback_forecast(commodity, market, days)
+        status = "fallback_missing_model"
+
+    except Exception as e:
+        print(f"❌ Error loading/predicting: {e}")
+        forecast = fallback_forecast(commodity, market, days)
+        status = "fallback_exception"
+
+    return forecast, status
+
 @app.route('/predict', methods=['POST'])
 def predict():
     """
@@ -117,7 +637,8 @@ def predict():
     {
         "commodity": "Onion",
         "market": "Pune APMC",
-        "days": 7
+        "days": 7,
+        "engine": "prophet"    (optional: "prophet", "pooled" or "baseline")
     }
     """
     try:
@@ -126,56 +647,234 @@ def predict():
         # 1. Validate Input
         if not data:
             return jsonify({"status": "error", "message": "No JSON data provided"}), 400
-            
-        commodity = data.get('commodity', '').strip().replace(" ", "_")
-        market = data.get('market', '').strip().replace(" ", "_")
-        days = int(data.get('days', 7))
+        error = invalid_pair_values(data)
+        if error:
+            return jsonify({"status": "error", "message": error}), 400
+
+        commodity, market, _, _ = request_pair(data.get('commodity'), data.get('market'))
+        days, error = parse_days(data)
+        engine = data.get('engine') or DEFAULT_ENGINE
 
         if not commodity or not market:
             return jsonify({"status": "error", "message": "Missing 'commodity' or 'market'"}), 400
+        if error:
+            return jsonify({"status": "error", "message": error}), 400
+        if engine not in ENGINES:
+            return jsonify({"status": "error", "message": f"'engine' must be one of {', '.join(ENGINES)}"}), 400
 
-        # 2. Load Model
-        filename = f"{commodity}_{market}.pkl"
-        filepath = os.path.join(MODELS_DIR, filename)
+        # 2. Load Model & Forecast
+        forecast, status = forecast_pair(commodity, market, days, engine)
+        FORECASTS.inc(endpoint="predict", status=status)
 
-        if not os.path.exists(filepath):
-            print(f"❌ Model not found: {filepath}")
-            # Fallback for missing model
-            forecast = get_demo_fallback_data(days)
-            status = "fallback_missing_model"
+        # 3. Format Output for JSON
+        with STAGE_SECONDS.time(stage="serialize"):
+            # Convert Timestamp objects to string for JSON serialization
+            forecast['ds'] = forecast['ds'].dt.strftime('%Y-%m-%d')
+
+            result = forecast.to_dict(orient='records')
+
+            return jsonify({
+                "status": status,
+                "commodity": commodity,
+                "market": market,
+                "engine": engine,
+                "data": result
+            })
+
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+# Longest forecast one request may ask for, in days
+MAX_FORECAST_DAYS = 365
+
+def parse_days(data):
+    """(days, None) from a request body, defaulting to 7, or (None, error message)"""
+    days = data.get('days', 7)
+    if not isinstance(days, int) or isinstance(days, bool):
+        return None, "'days' must be an integer"
+    if not 1 <= days <= MAX_FORECAST_DAYS:
+        return None, f"'days' must be between 1 and {MAX_FORECAST_DAYS}"
+    return days, None
+
+def invalid_pair_values(item):
+    """Error message if 'commodity' or 'market' is given but not a string"""
+    if any(item.get(field) is not None and not isinstance(item.get(field), str) for field in ('commodity', 'market')):
+        return "'commodity' and 'market' must be strings"
+    return None
+
+def batch_forecast_pair(commodity, market, days, engine=DEFAULT_ENGINE):
+    """Forecast one pair for /predict/batch. Returns (dates, columns, status)"""
+    forecast = None
+    try:
+        hit = None
+        if engine == "prophet":
+            with STAGE_SECONDS.time(stage="forecast_cache"):
+                hit = cached_forecast(commodity, market, days)
+        if hit is not None and hit[0] == "success":
+            return hit[1].astype('datetime64[ns]'), {'yhat': hit[2]}, "success"
+
+        if hit is not None:
+            # this model version is known to produce NaNs
+            status = "fallback_model_error"
         else:
-            try:
-                model = joblib.load(filepath)
-                print(f"✅ Model loaded: {filename}")
-                
+            with STAGE_SECONDS.time(stage="model_load"):
+                model = load_engine_model(commodity, market, engine)
+
+            if isinstance(model, (FastPredictor, BaselineSeries)):
+                # evaluate straight to arrays, skipping the per-pair DataFrame
+                with STAGE_SECONDS.time(stage="fast_predict"):
+                    dates = model.future_dates(days)
+                    yhat = model.predict_yhat(dates)
+                if np.isfinite(yhat).all():
+                    return dates.astype('datetime64[ns]'), {'yhat': yhat}, "success"
+            else:
                 forecast = make_forecast(model, days)
-                status = "success"
+            status = "success" if forecast is not None else "fallback_model_error"
 
-                if forecast is None:
-                    forecast = get_demo_fallback_data(days)
-                    status = "fallback_model_error"
-                    
-            except Exception as e:
-                print(f"❌ Error loading/predicting: {e}")
-                forecast = get_demo_fallback_data(days)
-                status = "fallback_exception"
+    except FileNotFoundError:
+        status = "fallback_missing_model"
 
-        # 3. Format Output for JSON
-        # Convert Timestamp objects to string for JSON serialization
-        forecast['ds'] = forecast['ds'].dt.strftime('%Y-%m-%d')
-        
-        result = forecast.to_dict(orient='records')
+    except Exception as e:
+        print(f"❌ Error loading/predicting: {e}")
+        status = "fallback_exception"
 
-        return jsonify({
-            "status": status,
-            "commodity": commodity,
-            "market": market,
-            "data": result
-        })
+    if forecast is None:
+        forecast = fallback_forecast(commodity, market, days)
+
+    columns = {col: forecast[col].values for col in ['yhat', 'yhat_lower', 'yhat_upper']
+               if col in forecast.columns}
+    return forecast['ds'].values, columns, status
+
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    """
+    Batch API Endpoint.
+    Expected JSON Input:
+    {
+        "pairs": [
+            {"commodity": "Onion", "market": "Pune APMC"},
+            {"commodity": "Tomato", "market": "Vashi APMC"}
+        ],
+        "days": 7,
+        "engine": "prophet"    (optional: "prophet", "pooled" or "baseline")
+    }
+    Response: distinct forecast date lists are sent once in "dates" and each
+    result refers to one of them by index, with its own "status".
+    """
+    try:
+        data = request.get_json()
+
+        if not data or not isinstance(data.get('pairs'), list):
+            return jsonify({"status": "error", "message": "Expected a 'pairs' list"}), 400
+
+        pairs = data['pairs']
+        days, error = parse_days(data)
+        engine = data.get('engine') or DEFAULT_ENGINE
+        if error:
+            return jsonify({"status": "error", "message": error}), 400
+        if engine not in ENGINES:
+            return jsonify({"status": "error", "message": f"'engine' must be one of {', '.join(ENGINES)}"}), 400
+        if len(pairs) > MAX_BATCH_PAIRS:
+            return jsonify({"status": "error",
+                            "message": f"At most {MAX_BATCH_PAIRS} pairs per batch"}), 400
+
+        date_sets = []      # list of formatted date lists
+        date_index = {}     # first forecast day -> index into date_sets
+        computed = {}       # (commodity, market) -> entry, so duplicates share one
+        results = []
+
+        for pair in pairs:
+            if not isinstance(pair, dict):
+                pair = {}
+            error = invalid_pair_values(pair)
+            if error:
+                results.append({"commodity": None, "market": None, "status": "error", "message": error})
+                continue
+            commodity, market, _, _ = request_pair(pair.get('commodity'), pair.get('market'))
+
+            if not commodity or not market:
+                results.append({"commodity": commodity, "market": market, "status": "error",
+                                "message": "Missing 'commodity' or 'market'"})
+                continue
+
+            key = (commodity, market)
+            if key not in computed:
+                dates, columns, status = batch_forecast_pair(commodity, market, days, engine)
+                FORECASTS.inc(endpoint="predict_batch", status=status)
+
+                # forecasts starting on the same day share one formatted date list
+                first_day = np.datetime64(dates[0], 'D')
+                if first_day not in date_index:
+                    date_index[first_day] = len(date_sets)
+                    date_sets.append(pd.DatetimeIndex(dates).strftime('%Y-%m-%d').tolist())
+
+                entry = {"commodity": commodity, "market": market, "status": status,
+                         "dates": date_index[first_day]}
+                for col, values in columns.items():
+                    entry[col] = values.tolist()
+                computed[key] = entry
+            results.append(computed[key])
+
+        with STAGE_SECONDS.time(stage="serialize"):
+            return jsonify({
+                "status": "success",
+                "days": days,
+                "engine": engine,
+                "dates": date_sets,
+                "results": results
+            })
 
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
+@app.route('/api/models', methods=['GET'])
+def list_models():
+    """Pairs available in the published model store run."""
+    store = get_model_store()
+    if store is None:
+        return jsonify({"status": "error", "message": "No model store"}), 404
+    return jsonify({"status": "success", "run": store.current_run(), "models": store.list_pairs()})
+
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    """Hit/miss/eviction counters for the in-process model and forecast caches."""
+    forecast_cache = get_forecast_cache()
+    return jsonify({"status": "success", "model_cache": model_cache.stats(),
+                    "forecast_cache": forecast_cache.stats() if forecast_cache is not None else None})
+
+def _model_cache_stats():
+    stats = model_cache.stats()
+    return {(event,): stats[event] for event in ("hits", "misses", "evictions", "invalidations")}
+
+def _forecast_cache_stats():
+    cache = get_forecast_cache()
+    if cache is None:
+        return {}
+    stats = cache.stats()
+    return {("hit",): stats["hits"], ("miss",): stats["misses"], ("stale",): stats["stale"]}
+
+def _response_cache_bytes():
+    with _response_cache_lock:
+        return {(): sum(len(e[0]) + len(e[1] or b"") for e in _response_cache.values())}
+
+REGISTRY.collected("pricepulse_model_cache_events_total", "Model cache hits, misses, evictions and invalidations",
+                   "counter", ["event"], _model_cache_stats)
+REGISTRY.collected("pricepulse_model_cache_entries", "Models held in memory", "gauge", [],
+                   lambda: {(): model_cache.stats()["entries"]})
+REGISTRY.collected("pricepulse_model_cache_bytes", "Approximate bytes of models held in memory", "gauge", [],
+                   lambda: {(): model_cache.stats()["bytes"]})
+REGISTRY.collected("pricepulse_forecast_cache_lookups_total", "Precomputed forecast lookups by result",
+                   "counter", ["result"], _forecast_cache_stats)
+REGISTRY.collected("pricepulse_alert_pairs", "Commodity/market pairs per volatility alert level", "gauge",
+                   ["level"], lambda: {(level,): _alerts.counts[level] for level in LEVELS} if _alerts else {})
+REGISTRY.collected("pricepulse_response_cache_bytes", "Bytes of cached /api/commodities bodies", "gauge", [],
+                   _response_cache_bytes)
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics: request and stage latency, forecast statuses, caches."""
+    return app.response_class(REGISTRY.render(), content_type=CONTENT_TYPE)
+
 if __name__ == "__main__":
     # Debug=True allows auto-reload on code changes
     app.run(debug=True, port=5001)
\ No newline at end of file
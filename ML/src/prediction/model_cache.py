@@ -0,0 +1,129 @@
+import os
+import threading
+from collections import OrderedDict
+
+import joblib
+
+
+class ModelCache:
+    """Bounded, thread-safe LRU cache of deserialized forecasting models.
+
+    Entries are keyed on (commodity, market) and remember the mtime of the
+    file they were loaded from, so a retrained model replaces the cached one
+    on the next lookup. The memory cap is enforced against `sizeof(model)`
+    when it returns a size, otherwise against the entry's on-disk size,
+    which tracks the unpickled object size closely enough for sizing.
+    """
+
+    def __init__(self, loader=joblib.load, max_entries=128, max_bytes=512 * 1024 * 1024,
+                 sizeof=None):
+        self.loader = loader
+        self.sizeof = sizeof
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self._entries = OrderedDict()  # key -> (version, size, model)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    # ---------- lookup ----------
+    def get(self, key, path):
+        """Return the model for `key`, loading it from `path` on a miss.
+
+        Raises FileNotFoundError if `path` does not exist (any stale entry
+        for the key is dropped first).
+        """
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            self.invalidate(key)
+            raise
+        return self.get_versioned(key, st.st_mtime_ns, lambda: self.loader(path), st.st_size)
+
+    def get_versioned(self, key, version, load, default_size=0):
+        """Return the model cached for `key` at `version`, calling `load()` on a miss.
+
+        Any entry cached for the key at a different version is replaced.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] == version:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[2]
+                # source changed since it was cached
+                self._remove(key)
+                self.invalidations += 1
+            self.misses += 1
+
+        # deserialize outside the lock so other keys are not blocked
+        model = load()
+        size = self.sizeof(model) if self.sizeof is not None else None
+        if size is None:
+            size = default_size
+
+        with self._lock:
+            current = self._entries.get(key)
+            if current is not None and current[0] == version:
+                # another thread loaded the same version meanwhile
+                self._entries.move_to_end(key)
+                return current[2]
+            if current is not None:
+                self._remove(key)
+            self._entries[key] = (version, size, model)
+            self._bytes += size
+            self._evict()
+        return model
+
+    def invalidate(self, key=None):
+        """Drop one entry, or the whole cache when `key` is None."""
+        with self._lock:
+            if key is None:
+                self.invalidations += len(self._entries)
+                self._entries.clear()
+                self._bytes = 0
+            elif key in self._entries:
+                self._remove(key)
+                self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            }
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    # ---------- internals (caller holds the lock) ----------
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def _evict(self):
+        # always keep the most recently inserted entry, even if it alone exceeds the cap
+        while len(self._entries) > 1 and (
+                len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            key = next(iter(self._entries))
+            self._remove(key)
+            self.evictions += 1
@@ -0,0 +1,221 @@
+import numpy as np
+import pandas as pd
+
+from src.prediction.fast_predict import NS_PER_DAY, FastPredictor
+from src.preprocessing.keys import commodity_key, market_key
+
+POOLED_MODEL_NAME = "pooled_model.pkl"
+REGRESSOR = "buffer_stock_qty_kg"
+# (name, period in days, Fourier order), in FastPredictor column order
+SEASONALITIES = [("yearly", 365.25, 10), ("weekly", 7.0, 3)]
+N_CHANGEPOINTS = 10
+CHANGEPOINT_RANGE = 0.8
+# ridge penalties, in units of squared scaled residuals
+CHANGEPOINT_PENALTY = 1.0       # per-series trend changes
+DEVIATION_PENALTY = 10.0        # commodity seasonality/regressor away from the shared one
+SHARED_PENALTY = 1e-6           # shared coefficients (keeps the system definite)
+LEVEL_PENALTY = 1e-8            # per-series level and slope
+# padded rows per batch of series while accumulating the normal equations
+BATCH_ROWS = 1_000_000
+
+
+def fourier_features(days):
+    """Seasonal features (sin, cos interleaved per term) for days since the
+    epoch, the same columns FastPredictor evaluates."""
+    frequencies = np.concatenate([np.arange(1, order + 1) / period for _, period, order in SEASONALITIES])
+    angles = 2 * np.pi * np.asarray(days, dtype=float)[..., None] * frequencies
+    features = np.empty(angles.shape[:-1] + (2 * frequencies.size,))
+    features[..., 0::2] = np.sin(angles)
+    features[..., 1::2] = np.cos(angles)
+    return features
+
+
+class PooledModel:
+    """One model for every commodity/market series.
+
+    Each series is fitted on its own scale (prices divided by the series
+    mean) as
+
+        y / scale = level + slope * t + sum_k delta_k * max(t - c_k, 0)
+                    + seasonality(date) + beta * standardized buffer stock
+
+    with `t` running 0..1 over the series' history like in Prophet. Level,
+    slope and the changepoint deltas belong to the series; the Fourier
+    seasonality and buffer stock coefficients are shared by all series plus
+    a per-commodity deviation that is shrunk towards the shared values, so
+    commodities with few markets borrow strength from the rest.
+
+    Everything is one ridge-regularised least squares problem. The
+    per-series unknowns are eliminated in batches (Schur complement), which
+    leaves a small dense system for the shared coefficients, so fitting is
+    a few batched matrix products over the rows instead of one Stan run per
+    pair. Every series evaluates as a FastPredictor, so the serving fast
+    path and compact export work unchanged.
+    """
+
+    def __init__(self, commodities, markets, trend, beta, changepoints_t, start_days, span_days,
+                 scale, regressor_mu, regressor_std):
+        self.commodities = list(commodities)
+        self.markets = list(markets)
+        # per series: [level, slope, delta_1..delta_K]
+        self.trend = np.asarray(trend, dtype=float)
+        # per series: seasonal then buffer stock coefficients
+        self.beta = np.asarray(beta, dtype=float)
+        self.changepoints_t = np.asarray(changepoints_t, dtype=float)
+        self.start_days = np.asarray(start_days, dtype=np.int64)
+        self.span_days = np.asarray(span_days, dtype=np.int64)
+        self.scale = np.asarray(scale, dtype=float)
+        self.regressor_mu = np.asarray(regressor_mu, dtype=float)
+        self.regressor_std = np.asarray(regressor_std, dtype=float)
+        self._index = {(commodity_key(c), market_key(m)): i
+                       for i, (c, m) in enumerate(zip(self.commodities, self.markets))}
+
+    def __getstate__(self):
+        state = dict(vars(self))
+        del state['_index']
+        return state
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def __len__(self):
+        return len(self.commodities)
+
+    # ---------- fitting ----------
+    @classmethod
+    def fit(cls, series, n_changepoints=N_CHANGEPOINTS, changepoint_penalty=CHANGEPOINT_PENALTY,
+            deviation_penalty=DEVIATION_PENALTY, batch_rows=BATCH_ROWS):
+        """Fit every series at once.
+
+        `series` yields (commodity, market, frame) with the daily ds / y /
+        buffer_stock_qty_kg frames of ModelTrainer.iter_prepared_pairs
+        (sorted by ds, at least two distinct days).
+        """
+        commodities, markets, frames = [], [], []
+        for commodity, market, frame in series:
+            commodities.append(commodity)
+            markets.append(market)
+            frames.append(frame)
+        if not frames:
+            raise ValueError("No series to fit")
+
+        lengths = np.array([len(f) for f in frames])
+        offsets = np.r_[0, np.cumsum(lengths)]
+        days = np.concatenate([f['ds'].to_numpy(dtype='datetime64[D]').astype(np.int64) for f in frames])
+        y = np.concatenate([f['y'].to_numpy(dtype=float) for f in frames])
+        buffer = np.concatenate([f[REGRESSOR].to_numpy(dtype=float) for f in frames])
+        del frames
+
+        # per-series scaling, vectorized over the concatenated rows
+        starts = offsets[:-1]
+        start_days = days[starts]
+        span_days = np.maximum(days[offsets[1:] - 1] - start_days, 1)
+        scale = np.add.reduceat(np.abs(y), starts) / lengths
+        scale[scale == 0] = 1.0
+        mu = np.add.reduceat(buffer, starts) / lengths
+        std = np.sqrt(np.add.reduceat((buffer - np.repeat(mu, lengths)) ** 2, starts) / lengths)
+        std[std == 0] = 1.0
+
+        changepoints_t = np.linspace(0, CHANGEPOINT_RANGE, n_changepoints + 1)[1:]
+        commodity_ids, commodity_names = pd.factorize(pd.Series(commodities))
+        n_series, n_commodities = len(lengths), len(commodity_names)
+        n_trend = 2 + n_changepoints
+        n_shared = 2 * sum(order for _, _, order in SEASONALITIES) + 1
+
+        # seasonal features depend on the date only: evaluate each calendar day once
+        first_day = days.min()
+        seasonal = fourier_features(np.arange(first_day, days.max() + 1))
+
+        trend_penalty = np.r_[LEVEL_PENALTY, LEVEL_PENALTY, np.full(n_changepoints, changepoint_penalty)]
+        # D^-1 E and D^-1 d per series, for recovering the trend terms
+        solved_shared = np.empty((n_series, n_trend, n_shared))
+        solved_target = np.empty((n_series, n_trend))
+        # Schur complement blocks, summed per commodity (the shared block is their sum)
+        schur = np.zeros((n_commodities, n_shared, n_shared))
+        schur_rhs = np.zeros((n_commodities, n_shared))
+
+        batch = max(1, batch_rows // int(lengths.max()))
+        for lo in range(0, n_series, batch):
+            hi = min(lo + batch, n_series)
+            width = int(lengths[lo:hi].max())
+            step = np.arange(width)
+            mask = step < lengths[lo:hi, None]
+            rows = np.where(mask, offsets[lo:hi, None] + step, offsets[lo:hi, None])
+
+            t = (days[rows] - start_days[lo:hi, None]) / span_days[lo:hi, None]
+            features = np.concatenate([
+                np.ones(t.shape + (1,)),
+                t[..., None],
+                np.maximum(t[..., None] - changepoints_t, 0),
+                seasonal[days[rows] - first_day],
+                ((buffer[rows] - mu[lo:hi, None]) / std[lo:hi, None])[..., None],
+                (y[rows] / scale[lo:hi, None])[..., None],
+            ], axis=2)
+            features *= mask[..., None]
+            gram = features.transpose(0, 2, 1) @ features
+
+            trend_gram = gram[:, :n_trend, :n_trend] + np.diag(trend_penalty)
+            cross = gram[:, :n_trend, n_trend:]     # shared features and target
+            solved = np.linalg.solve(trend_gram, cross)
+            solved_shared[lo:hi] = solved[:, :, :-1]
+            solved_target[lo:hi] = solved[:, :, -1]
+
+            reduced = gram[:, n_trend:, n_trend:] - cross.transpose(0, 2, 1) @ solved
+            np.add.at(schur, commodity_ids[lo:hi], reduced[:, :-1, :-1])
+            np.add.at(schur_rhs, commodity_ids[lo:hi], reduced[:, :-1, -1])
+
+        # shared coefficients: [global | commodity 0 deviation | commodity 1 deviation | ...]
+        size = n_shared * (1 + n_commodities)
+        system = np.zeros((size, size))
+        rhs = np.zeros(size)
+        system[:n_shared, :n_shared] = schur.sum(axis=0) + SHARED_PENALTY * np.eye(n_shared)
+        rhs[:n_shared] = schur_rhs.sum(axis=0)
+        for c in range(n_commodities):
+            block = slice(n_shared * (c + 1), n_shared * (c + 2))
+            system[block, :n_shared] = schur[c]
+            system[:n_shared, block] = schur[c]
+            system[block, block] = schur[c] + deviation_penalty * np.eye(n_shared)
+            rhs[block] = schur_rhs[c]
+        theta = np.linalg.solve(system, rhs).reshape(1 + n_commodities, n_shared)
+
+        beta = theta[0] + theta[1:][commodity_ids]
+        trend = solved_target - np.einsum('spq,sq->sp', solved_shared, beta)
+        return cls(commodities, markets, trend, beta, changepoints_t, start_days, span_days,
+                   scale, mu, std)
+
+    # ---------- serving ----------
+    def lookup(self, commodity, market):
+        """Series index for a pair (any spelling), or None."""
+        return self._index.get((commodity_key(commodity), market_key(market)))
+
+    def predictor(self, commodity, market):
+        """FastPredictor evaluating one pair's series, or None if not fitted."""
+        i = self.lookup(commodity, market)
+        if i is None:
+            return None
+        n_changepoints = len(self.changepoints_t)
+        return FastPredictor(
+            growth='linear',
+            k=self.trend[i, 1],
+            m=self.trend[i, 0],
+            deltas=self.trend[i, 2:2 + n_changepoints],
+            changepoints_t=self.changepoints_t,
+            start_ns=int(self.start_days[i]) * NS_PER_DAY,
+            t_scale_ns=int(self.span_days[i]) * NS_PER_DAY,
+            y_scale=self.scale[i],
+            floor=0.0,
+            seasonalities=[{'name': name, 'period': period, 'fourier_order': order, 'mode': 'additive'}
+                           for name, period, order in SEASONALITIES],
+            # future buffer stock is filled with the history mean, as in make_forecast
+            regressors=[{'name': REGRESSOR, 'fill': self.regressor_mu[i], 'mu': self.regressor_mu[i],
+                         'std': self.regressor_std[i], 'mode': 'additive'}],
+            beta=self.beta[i],
+            last_date_ns=int(self.start_days[i] + self.span_days[i]) * NS_PER_DAY,
+        )
+
+    def pairs(self):
+        return list(zip(self.commodities, self.markets))
+
+    @property
+    def nbytes(self):
+        return sum(v.nbytes for v in vars(self).values() if isinstance(v, np.ndarray))
@@ -0,0 +1,105 @@
+import re
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+# Three spellings of a commodity/market pair are in use:
+#   canonical  - what the trainer stores and names files after:
+#                "Green Chilli" / "Pune_APMC" (markets always end in APMC)
+#   file name  - "<commodity with _ for spaces and />_<canonical market>"
+#   key        - case/punctuation-insensitive lookup key, market without the
+#                APMC suffix: "green_chilli" / "pune"
+# Requests may use any spelling; they are resolved through the keys.
+
+UNKNOWN_MARKET = "Unknown_APMC"
+MARKET_SUFFIX = "APMC"
+CACHE_SIZE = 65536
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+# ---------- single values (memoized, for request-time lookups) ----------
+@lru_cache(maxsize=CACHE_SIZE)
+def canonical_commodity(name):
+    return str(name).strip()
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def canonical_market(name):
+    """Trainer market name: "Pune APMC" / "Pune" -> "Pune_APMC"."""
+    if pd.isna(name):
+        return UNKNOWN_MARKET
+    m = str(name).strip().replace("/", "_").replace(" ", "_")
+    if not m.upper().endswith(MARKET_SUFFIX):
+        m = m + "_" + MARKET_SUFFIX
+    return m
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def file_part(name):
+    """Name with spaces and slashes replaced, as used in model file names."""
+    return str(name).replace(" ", "_").replace("/", "_")
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def commodity_key(name):
+    """Case/spacing-insensitive commodity key ("Green Chilli" -> "green_chilli")."""
+    return _NON_ALNUM.sub("_", str(name or "").strip().lower()).strip("_")
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def market_key(name):
+    """Market key with the optional APMC suffix dropped, so "Dubagga Mandi",
+    "Dubagga_Mandi" and "Dubagga_Mandi_APMC" resolve to the same model."""
+    key = commodity_key(name)
+    if key.endswith("_apmc"):
+        key = key[:-len("_apmc")]
+    elif key == "apmc":
+        key = ""
+    return key
+
+
+def model_basename(commodity, market):
+    """Model file name (without extension) the trainer writes for a pair."""
+    return f"{file_part(canonical_commodity(commodity))}_{canonical_market(market)}"
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def request_pair(commodity, market):
+    """(commodity, market, commodity_key, market_key) for request values.
+
+    The names are in file-name form ("Green_Chilli", "Pune_APMC"), matching
+    the trainer's model files; empty or missing values give empty strings.
+    """
+    commodity = str(commodity or "").strip()
+    market = str(market or "").strip()
+    if not commodity or not market:
+        return file_part(commodity), file_part(market), "", ""
+    return (file_part(canonical_commodity(commodity)), canonical_market(market),
+            commodity_key(commodity), market_key(market))
+
+
+# ---------- columns (each distinct value normalized once) ----------
+def _map_unique(values, transform):
+    """Categorical Series of `transform` (Index -> Index, vectorized) applied
+    to the distinct values of `values`; missing values stay missing."""
+    values = values.astype("category")
+    mapped, categories = pd.factorize(transform(values.cat.categories.astype(str)))
+    # trailing -1 so missing values (code -1) stay missing
+    mapped = np.append(mapped, -1)
+    return pd.Series(pd.Categorical.from_codes(mapped[values.cat.codes.to_numpy()], categories),
+                     index=values.index)
+
+
+def canonical_commodities(values):
+    """Vectorized canonical_commodity over a Series."""
+    return _map_unique(values, lambda names: names.str.strip())
+
+
+def canonical_markets(values):
+    """Vectorized canonical_market over a Series (missing values stay missing)."""
+    def transform(names):
+        m = names.str.strip().str.replace("/", "_", regex=False).str.replace(" ", "_", regex=False)
+        return m.where(m.str.upper().str.endswith(MARKET_SUFFIX), m + "_" + MARKET_SUFFIX)
+    return _map_unique(values, transform)
@@ -0,0 +1,214 @@
+import threading
+from itertools import combinations
+
+import numpy as np
+
+from src.storage.price_store import NO_DATE
+
+# group-by dimensions, in the order they appear in keys and results
+DIMENSIONS = ("state", "market", "commodity")
+TIME_BUCKETS = ("day", "week", "month", "year")
+VALUE_COLUMN = "modal_price"
+
+
+def default_groupings():
+    """Every subset of DIMENSIONS, un-bucketed and by week and month."""
+    groupings = []
+    for n in range(len(DIMENSIONS) + 1):
+        for dims in combinations(DIMENSIONS, n):
+            for bucket in (None, "week", "month"):
+                if dims or bucket:
+                    groupings.append((dims, bucket))
+    return groupings
+
+
+def bucket_ids(days, bucket):
+    """Integer bucket id per day number (days since epoch)."""
+    days = np.asarray(days, dtype=np.int64)
+    if bucket == "day":
+        return days
+    if bucket == "week":
+        # 1970-01-01 was a Thursday; ids are the week's Monday
+        return days - (days + 3) % 7
+    if bucket == "month":
+        return days.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+    if bucket == "year":
+        return days.astype('datetime64[D]').astype('datetime64[Y]').astype(np.int64)
+    raise ValueError(f"Unknown time bucket: {bucket}")
+
+
+def bucket_labels(days, bucket):
+    """Bucket label per day number (days since epoch): ISO date of the day,
+    the week's Monday, or 'YYYY-MM' / 'YYYY'."""
+    dates = np.asarray(days, dtype=np.int64).astype('datetime64[D]')
+    if bucket == "day":
+        return np.datetime_as_string(dates, unit='D')
+    if bucket == "week":
+        # 1970-01-01 was a Thursday
+        monday = dates - ((np.asarray(days, dtype=np.int64) + 3) % 7).astype('timedelta64[D]')
+        return np.datetime_as_string(monday, unit='D')
+    if bucket == "month":
+        return np.datetime_as_string(dates.astype('datetime64[M]'), unit='M')
+    if bucket == "year":
+        return np.datetime_as_string(dates.astype('datetime64[Y]'), unit='Y')
+    raise ValueError(f"Unknown time bucket: {bucket}")
+
+
+class AggregateTable:
+    """Materialized mean/min/max/latest of modal_price per group.
+
+    One table is kept per (dimensions, time bucket) grouping, mapping a key
+    tuple to [count, sum, min, max, latest_day, latest_value]. Attached to a
+    PriceStore it is rebuilt on a full reload and otherwise only folds in
+    the appended rows, so reads never rescan the data.
+    """
+
+    def __init__(self, groupings=None, value_column=VALUE_COLUMN):
+        self.groupings = [(tuple(d for d in DIMENSIONS if d in dims), bucket)
+                          for dims, bucket in (groupings or default_groupings())]
+        self.value_column = value_column
+        self._lock = threading.Lock()
+        self.tables = {grouping: {} for grouping in self.groupings}
+        self.rows_seen = 0
+
+    def attach(self, store):
+        store.subscribe(self.on_change)
+        if store.n_rows:
+            self.rebuild(store)
+
+    def on_change(self, store, rows):
+        if rows is None:
+            self.rebuild(store)
+        else:
+            self.update(store, rows)
+
+    # ---------- maintenance ----------
+    def rebuild(self, store):
+        partials = self._aggregate(store, None)
+        with self._lock:
+            self.tables = {grouping: {} for grouping in self.groupings}
+            self._merge(partials)
+            self.rows_seen = store.n_rows
+
+    def update(self, store, rows):
+        if len(rows) == 0:
+            return
+        partials = self._aggregate(store, rows)
+        with self._lock:
+            self._merge(partials)
+            self.rows_seen += len(rows)
+
+    def _aggregate(self, store, rows):
+        """Per-grouping partial aggregates of `rows`: (keys, stats, latest)."""
+        if self.value_column not in store.numeric:
+            return {}
+        select = (lambda arr: np.asarray(arr)) if rows is None else (lambda arr: np.asarray(arr)[rows])
+        values = select(store.numeric[self.value_column]).astype(float)
+        days = select(store.date_days).astype(np.int64)
+        dated = days != NO_DATE
+        # category codes shifted by one so that missing values (-1) get their own group
+        codes = {dim: select(store.codes[dim]).astype(np.int64) + 1
+                 for dim in DIMENSIONS if dim in store.codes}
+
+        partials = {}
+        for dims, bucket in self.groupings:
+            if any(dim not in codes for dim in dims):
+                continue
+            mask = dated if bucket else np.ones(len(values), dtype=bool)
+            if not mask.any():
+                continue
+            idx = np.flatnonzero(mask)
+
+            # one integer key per row: mixed-radix combination of the codes
+            composite = np.zeros(len(idx), dtype=np.int64)
+            for dim in dims:
+                composite = composite * (len(store.categories[dim]) + 1) + codes[dim][idx]
+            if bucket:
+                ids = bucket_ids(days[idx], bucket)
+                base = ids.min()
+                composite = composite * (ids.max() - base + 1) + (ids - base)
+
+            _, inverse = np.unique(composite, return_inverse=True)
+            inverse = inverse.ravel()
+            count = np.bincount(inverse)
+            total = np.bincount(inverse, weights=values[idx])
+            order = np.argsort(inverse, kind="stable")
+            starts = np.concatenate([[0], np.cumsum(count)[:-1]])
+            low = np.minimum.reduceat(values[idx][order], starts)
+            high = np.maximum.reduceat(values[idx][order], starts)
+            # latest: the last row (in ingestion order) on each group's newest day
+            last = idx[np.lexsort((idx, days[idx], inverse))[np.cumsum(count) - 1]]
+            first = idx[order[starts]]
+
+            labels = [store.categories[dim][codes[dim][first] - 1].tolist() for dim in dims]
+            for labels_dim, dim in zip(labels, dims):
+                for i, code in enumerate(codes[dim][first]):
+                    if code == 0:
+                        labels_dim[i] = None
+            if bucket:
+                labels.append(bucket_labels(days[first], bucket).tolist())
+            group_keys = list(zip(*labels)) if labels else [()] * len(count)
+
+            stats = np.column_stack([count, total, low, high])
+            latest = np.column_stack([days[last], values[last]])
+            partials[(dims, bucket)] = (group_keys, stats, latest)
+        return partials
+
+    def _merge(self, partials):
+        for grouping, (group_keys, stats, latest) in partials.items():
+            table = self.tables[grouping]
+            for key, (count, total, low, high), (day, value) in zip(group_keys, stats, latest):
+                acc = table.get(key)
+                if acc is None:
+                    table[key] = [int(count), float(total), float(low), float(high), int(day), float(value)]
+                    continue
+                acc[0] += int(count)
+                acc[1] += float(total)
+                acc[2] = min(acc[2], float(low))
+                acc[3] = max(acc[3], float(high))
+                if day >= acc[4]:
+                    acc[4], acc[5] = int(day), float(value)
+
+    # ---------- queries ----------
+    def has_grouping(self, dims, bucket=None):
+        return (tuple(d for d in DIMENSIONS if d in dims), bucket) in self.tables
+
+    def query(self, dims, bucket=None, filters=None):
+        """Rows of one materialized grouping, optionally restricted by
+        {dimension: [values]} on its own dimensions. Raises KeyError if the
+        grouping is not materialized."""
+        grouping = (tuple(d for d in DIMENSIONS if d in dims), bucket)
+        dims = grouping[0]
+        wanted = [(dims.index(d), set(v)) for d, v in (filters or {}).items() if d in dims]
+        with self._lock:
+            items = list(self.tables[grouping].items())
+
+        results = []
+        for key, (count, total, low, high, day, value) in items:
+            if any(key[i] not in allowed for i, allowed in wanted):
+                continue
+            row = dict(zip(dims, key))
+            if bucket:
+                row["bucket"] = key[-1]
+            row.update({
+                "count": count,
+                "mean": total / count,
+                "min": low,
+                "max": high,
+                "latest": value,
+                "latest_date": None if day == NO_DATE else str(np.datetime64(day, 'D')),
+            })
+            results.append(row)
+        results.sort(key=lambda r: tuple(str(r.get(d)) for d in dims) + (r.get("bucket") or "",))
+        return results
+
+
+def summary(store):
+    """Record count and distinct commodities/markets/states, from the store's
+    category lists (no row scan)."""
+    result = {"records": store.n_rows}
+    for dim, label in (("commodity", "commodities"), ("market", "markets"), ("state", "states")):
+        if dim in store.indexes:
+            order, offsets = store.indexes[dim]
+            result[label] = int(np.count_nonzero(np.diff(offsets)))
+    return result
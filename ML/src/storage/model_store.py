@@ -0,0 +1,343 @@
+import io
+import os
+import sys
+import glob
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import joblib
+import numpy as np
+
+from src.prediction.fast_predict import FastPredictor
+from src.prediction.compact_model import (
+    COMPACT_SUFFIX, bundle_to_bytes, compact_base, load_compact, predictor_from_bundle,
+)
+from src.preprocessing.keys import commodity_key, market_key
+
+MODEL_STORE_NAME = "models.sqlite"
+# written next to the models by ModelTrainer (src.training.train_model)
+TRAINING_MANIFEST_NAME = "training_manifest.json"
+# how often readers look for a newly published run (seconds)
+INDEX_CHECK_SECONDS = 1.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id       INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at   TEXT NOT NULL,
+    published_at TEXT,
+    status       TEXT NOT NULL,          -- staging | published | aborted
+    note         TEXT
+);
+CREATE TABLE IF NOT EXISTS models (
+    run_id        INTEGER NOT NULL,
+    commodity_key TEXT NOT NULL,
+    market_key    TEXT NOT NULL,
+    commodity     TEXT NOT NULL,
+    market        TEXT NOT NULL,
+    version       INTEGER NOT NULL,      -- run that produced this model
+    format        TEXT NOT NULL,         -- compact | pickle
+    header        TEXT,
+    data          BLOB NOT NULL,
+    PRIMARY KEY (run_id, commodity_key, market_key)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+class ModelStore:
+    """Single-file SQLite store of trained models with a normalized pair index.
+
+    Training writes a run into a staging area (`begin_run` + `put`) and
+    `publish` switches readers to it in one transaction, optionally carrying
+    over pairs the run did not retrain. Readers resolve a pair through an
+    in-memory dict of the published run, rebuilt only when a new run is
+    published; other processes' publishes are noticed within
+    INDEX_CHECK_SECONDS, and only once the database files change on disk.
+    Models are kept as compact bundles when FastPredictor can represent
+    them and as pickles otherwise.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._index_lock = threading.Lock()
+        self._index_run = None
+        self._index_signature = None
+        self._index_checked = None
+        self._index = {}
+        with self._conn() as conn:
+            conn.executescript(SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # ---------- serialization ----------
+    @staticmethod
+    def serialize(model):
+        """(format, header, data) for a Prophet model or FastPredictor."""
+        predictor = model
+        if not isinstance(model, FastPredictor):
+            try:
+                predictor = FastPredictor.from_prophet(model)
+            except ValueError:
+                predictor = None
+        if predictor is not None:
+            header, data = bundle_to_bytes(predictor)
+            return "compact", header.decode("utf-8"), data.tobytes()
+
+        buf = io.BytesIO()
+        joblib.dump(model, buf)
+        return "pickle", None, buf.getvalue()
+
+    @staticmethod
+    def deserialize(fmt, header, data):
+        if fmt == "compact":
+            return predictor_from_bundle(json.loads(header), np.frombuffer(data, dtype=np.float64))
+        return joblib.load(io.BytesIO(data))
+
+    # ---------- writing ----------
+    def begin_run(self, note=None):
+        with self._conn() as conn:
+            cur = conn.execute(
+                "INSERT INTO runs (created_at, status, note) VALUES (?, 'staging', ?)",
+                (datetime.now().isoformat(timespec="seconds"), note))
+            return cur.lastrowid
+
+    def put(self, run_id, commodity, market, model):
+        self.put_payload(run_id, commodity, market, *self.serialize(model))
+
+    def put_payload(self, run_id, commodity, market, fmt, header, data):
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO models VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (run_id, commodity_key(commodity), market_key(market),
+                 commodity, market, run_id, fmt, header, sqlite3.Binary(data)))
+
+    def publish(self, run_id, carry_over=True):
+        """Atomically make `run_id` the run readers see.
+
+        With `carry_over`, pairs present in the previously published run but
+        not in this one are copied forward unchanged (keeping their version).
+        """
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            previous = self._current_run(conn)
+            if carry_over and previous is not None:
+                conn.execute(
+                    """INSERT INTO models
+                       SELECT ?, commodity_key, market_key, commodity, market, version, format, header, data
+                       FROM models AS old
+                       WHERE old.run_id = ? AND NOT EXISTS (
+                           SELECT 1 FROM models AS new
+                           WHERE new.run_id = ? AND new.commodity_key = old.commodity_key
+                             AND new.market_key = old.market_key)""",
+                    (run_id, previous, run_id))
+            conn.execute("UPDATE runs SET status = 'published', published_at = ? WHERE run_id = ?",
+                         (datetime.now().isoformat(timespec="seconds"), run_id))
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('current_run', ?)",
+                         (str(run_id),))
+        self._index_checked = None
+
+    def abort(self, run_id):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM models WHERE run_id = ?", (run_id,))
+            conn.execute("UPDATE runs SET status = 'aborted' WHERE run_id = ?", (run_id,))
+
+    def prune(self, keep=2):
+        """Delete model rows of all but the newest `keep` published runs."""
+        with self._conn() as conn:
+            keep_ids = [r[0] for r in conn.execute(
+                "SELECT run_id FROM runs WHERE status = 'published' ORDER BY run_id DESC LIMIT ?",
+                (keep,))]
+            if keep_ids:
+                marks = ",".join("?" * len(keep_ids))
+                conn.execute(f"DELETE FROM models WHERE run_id NOT IN ({marks}) "
+                             f"AND run_id IN (SELECT run_id FROM runs WHERE status != 'staging')",
+                             keep_ids)
+
+    # ---------- reading ----------
+    @staticmethod
+    def _current_run(conn):
+        row = conn.execute("SELECT value FROM meta WHERE key = 'current_run'").fetchone()
+        return int(row[0]) if row else None
+
+    def current_run(self):
+        return self._current_run(self._conn())
+
+    def _file_signature(self):
+        """(mtime_ns, size) of the database and its WAL; every commit changes it."""
+        signature = []
+        for path in (self.path, self.path + "-wal"):
+            try:
+                st = os.stat(path)
+                signature.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    def _refresh_index(self):
+        now = time.monotonic()
+        if self._index_checked is not None and now - self._index_checked < INDEX_CHECK_SECONDS:
+            return
+        self._index_checked = now
+        # taken before the query so a commit racing with it is seen next time
+        signature = self._file_signature()
+        if signature == self._index_signature:
+            return
+        run_id = self.current_run()
+        if run_id == self._index_run:
+            self._index_signature = signature
+            return
+        with self._index_lock:
+            if run_id == self._index_run:
+                self._index_signature = signature
+                return
+            index = {}
+            if run_id is not None:
+                for row in self._conn().execute(
+                        "SELECT rowid, commodity_key, market_key, commodity, market, version, format, "
+                        "length(data) FROM models WHERE run_id = ?", (run_id,)):
+                    index[(row[1], row[2])] = {
+                        "rowid": row[0], "commodity": row[3], "market": row[4],
+                        "version": row[5], "format": row[6], "size": row[7],
+                    }
+            self._index = index
+            self._index_run = run_id
+            self._index_signature = signature
+
+    def lookup(self, commodity, market):
+        """Index entry (rowid, names, version, format, size) for a pair, or None."""
+        self._refresh_index()
+        return self._index.get((commodity_key(commodity), market_key(market)))
+
+    def load(self, entry):
+        row = self._conn().execute(
+            "SELECT format, header, data FROM models WHERE rowid = ?", (entry["rowid"],)).fetchone()
+        if row is None:
+            raise KeyError(f"Model row {entry['rowid']} no longer exists")
+        return self.deserialize(*row)
+
+    def get(self, commodity, market):
+        """Model for a pair in the published run; raises KeyError if absent."""
+        entry = self.lookup(commodity, market)
+        if entry is None:
+            raise KeyError(f"No model for {commodity} at {market}")
+        return self.load(entry)
+
+    def entries(self):
+        """Index entries of every pair in the published run."""
+        self._refresh_index()
+        return list(self._index.values())
+
+    def list_pairs(self):
+        self._refresh_index()
+        return sorted(
+            ({"commodity": e["commodity"], "market": e["market"],
+              "version": e["version"], "format": e["format"]} for e in self._index.values()),
+            key=lambda e: (e["commodity"], e["market"]))
+
+    def __contains__(self, pair):
+        return self.lookup(*pair) is not None
+
+    def __len__(self):
+        self._refresh_index()
+        return len(self._index)
+
+    # ---------- migration ----------
+    def import_directory(self, models_dir, note=None):
+        """Publish every loose .pkl / compact bundle in `models_dir` as one
+        run, chosen as in `model_files`."""
+        chosen = model_files(models_dir)
+        run_id = self.begin_run(note or f"import {models_dir}")
+        for path, commodity, market in chosen.values():
+            if path.endswith(COMPACT_SUFFIX):
+                model = load_compact(path, mmap=False)
+            else:
+                model = joblib.load(path)
+            self.put(run_id, commodity, market, model)
+        self.publish(run_id, carry_over=False)
+        return run_id, len(chosen)
+
+
+def model_files(models_dir):
+    """{(commodity_key, market_key): (path, commodity, market)} of the loose
+    .pkl / compact bundle files in `models_dir`.
+
+    Pair names come from the training manifest when present, otherwise
+    from the file name (see `split_model_name`). When several files
+    normalize to the same pair, a compact bundle beats a pickle and the
+    trainer's *_APMC naming beats older names.
+    """
+    files = glob.glob(os.path.join(models_dir, "*.pkl")) + \
+        glob.glob(os.path.join(models_dir, "*" + COMPACT_SUFFIX))
+    named = read_manifest_names(models_dir)
+
+    def preference(path):
+        return (path.endswith(COMPACT_SUFFIX), compact_base(path).upper().endswith("_APMC"))
+
+    chosen = {}
+    for path in sorted(files):
+        name = os.path.basename(compact_base(path))
+        commodity, market = named.get(name) or split_model_name(name)
+        key = (commodity_key(commodity), market_key(market))
+        if key not in chosen or preference(path) > preference(chosen[key][0]):
+            chosen[key] = (path, commodity, market)
+    return chosen
+
+
+def split_model_name(name):
+    """Best-effort (commodity, market) split of a legacy model file name.
+
+    "Gram_Dal_Dubagga_Mandi_APMC" -> ("Gram_Dal", "Dubagga_Mandi_APMC"),
+    "Onion_Pune_APMC" -> ("Onion", "Pune_APMC"); names without a market
+    part, such as the dummy "Apple", get an empty market.
+    """
+    parts = name.split("_")
+    if parts[-1].upper() == "APMC" and len(parts) >= 3:
+        n = 3 if len(parts) >= 4 and parts[-2].lower() == "mandi" else 2
+    elif parts[-1].lower() == "mandi" and len(parts) >= 3:
+        n = 2
+    else:
+        return name, ""
+    return "_".join(parts[:-n]), "_".join(parts[-n:])
+
+
+def read_manifest_names(models_dir):
+    """{file base name: (commodity, market)} from a training manifest, if any."""
+    try:
+        with open(os.path.join(models_dir, TRAINING_MANIFEST_NAME)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return {compact_base(e["model_file"]): (e["commodity"], e["market"])
+            for e in manifest.values() if e.get("model_file")}
+
+
+if __name__ == "__main__":
+    # python -m src.storage.model_store <models_dir> [store_path]
+    if len(sys.argv) < 2:
+        print("Usage: python -m src.storage.model_store <models_dir> [store_path]")
+        sys.exit(1)
+    source = sys.argv[1]
+    store_path = sys.argv[2] if len(sys.argv) > 2 else os.path.join(source, MODEL_STORE_NAME)
+    store = ModelStore(store_path)
+    run, count = store.import_directory(source)
+    print(f"✅ Published run {run} with {count} models → {store_path}")
@@ -0,0 +1,174 @@
+import os
+import json
+import shutil
+
+import numpy as np
+import pandas as pd
+
+MANIFEST_NAME = "partitions.json"
+STORE_VERSION = 1
+# one fixed-width record per training row; files are plain arrays of these
+RECORD_DTYPE = np.dtype([("date", "<i8"), ("price", "<f8"), ("buffer_stock_qty_kg", "<f8")])
+# rows buffered across partitions before they are flushed to disk
+FLUSH_ROWS = 2_000_000
+
+
+class PartitionStore:
+    """Training rows on disk, one file per (commodity, market) pair.
+
+    Layout under `root`: `p<n>.bin` files holding RECORD_DTYPE rows (date
+    as datetime64[ns] int, price, buffer stock) in arrival order, plus
+    partitions.json mapping each file to its pair and row count and
+    recording the signature of the source files. File names never come
+    from the data, so any commodity or market name is safe. `write`
+    builds the store in a staging directory and swaps it in at the end,
+    so readers never see a half-written store.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self._manifest = None
+
+    # ---------- reading ----------
+    def manifest(self):
+        if self._manifest is None:
+            try:
+                with open(os.path.join(self.root, MANIFEST_NAME)) as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError):
+                manifest = None
+            if manifest is None or manifest.get("version") != STORE_VERSION:
+                manifest = {"version": STORE_VERSION, "source": None, "partitions": []}
+            self._manifest = manifest
+        return self._manifest
+
+    def is_current(self, source):
+        """True when the store was built from exactly these source files."""
+        return self.manifest()["source"] == source
+
+    def partitions(self, commodities=None, markets=None):
+        """Manifest entries ({commodity, market, file, rows}) passing the filters."""
+        entries = self.manifest()["partitions"]
+        if commodities is not None:
+            commodities = set(commodities)
+            entries = [e for e in entries if e["commodity"] in commodities]
+        if markets is not None:
+            markets = set(markets)
+            entries = [e for e in entries if e["market"] in markets]
+        return entries
+
+    def read(self, commodities=None, markets=None):
+        """DataFrame (date, commodity, market, price, buffer_stock_qty_kg) of
+        the selected partitions only; commodity and market are categorical
+        with sorted categories."""
+        entries = self.partitions(commodities, markets)
+        records = [np.fromfile(os.path.join(self.root, e["file"]), dtype=RECORD_DTYPE) for e in entries]
+        records = np.concatenate(records) if records else np.empty(0, dtype=RECORD_DTYPE)
+        sizes = [e["rows"] for e in entries]
+
+        columns = {}
+        for col in ("commodity", "market"):
+            categories = sorted({e[col] for e in entries})
+            position = {name: i for i, name in enumerate(categories)}
+            codes = np.array([position[e[col]] for e in entries], dtype=np.int32)
+            columns[col] = pd.Categorical.from_codes(np.repeat(codes, sizes), categories)
+        return pd.DataFrame({
+            "date": records["date"].view("datetime64[ns]"),
+            "commodity": columns["commodity"],
+            "market": columns["market"],
+            "price": records["price"],
+            "buffer_stock_qty_kg": records["buffer_stock_qty_kg"],
+        })
+
+    # ---------- writing ----------
+    def write(self, chunks, source=None, flush_rows=FLUSH_ROWS):
+        """Replace the store with the rows of `chunks`.
+
+        `chunks` yields DataFrames with the read() columns (any string or
+        categorical dtype for commodity/market, no missing keys or dates).
+        Rows are buffered per pair and appended to the pair's file whenever
+        `flush_rows` are pending, so memory stays bounded by the chunk size
+        plus the buffer. Returns the number of rows written.
+        """
+        tmp_root = f"{self.root}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp_root, ignore_errors=True)
+        os.makedirs(tmp_root)
+        files = {}      # (commodity, market) -> relative file
+        rows = {}       # (commodity, market) -> rows written
+        pending = {}    # (commodity, market) -> [record arrays]
+        n_pending = 0
+        total = 0
+        try:
+            for chunk in chunks:
+                for key, part in _split_pairs(chunk):
+                    pending.setdefault(key, []).append(part)
+                    n_pending += len(part)
+                    total += len(part)
+                if n_pending >= flush_rows:
+                    self._flush(tmp_root, pending, files, rows)
+                    n_pending = 0
+            self._flush(tmp_root, pending, files, rows)
+
+            manifest = {
+                "version": STORE_VERSION,
+                "source": source,
+                "partitions": [{"commodity": c, "market": m, "file": files[(c, m)], "rows": rows[(c, m)]}
+                               for c, m in sorted(files)],
+            }
+            with open(os.path.join(tmp_root, MANIFEST_NAME), "w") as f:
+                json.dump(manifest, f, indent=1)
+            # move the old store aside rather than deleting it first, so
+            # the root is only missing for the two renames
+            old_root = f"{self.root}.old-{os.getpid()}"
+            shutil.rmtree(old_root, ignore_errors=True)
+            if os.path.exists(self.root):
+                os.replace(self.root, old_root)
+            try:
+                os.replace(tmp_root, self.root)
+            except BaseException:
+                if os.path.exists(old_root):
+                    os.replace(old_root, self.root)
+                raise
+            shutil.rmtree(old_root, ignore_errors=True)
+        except BaseException:
+            shutil.rmtree(tmp_root, ignore_errors=True)
+            raise
+        self._manifest = manifest
+        return total
+
+    @staticmethod
+    def _flush(root, pending, files, rows):
+        for key, parts in pending.items():
+            if key not in files:
+                # numbered in order of first appearance; the manifest names the pair
+                files[key] = f"p{len(files):05d}.bin"
+                rows[key] = 0
+            with open(os.path.join(root, files[key]), "ab") as f:
+                for part in parts:
+                    part.tofile(f)
+                    rows[key] += len(part)
+        pending.clear()
+
+
+def _split_pairs(chunk):
+    """Yield ((commodity, market), RECORD_DTYPE array) per pair in `chunk`,
+    rows in chunk order."""
+    commodity_codes, commodities = pd.factorize(chunk["commodity"])
+    market_codes, markets = pd.factorize(chunk["market"])
+    n_markets = max(len(markets), 1)
+    keys = commodity_codes.astype(np.int64) * n_markets + market_codes
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    if not len(order):
+        return
+    bounds = np.flatnonzero(np.diff(sorted_keys)) + 1
+    starts, ends = np.r_[0, bounds], np.r_[bounds, len(order)]
+
+    records = np.empty(len(chunk), dtype=RECORD_DTYPE)
+    records["date"] = chunk["date"].to_numpy(dtype="datetime64[ns]").view(np.int64)
+    records["price"] = chunk["price"].to_numpy(dtype=np.float64)
+    records["buffer_stock_qty_kg"] = chunk["buffer_stock_qty_kg"].to_numpy(dtype=np.float64)
+    records = records[order]
+    for lo, hi in zip(starts, ends):
+        key = sorted_keys[lo]
+        yield (str(commodities[key // n_markets]), str(markets[key % n_markets])), records[lo:hi]
@@ -0,0 +1,428 @@
+import os
+import re
+import json
+import math
+import time
+import shutil
+import threading
+
+import numpy as np
+import pandas as pd
+
+# price columns are coerced to numbers with missing/invalid values as 0
+PRICE_COLUMNS = ["min_price", "modal_price", "max_price"]
+# columns that get a commodity/market/state lookup index
+INDEXED_COLUMNS = ["commodity", "market", "state"]
+DATE_COLUMN = "date"
+DATE_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}")
+CACHE_VERSION = 2
+NO_DATE = np.iinfo(np.int32).min
+# appended rows are written to the .npy cache once this many are pending
+# or this long after the last write (and on `flush`)
+CACHE_FLUSH_ROWS = 50_000
+CACHE_FLUSH_SECONDS = 60.0
+# spare capacity kept when a column grows, so appends are amortized O(rows added)
+GROWTH = 1.5
+
+
+class PriceStore:
+    """Typed, column-oriented copy of the commodity price CSV.
+
+    The CSV is parsed once into NumPy columns (float/int arrays for numbers,
+    int32 codes + a category list for strings, int32 days since epoch for
+    dates) and persisted as .npy files next to the source, so later starts
+    memory-map the columns instead of re-parsing. Row-id indexes on
+    commodity, market, state and date are built at load time. `refresh()`
+    reloads when the CSV's mtime or size changes.
+
+    `append` adds rows to both the CSV and the columns without a reparse:
+    columns grow in place into spare capacity, keep their dtype, and the
+    indexes are extended on the next read rather than per append; the .npy
+    cache is rewritten in batches (see CACHE_FLUSH_ROWS). Callbacks
+    registered with `subscribe` are told about new rows
+    (`callback(store, rows)`) or a full reload (`rows` is None).
+    """
+
+    def __init__(self, csv_path, cache_dir=None):
+        self.csv_path = csv_path
+        self.cache_dir = cache_dir or csv_path + ".cache"
+        self._lock = threading.RLock()
+        self.signature = None
+        self.version = 0
+        self.columns = []        # output column order
+        self.source_columns = [] # CSV header order
+        self.numeric = {}        # name -> ndarray
+        self.codes = {}          # name -> int32 ndarray
+        self.categories = {}     # name -> object ndarray
+        self.date_days = None    # int32 days since epoch (NO_DATE when missing)
+        self._indexes = {}       # name -> (row order, offsets) by category code
+        self._date_order = None  # row ids sorted by date
+        self._sorted_days = None # date_days in date_order
+        self._indexed_rows = 0   # rows covered by the indexes
+        self._categories_changed = False
+        self.n_rows = 0
+        self._buffers = {}       # column (or ("date_days",)) -> growable array the column is a view of
+        self._unflushed = 0      # appended rows not in the .npy cache yet
+        self._flushed_at = 0.0
+        self._listeners = []
+
+    # ---------- loading ----------
+    def _source_signature(self):
+        st = os.stat(self.csv_path)
+        return [st.st_mtime_ns, st.st_size]
+
+    def refresh(self):
+        """Load or reload if the CSV changed. Returns True if data was (re)loaded."""
+        signature = self._source_signature()
+        if signature == self.signature:
+            return False
+        with self._lock:
+            if signature == self.signature:
+                return False
+            self._buffers = {}
+            self._unflushed, self._flushed_at = 0, time.monotonic()
+            if not self._load_cache(signature):
+                self._load_csv()
+                self._write_cache(signature)
+            self._build_indexes()
+            self.signature = signature
+            self.version += 1
+            self._notify(None)
+            return True
+
+    def subscribe(self, callback):
+        self._listeners.append(callback)
+
+    def _notify(self, rows):
+        for callback in self._listeners:
+            try:
+                callback(self, rows)
+            except Exception as e:
+                print(f"⚠️ Price store listener failed: {e}")
+
+    def _load_csv(self):
+        df = pd.read_csv(self.csv_path)
+        self.source_columns = list(df.columns)
+
+        # Ensure numeric fields are numbers; if the column is missing create it with 0s
+        for col in PRICE_COLUMNS:
+            if col in df.columns:
+                df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+            else:
+                df[col] = 0.0
+
+        self.columns = list(df.columns)
+        self.numeric, self.codes, self.categories = {}, {}, {}
+        for col in self.columns:
+            series = df[col]
+            if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+                self.numeric[col] = series.to_numpy()
+            else:
+                codes, uniques = pd.factorize(series, sort=True)
+                self.codes[col] = codes.astype(np.int32)
+                self.categories[col] = np.asarray(uniques, dtype=object)
+
+        if DATE_COLUMN in df.columns:
+            dates = pd.to_datetime(df[DATE_COLUMN], errors='coerce')
+            days = dates.to_numpy(dtype='datetime64[D]').astype(np.int64)
+            days[dates.isna().to_numpy()] = NO_DATE
+            self.date_days = days.astype(np.int32)
+        else:
+            self.date_days = np.full(len(df), NO_DATE, dtype=np.int32)
+        self.n_rows = len(df)
+
+    def _write_cache(self, signature):
+        self._unflushed = 0
+        self._flushed_at = time.monotonic()
+        tmp_dir = f"{self.cache_dir}.tmp-{os.getpid()}"
+        try:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            os.makedirs(tmp_dir)
+            meta = {
+                "version": CACHE_VERSION,
+                "signature": signature,
+                "columns": self.columns,
+                "source_columns": self.source_columns,
+                "numeric": list(self.numeric),
+                "categorical": {col: [None if pd.isna(v) else v for v in cats.tolist()]
+                                for col, cats in self.categories.items()},
+                "n_rows": self.n_rows,
+            }
+            for i, col in enumerate(self.columns):
+                arr = self.numeric[col] if col in self.numeric else self.codes[col]
+                np.save(os.path.join(tmp_dir, f"col{i}.npy"), arr)
+            np.save(os.path.join(tmp_dir, "date_days.npy"), self.date_days)
+            # meta last: a cache directory without meta.json is ignored
+            with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+                json.dump(meta, f)
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+            os.replace(tmp_dir, self.cache_dir)
+        except OSError as e:
+            print(f"⚠️ Could not write price cache {self.cache_dir}: {e}")
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def _load_cache(self, signature):
+        try:
+            with open(os.path.join(self.cache_dir, "meta.json")) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if meta.get("version") != CACHE_VERSION or meta.get("signature") != signature:
+            return False
+
+        self.columns = meta["columns"]
+        self.source_columns = meta["source_columns"]
+        self.numeric, self.codes, self.categories = {}, {}, {}
+        for i, col in enumerate(self.columns):
+            arr = np.load(os.path.join(self.cache_dir, f"col{i}.npy"), mmap_mode='r')
+            if col in meta["numeric"]:
+                self.numeric[col] = arr
+            else:
+                self.codes[col] = arr
+                self.categories[col] = np.asarray(meta["categorical"][col], dtype=object)
+        self.date_days = np.load(os.path.join(self.cache_dir, "date_days.npy"), mmap_mode='r')
+        self.n_rows = meta["n_rows"]
+        return True
+
+    def _build_indexes(self):
+        indexes = {}
+        for col in INDEXED_COLUMNS:
+            if col in self.codes:
+                codes = np.asarray(self.codes[col])
+                order = np.argsort(codes, kind='stable').astype(np.int32)
+                offsets = np.searchsorted(codes[order], np.arange(len(self.categories[col]) + 1))
+                indexes[col] = (order, offsets)
+        self._indexes = indexes
+        self._date_order = np.argsort(np.asarray(self.date_days), kind='stable').astype(np.int32)
+        self._sorted_days = np.asarray(self.date_days)[self._date_order]
+        self._indexed_rows = self.n_rows
+        self._categories_changed = False
+
+    def _extend_indexes(self):
+        """Merge the rows appended since the last index build into the
+        indexes: new row ids are the largest, so each goes to the end of its
+        code's run (or its day's run), as a stable sort would put it."""
+        start = self._indexed_rows
+        new = np.arange(start, self.n_rows, dtype=np.int32)
+        for col, (order, offsets) in self._indexes.items():
+            codes = np.asarray(self.codes[col])[start:].astype(np.int64)
+            by_code = np.argsort(codes, kind='stable')
+            # offsets[c + 1] ends the run of code c; missing values (-1) come first
+            order = np.insert(order, offsets[codes + 1][by_code], new[by_code])
+            offsets = offsets + np.cumsum(np.bincount(codes + 1, minlength=len(offsets)))
+            self._indexes[col] = (order, offsets)
+        days = np.asarray(self.date_days)[start:]
+        by_day = np.argsort(days, kind='stable')
+        at = np.searchsorted(self._sorted_days, days, side='right')[by_day]
+        self._date_order = np.insert(self._date_order, at, new[by_day])
+        self._sorted_days = np.insert(self._sorted_days, at, days[by_day])
+        self._indexed_rows = self.n_rows
+
+    def _current_indexes(self):
+        if self._indexed_rows != self.n_rows:
+            with self._lock:
+                if self._categories_changed:
+                    self._build_indexes()
+                elif self._indexed_rows != self.n_rows:
+                    self._extend_indexes()
+
+    @property
+    def indexes(self):
+        self._current_indexes()
+        return self._indexes
+
+    @property
+    def date_order(self):
+        self._current_indexes()
+        return self._date_order
+
+    @property
+    def sorted_days(self):
+        self._current_indexes()
+        return self._sorted_days
+
+    # ---------- ingestion ----------
+    def invalid_row(self, record):
+        """Why `record` cannot be appended, or None.
+
+        Commodity, market and state must be non-empty strings, the date a
+        YYYY-MM-DD string, prices numbers, and other numeric columns numbers
+        or absent, so the row reads back from the CSV exactly as appended.
+        """
+        for col in INDEXED_COLUMNS:
+            value = record.get(col)
+            if not isinstance(value, str) or not value.strip():
+                return f"'{col}' must be a non-empty string"
+        value = record.get(DATE_COLUMN)
+        if not isinstance(value, str) or not DATE_PATTERN.fullmatch(value):
+            return f"'{DATE_COLUMN}' must be YYYY-MM-DD"
+        try:
+            pd.Timestamp(value)
+        except ValueError:
+            return f"'{DATE_COLUMN}' is not a valid date"
+        for col in set(PRICE_COLUMNS) | set(self.numeric):
+            value = record.get(col)
+            if value is None and col not in PRICE_COLUMNS:
+                continue
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+                return f"'{col}' must be a number"
+        return None
+
+    def append(self, records):
+        """Append row dicts to the CSV and the in-memory columns.
+
+        Returns the new row ids. Every row is checked with `invalid_row`
+        first and nothing is written if one fails (ValueError). Keys outside
+        the CSV header are ignored and missing ones are left empty.
+        """
+        records = list(records)
+        self.refresh()
+        with self._lock:
+            for i, record in enumerate(records):
+                error = self.invalid_row(record)
+                if error:
+                    raise ValueError(f"Row {i}: {error}")
+            new = pd.DataFrame.from_records(records).reindex(columns=self.source_columns)
+            if new.empty:
+                return np.empty(0, dtype=np.int64)
+
+            with open(self.csv_path, "rb+") as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell():
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        f.write(b"\n")
+            new.to_csv(self.csv_path, mode="a", header=False, index=False)
+
+            for col in PRICE_COLUMNS:
+                new[col] = pd.to_numeric(new[col], errors='coerce').fillna(0) if col in new else 0.0
+            for col in self.numeric:
+                values = pd.to_numeric(new[col], errors='coerce').to_numpy()
+                dtype = np.asarray(self.numeric[col]).dtype
+                if dtype.kind in 'iu' and not (np.isfinite(values).all() and (values == np.round(values)).all()):
+                    # blanks or fractions: a reload would read the column as float too
+                    dtype = np.result_type(dtype, np.float64)
+                self.numeric[col] = self._extend(col, self.numeric[col], values.astype(dtype))
+            for col in self.codes:
+                self._append_categorical(col, new[col])
+
+            if DATE_COLUMN in new:
+                dates = pd.to_datetime(new[DATE_COLUMN], errors='coerce')
+                days = dates.to_numpy(dtype='datetime64[D]').astype(np.int64)
+                days[dates.isna().to_numpy()] = NO_DATE
+            else:
+                days = np.full(len(new), NO_DATE)
+            self.date_days = self._extend(("date_days",), self.date_days, days.astype(np.int32))
+
+            rows = np.arange(self.n_rows, self.n_rows + len(new))
+            self.n_rows += len(new)
+            self.signature = self._source_signature()
+            self._unflushed += len(new)
+            if (self._unflushed >= CACHE_FLUSH_ROWS
+                    or time.monotonic() - self._flushed_at >= CACHE_FLUSH_SECONDS):
+                self._write_cache(self.signature)
+            self.version += 1
+            self._notify(rows)
+            return rows
+
+    def flush(self):
+        """Write appended rows to the .npy cache now."""
+        with self._lock:
+            if self._unflushed:
+                self._write_cache(self.signature)
+
+    def _extend(self, name, column, values):
+        """`column` (n_rows long) followed by `values`, as a view of a buffer
+        with spare capacity so repeated appends do not copy every row."""
+        n, end = self.n_rows, self.n_rows + len(values)
+        buffer = self._buffers.get(name)
+        if buffer is None or len(buffer) < end or buffer.dtype != values.dtype:
+            buffer = np.empty(max(end, int(n * GROWTH)), dtype=values.dtype)
+            buffer[:n] = np.asarray(column)[:n]
+            self._buffers[name] = buffer
+        buffer[n:end] = values
+        return buffer[:end]
+
+    def _append_categorical(self, col, values):
+        """Extend a code column, keeping categories sorted (old codes remapped if needed)."""
+        cats = self.categories[col]
+        present = values.dropna().astype(str)
+        added = sorted(set(present.tolist()) - set(cats.tolist()))
+        codes = np.asarray(self.codes[col])
+        if added:
+            merged = np.asarray(sorted(cats.tolist() + added), dtype=object)
+            remap = np.searchsorted(merged, cats).astype(np.int32)
+            codes = np.where(codes >= 0, remap[np.maximum(codes, 0)], -1).astype(np.int32)
+            # codes were rewritten: the old buffer no longer backs them
+            self._buffers.pop(col, None)
+            self._categories_changed = True
+            self.categories[col] = cats = merged
+        new_codes = np.full(len(values), -1, dtype=np.int32)
+        mask = values.notna().to_numpy()
+        new_codes[mask] = np.searchsorted(cats, present.to_numpy(dtype=object))
+        self.codes[col] = self._extend(col, codes, new_codes)
+
+    # ---------- access ----------
+    def rows_for(self, column, value):
+        """Row ids (ascending) whose `column` equals `value` via its index."""
+        order, offsets = self.indexes[column]
+        cats = self.categories[column]
+        code = np.searchsorted(cats, value) if len(cats) else 0
+        if code >= len(cats) or cats[code] != value:
+            return np.empty(0, dtype=np.int32)
+        return order[offsets[code]:offsets[code + 1]]
+
+    def rows_between(self, start=None, end=None):
+        """Row ids (ascending) with start <= date <= end (ISO strings or Timestamps)."""
+        sorted_days = self.sorted_days
+        lo = 0 if start is None else np.searchsorted(sorted_days, _to_days(start), side='left')
+        hi = len(sorted_days) if end is None else np.searchsorted(sorted_days, _to_days(end), side='right')
+        lo = max(lo, np.searchsorted(sorted_days, NO_DATE, side='right'))
+        return np.sort(self.date_order[lo:hi])
+
+    def select(self, filters=None, start=None, end=None):
+        """Ascending row ids matching every filter.
+
+        `filters` maps an indexed column to one value or a list of values
+        (any of them matches); `start`/`end` bound the date inclusively.
+        Returns None when nothing restricts the rows (i.e. all rows).
+        """
+        rows = None
+        for column, values in (filters or {}).items():
+            if column not in self.indexes:
+                raise KeyError(f"Column '{column}' is not indexed")
+            if isinstance(values, str):
+                values = [values]
+            matched = [self.rows_for(column, v) for v in values]
+            matched = np.unique(np.concatenate(matched)) if matched else np.empty(0, dtype=np.int32)
+            rows = matched if rows is None else np.intersect1d(rows, matched, assume_unique=True)
+        if start is not None or end is not None:
+            dated = self.rows_between(start, end)
+            rows = dated if rows is None else np.intersect1d(rows, dated, assume_unique=True)
+        return rows
+
+    def column_values(self, column, rows=None):
+        """Python values of one column for `rows` (all rows when None)."""
+        if column in self.numeric:
+            arr = np.asarray(self.numeric[column])
+            return (arr if rows is None else arr[rows]).tolist()
+        codes = np.asarray(self.codes[column])
+        codes = codes if rows is None else codes[rows]
+        values = self.categories[column].take(codes)
+        values[codes < 0] = None
+        return values.tolist()
+
+    def records(self, rows=None, fields=None):
+        """List of row dicts, like DataFrame.to_dict(orient='records').
+
+        `fields` restricts and orders the keys; unknown names are ignored.
+        """
+        fields = self.columns if fields is None else [c for c in fields if c in self.columns]
+        if not fields:
+            return [{} for _ in range(self.n_rows if rows is None else len(rows))]
+        columns = [self.column_values(c, rows) for c in fields]
+        return [dict(zip(fields, values)) for values in zip(*columns)]
+
+
+def _to_days(value):
+    return int(pd.Timestamp(value).to_datetime64().astype('datetime64[D]').astype(np.int64))
@@ -0,0 +1,400 @@
+import os
+import csv
+import json
+import time
+import logging
+from statistics import NormalDist
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from src.prediction.baseline import HISTORY_DAYS, extrapolate_matrix, fit_matrix
+from src.prediction.fast_predict import NS_PER_DAY, load_fast_predictor
+from src.prediction.forecast import make_forecast
+from src.prediction.pooled_model import REGRESSOR, PooledModel
+from src.training.train_model import ModelTrainer, _init_training_worker
+
+BACKTEST_NAME = "backtest_report.json"
+MODEL_TYPES = ("prophet", "pooled", "baseline")
+HORIZONS = (1, 7, 15)
+N_CUTOFFS = 4
+PERIOD_DAYS = 15            # days between consecutive cutoffs
+INTERVAL_WIDTH = 0.8
+PROPHET_CHUNK = 8           # pairs per Prophet task; pooled and baseline fit a whole fold at once
+# mean absolute error to standard deviation for normal errors
+MAE_TO_SD = np.sqrt(np.pi / 2)
+
+
+# ---------- prepared series ----------
+class SeriesCache:
+    """Every pair's daily frame from ModelTrainer.iter_prepared_pairs,
+    concatenated into flat arrays.
+
+    Preparation runs once; each fold only slices the arrays, and a worker
+    process receives the cache once (pool initializer) rather than with
+    every task.
+    """
+
+    def __init__(self, commodities, markets, offsets, days, y, buffer):
+        self.commodities = list(commodities)
+        self.markets = list(markets)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.days = np.asarray(days, dtype=np.int64)
+        self.y = np.asarray(y, dtype=float)
+        self.buffer = np.asarray(buffer, dtype=float)
+
+    @classmethod
+    def from_trainer(cls, trainer, commodities=None, markets=None):
+        df = trainer.load_and_prepare(commodities, markets)
+        names, frames = [], []
+        if not df.empty:
+            for commodity, market, count, merged, reason in trainer.iter_prepared_pairs(df):
+                if merged is None:
+                    print(f"⚠️ {reason}")
+                    continue
+                names.append((commodity, market))
+                frames.append(merged)
+        if not frames:
+            return cls([], [], [0], [], [], [])
+        return cls([c for c, _ in names], [m for _, m in names],
+                   np.r_[0, np.cumsum([len(f) for f in frames])],
+                   np.concatenate([f['ds'].to_numpy(dtype='datetime64[D]').astype(np.int64) for f in frames]),
+                   np.concatenate([f['y'].to_numpy(dtype=float) for f in frames]),
+                   np.concatenate([f[REGRESSOR].to_numpy(dtype=float) for f in frames]))
+
+    def __len__(self):
+        return len(self.commodities)
+
+    @property
+    def first_days(self):
+        return self.days[self.offsets[:-1]]
+
+    @property
+    def last_days(self):
+        return self.days[self.offsets[1:] - 1]
+
+    def eligible(self, cutoff, horizon, min_records):
+        """Series with at least `min_records` days up to `cutoff` and actuals
+        for all `horizon` days after it."""
+        train_rows = cutoff - self.first_days + 1
+        return np.flatnonzero((train_rows >= min_records) & (self.last_days >= cutoff + horizon))
+
+    def frame(self, i, cutoff):
+        """ds / y / buffer stock frame of series `i` up to and including `cutoff`."""
+        lo = self.offsets[i]
+        hi = lo + int(cutoff - self.days[lo]) + 1
+        return pd.DataFrame({'ds': self.days[lo:hi].astype('datetime64[D]').astype('datetime64[ns]'),
+                             'y': self.y[lo:hi], REGRESSOR: self.buffer[lo:hi]})
+
+    def actual(self, ids, cutoff, horizon):
+        """(series x horizon) prices on the days after `cutoff`."""
+        start = self.offsets[ids] + (cutoff - self.first_days[ids]) + 1
+        return self.y[start[:, None] + np.arange(horizon)]
+
+    def window(self, ids, cutoff, width):
+        """(series x width) prices over the `width` days ending at `cutoff`,
+        NaN before a series starts."""
+        first = self.first_days[ids]
+        step = cutoff - width + 1 + np.arange(width)
+        inside = step >= first[:, None]
+        rows = self.offsets[ids][:, None] + np.where(inside, step - first[:, None], 0)
+        return np.where(inside, self.y[rows], np.nan)
+
+
+# ---------- folds (run in worker processes) ----------
+_series = None
+
+
+def _init_backtest_worker(series):
+    global _series
+    _init_training_worker()
+    for name in ("prophet", "cmdstanpy"):
+        logging.getLogger(name).disabled = True
+    _series = series
+
+
+def _residual_sd(predictor, frame):
+    """Spread of the serving forecast function around the training prices."""
+    dates_ns = frame['ds'].to_numpy(dtype='datetime64[ns]').astype(np.int64)
+    return float(np.std(frame['y'].to_numpy() - predictor.predict_yhat(dates_ns)))
+
+
+def run_fold(model_type, cutoff, horizon, ids):
+    """Fit `model_type` on the given series up to `cutoff` and forecast
+    `horizon` days. Returns yhat (series x horizon), a residual standard
+    deviation per series and the fit / predict seconds spent."""
+    series = _series
+    yhat = np.full((len(ids), horizon), np.nan)
+    sd = np.full(len(ids), np.nan)
+    fit_seconds = predict_seconds = 0.0
+    errors = []
+
+    if model_type == "prophet":
+        for row, i in enumerate(ids):
+            frame = series.frame(i, cutoff)
+            try:
+                start = time.perf_counter()
+                model = ModelTrainer.build_model(len(frame))
+                model.fit(frame)
+                fit_seconds += time.perf_counter() - start
+                start = time.perf_counter()
+                predictor = load_fast_predictor(model)
+                if predictor is None:
+                    raise ValueError("model is not supported by FastPredictor")
+                forecast = make_forecast(predictor, horizon)
+                predict_seconds += time.perf_counter() - start
+            except Exception as e:
+                errors.append(f"{series.commodities[i]} at {series.markets[i]}: {e}")
+                continue
+            yhat[row] = forecast['yhat'].to_numpy()
+            sd[row] = _residual_sd(predictor, frame)
+
+    elif model_type == "pooled":
+        frames = [series.frame(i, cutoff) for i in ids]
+        start = time.perf_counter()
+        pooled = PooledModel.fit((series.commodities[i], series.markets[i], frame)
+                                 for i, frame in zip(ids, frames))
+        fit_seconds = time.perf_counter() - start
+        for row, (i, frame) in enumerate(zip(ids, frames)):
+            start = time.perf_counter()
+            predictor = pooled.predictor(series.commodities[i], series.markets[i])
+            forecast = predictor.forecast(horizon)
+            predict_seconds += time.perf_counter() - start
+            if forecast is not None:
+                yhat[row] = forecast['yhat'].to_numpy()
+            sd[row] = _residual_sd(predictor, frame)
+
+    elif model_type == "baseline":
+        prices = series.window(ids, cutoff, HISTORY_DAYS)
+        start = time.perf_counter()
+        method, level, trend, phi, error, season = fit_matrix(prices)
+        fit_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        yhat = extrapolate_matrix(method, level, trend, phi, season, horizon)
+        predict_seconds = time.perf_counter() - start
+        sd = error * MAE_TO_SD
+
+    else:
+        raise ValueError(f"Unknown model type: {model_type}")
+
+    return {'model': model_type, 'cutoff': cutoff, 'ids': ids, 'yhat': yhat, 'sd': sd,
+            'fit_seconds': fit_seconds, 'predict_seconds': predict_seconds, 'errors': errors}
+
+
+# ---------- backtest ----------
+class Backtester:
+    """Rolling-origin evaluation of every model type on the pairs of
+    ModelTrainer.load_and_prepare.
+
+    Each cutoff is a fold: every model is fitted on each pair's history up
+    to the cutoff (the series are prepared once and sliced per fold) and
+    forecasts the longest horizon; MAPE, MAE and interval coverage are then
+    scored over the first h days for every requested horizon h. Folds fan
+    out over a process pool: pooled and baseline fit a whole fold in one
+    task, Prophet folds are split into chunks of PROPHET_CHUNK pairs.
+
+    Intervals are yhat +/- z * sd * sqrt(step) with `sd` the spread of
+    the model's own training residuals (the one-step error for the
+    baseline), so coverage shows how far each model's in-sample fit
+    understates its forecast error.
+    """
+
+    def __init__(self, trainer=None, model_types=MODEL_TYPES, horizons=HORIZONS,
+                 n_cutoffs=N_CUTOFFS, period_days=PERIOD_DAYS, cutoffs=None, interval_width=INTERVAL_WIDTH):
+        unknown = set(model_types) - set(MODEL_TYPES)
+        if unknown:
+            raise ValueError(f"Unknown model types: {', '.join(sorted(unknown))}")
+        self.trainer = trainer or ModelTrainer()
+        self.model_types = list(model_types)
+        self.horizons = sorted(set(int(h) for h in horizons))
+        self.n_cutoffs = n_cutoffs
+        self.period_days = period_days
+        # explicit cutoff dates override n_cutoffs / period_days
+        self.cutoffs = cutoffs
+        self.interval_width = interval_width
+
+    def cutoff_days(self, series):
+        """Cutoffs as days since the epoch, oldest first. By default the
+        last one leaves the longest horizon before the latest date."""
+        if self.cutoffs:
+            return sorted(int(np.datetime64(pd.Timestamp(c).date(), 'D').astype(np.int64)) for c in self.cutoffs)
+        last = int(series.last_days.max()) - max(self.horizons)
+        return [last - k * self.period_days for k in reversed(range(self.n_cutoffs))]
+
+    def tasks(self, series):
+        horizon = max(self.horizons)
+        for cutoff in self.cutoff_days(series):
+            ids = series.eligible(cutoff, horizon, self.trainer.min_records)
+            if not len(ids):
+                print(f"⚠️ No pair has {self.trainer.min_records} days before and {horizon} days after "
+                      f"{np.datetime64(cutoff, 'D')}")
+                continue
+            for model_type in self.model_types:
+                chunk = PROPHET_CHUNK if model_type == "prophet" else len(ids)
+                for lo in range(0, len(ids), chunk):
+                    yield model_type, cutoff, horizon, ids[lo:lo + chunk]
+
+    def run(self, workers=1, commodities=None, markets=None):
+        """Backtest and return the report (see `build_report`), or None without data."""
+        started = time.perf_counter()
+        series = SeriesCache.from_trainer(self.trainer, commodities, markets)
+        if not len(series):
+            print("❌ No data to backtest.")
+            return None
+        prepare_seconds = time.perf_counter() - started
+
+        # Prophet tasks are the slowest: submit them first to keep the pool busy
+        tasks = sorted(self.tasks(series), key=lambda task: task[0] != "prophet")
+        results = []
+        if workers is None or workers <= 1:
+            _init_backtest_worker(series)
+            for task in tasks:
+                results.append(run_fold(*task))
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_backtest_worker,
+                                     initargs=(series,)) as pool:
+                futures = [pool.submit(run_fold, *task) for task in tasks]
+                for future in as_completed(futures):
+                    results.append(future.result())
+        for result in results:
+            for error in result['errors']:
+                print(f"❌ {result['model']} fold {np.datetime64(result['cutoff'], 'D')}: {error}")
+
+        report = self.build_report(series, results)
+        report['run'].update(workers=workers or 1, prepare_seconds=prepare_seconds,
+                             wall_seconds=time.perf_counter() - started)
+        return report
+
+    # ---------- scoring ----------
+    def build_report(self, series, results):
+        """Per model type: fit / predict cost and MAPE, MAE and coverage for
+        every horizon; plus one row per model, pair and cutoff."""
+        z = NormalDist().inv_cdf(0.5 + self.interval_width / 2)
+        steps = np.arange(1, max(self.horizons) + 1)
+        models, pairs = [], []
+        for model_type in self.model_types:
+            fold_results = [r for r in results if r['model'] == model_type]
+            if not fold_results:
+                continue
+            ape, error, covered = [], [], []
+            for result in sorted(fold_results, key=lambda r: (r['cutoff'], r['ids'][0])):
+                ok = np.isfinite(result['yhat']).all(axis=1)
+                ids, yhat, sd = result['ids'][ok], result['yhat'][ok], result['sd'][ok]
+                actual = series.actual(ids, result['cutoff'], len(steps))
+                half_width = z * sd[:, None] * np.sqrt(steps)
+                ape.append(np.abs(yhat - actual) / np.maximum(np.abs(actual), 1e-9) * 100)
+                error.append(np.abs(yhat - actual))
+                covered.append(np.abs(yhat - actual) <= half_width)
+                for row, i in enumerate(ids):
+                    pair = {'model': model_type, 'commodity': series.commodities[i], 'market': series.markets[i],
+                            'cutoff': str(np.datetime64(result['cutoff'], 'D')),
+                            'train_rows': int(result['cutoff'] - series.first_days[i] + 1)}
+                    for h in self.horizons:
+                        pair[f'mape_{h}d'] = float(ape[-1][row, :h].mean())
+                    pair['coverage'] = float(covered[-1][row].mean())
+                    pairs.append(pair)
+            ape, error, covered = np.vstack(ape), np.vstack(error), np.vstack(covered)
+
+            forecasts = len(ape)
+            fit_seconds = sum(r['fit_seconds'] for r in fold_results)
+            predict_seconds = sum(r['predict_seconds'] for r in fold_results)
+            models.append({
+                'model': model_type,
+                'forecasts': forecasts,
+                'failed': sum(int((~np.isfinite(r['yhat']).all(axis=1)).sum()) for r in fold_results),
+                'fit_seconds': fit_seconds,
+                'predict_seconds': predict_seconds,
+                'fit_ms_per_pair': fit_seconds / max(forecasts, 1) * 1000,
+                'predict_ms_per_pair': predict_seconds / max(forecasts, 1) * 1000,
+                'horizons': [{'horizon': h,
+                              'mape': float(ape[:, :h].mean()) if forecasts else None,
+                              'mae': float(error[:, :h].mean()) if forecasts else None,
+                              'coverage': float(covered[:, :h].mean()) if forecasts else None}
+                             for h in self.horizons],
+            })
+
+        cutoffs = sorted({r['cutoff'] for r in results})
+        return {
+            'run': {
+                'pairs': len(series),
+                'cutoffs': [str(np.datetime64(c, 'D')) for c in cutoffs],
+                'horizons': self.horizons,
+                'interval_width': self.interval_width,
+            },
+            'models': models,
+            'pairs': pairs,
+        }
+
+    def report_path(self):
+        return os.path.join(self.trainer.models_dir, BACKTEST_NAME)
+
+
+def write_report(report, path):
+    """Write the report as JSON at `path` and the pair rows as CSV next to it."""
+    csv_path = os.path.splitext(path)[0] + ".csv"
+    try:
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+        with open(csv_path, "w", newline="") as f:
+            columns = list(report['pairs'][0]) if report['pairs'] else ['model', 'commodity', 'market', 'cutoff']
+            writer = csv.DictWriter(f, fieldnames=columns)
+            writer.writeheader()
+            writer.writerows(report['pairs'])
+    except OSError as e:
+        print(f"⚠️ Could not write backtest report {path}: {e}")
+        return None
+    return path, csv_path
+
+
+def print_summary(report):
+    run = report['run']
+    print(f"\n⏱️ Backtest: {run['pairs']} pairs, {len(run['cutoffs'])} cutoffs "
+          f"({', '.join(run['cutoffs'])}) in {run['wall_seconds']:.1f}s "
+          f"({run['workers']} worker{'s' if run['workers'] != 1 else ''})")
+    header = "".join(f" {f'mape_{h}d':>9} {f'cov_{h}d':>7}" for h in run['horizons'])
+    print(f"   {'model':<9} {'forecasts':>9} {'fit_ms':>9} {'predict_ms':>10}{header}")
+    for model in report['models']:
+        cells = "".join(f" {h['mape']:8.2f}% {h['coverage'] * 100:6.1f}%" if h['mape'] is not None
+                        else f" {'-':>9} {'-':>7}" for h in model['horizons'])
+        print(f"   {model['model']:<9} {model['forecasts']:>9} {model['fit_ms_per_pair']:9.2f} "
+              f"{model['predict_ms_per_pair']:10.3f}{cells}")
+    print(f"   fit_ms / predict_ms are per pair and fold; coverage of the "
+          f"{run['interval_width'] * 100:.0f}% interval")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Rolling-origin backtest of the forecasting models")
+    parser.add_argument("--models", nargs="+", choices=MODEL_TYPES, default=list(MODEL_TYPES))
+    parser.add_argument("--horizons", nargs="+", type=int, default=list(HORIZONS),
+                        help="score the first H forecast days for each H (default: %(default)s)")
+    parser.add_argument("--cutoffs", type=int, default=N_CUTOFFS,
+                        help="number of rolling cutoffs (default: %(default)s)")
+    parser.add_argument("--period", type=int, default=PERIOD_DAYS,
+                        help="days between cutoffs (default: %(default)s)")
+    parser.add_argument("--cutoff-dates", nargs="+", default=None, metavar="DATE",
+                        help="explicit cutoff dates (YYYY-MM-DD) instead of --cutoffs/--period")
+    parser.add_argument("--interval-width", type=float, default=INTERVAL_WIDTH)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of backtest processes (default: 1, serial)")
+    parser.add_argument("--partitions", default=None,
+                        help="stream the datasets into this partitioned directory and read from it")
+    parser.add_argument("--commodities", nargs="+", default=None, help="only these commodities")
+    parser.add_argument("--markets", nargs="+", default=None,
+                        help="only these markets (normalized names, e.g. Azadpur_APMC)")
+    parser.add_argument("--output", default=None,
+                        help=f"report path (default: <models_dir>/{BACKTEST_NAME})")
+    args = parser.parse_args()
+
+    backtester = Backtester(ModelTrainer(partitions_dir=args.partitions), model_types=args.models,
+                            horizons=args.horizons, n_cutoffs=args.cutoffs, period_days=args.period,
+                            cutoffs=args.cutoff_dates, interval_width=args.interval_width)
+    report = backtester.run(args.workers, args.commodities, args.markets)
+    if report is not None:
+        print_summary(report)
+        os.makedirs(backtester.trainer.models_dir, exist_ok=True)
+        written = write_report(report, args.output or backtester.report_path())
+        if written:
+            print(f"✅ Backtest report written to {written[0]} and {written[1]}")
@@ -0,0 +1,158 @@
+import os
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from src.prediction.fast_predict import load_fast_predictor
+from src.prediction.forecast import make_forecast
+from src.prediction.pooled_model import (
+    CHANGEPOINT_PENALTY, DEVIATION_PENALTY, N_CHANGEPOINTS, POOLED_MODEL_NAME, PooledModel,
+)
+from src.training.train_model import ModelTrainer
+
+HOLDOUT_DAYS = 30
+COMPARISON_NAME = "pooled_comparison.csv"
+
+
+class PooledTrainer:
+    """Fits one PooledModel for every pair, alongside ModelTrainer's
+    per-pair Prophet models.
+
+    Data loading and daily resampling are ModelTrainer's, so both engines
+    see exactly the same series; `compare` fits both on the same history
+    and scores them on a holdout window.
+    """
+
+    def __init__(self, trainer=None, n_changepoints=N_CHANGEPOINTS,
+                 changepoint_penalty=CHANGEPOINT_PENALTY, deviation_penalty=DEVIATION_PENALTY):
+        self.trainer = trainer or ModelTrainer()
+        self.n_changepoints = n_changepoints
+        self.changepoint_penalty = changepoint_penalty
+        self.deviation_penalty = deviation_penalty
+
+    def model_path(self):
+        return os.path.join(self.trainer.models_dir, POOLED_MODEL_NAME)
+
+    def prepared_series(self, df):
+        """(commodity, market, merged) for every usable pair."""
+        for commodity, market, count, merged, reason in self.trainer.iter_prepared_pairs(df):
+            if merged is None:
+                print(f"⚠️ {reason}")
+                continue
+            yield commodity, market, merged
+
+    def fit(self, series):
+        return PooledModel.fit(series, n_changepoints=self.n_changepoints,
+                               changepoint_penalty=self.changepoint_penalty,
+                               deviation_penalty=self.deviation_penalty)
+
+    def train(self, commodities=None, markets=None):
+        """Fit the pooled model on every pair and save it next to the
+        per-pair models. Returns the model, or None without data."""
+        df = self.trainer.load_and_prepare(commodities, markets)
+        if df.empty:
+            print("❌ No data to train on.")
+            return None
+
+        start = time.perf_counter()
+        model = self.fit(self.prepared_series(df))
+        elapsed = time.perf_counter() - start
+
+        os.makedirs(self.trainer.models_dir, exist_ok=True)
+        # write-then-rename so servers never load a half-written model
+        tmp_path = self.model_path() + ".tmp"
+        joblib.dump(model, tmp_path)
+        os.replace(tmp_path, self.model_path())
+        print(f"\n✅ Pooled model for {len(model)} pairs fitted in {elapsed:.2f}s → {self.model_path()}")
+        return model
+
+    # ---------- accuracy against the per-pair engine ----------
+    def compare(self, holdout_days=HOLDOUT_DAYS, commodities=None, markets=None):
+        """Fit both engines on each pair's history minus the last
+        `holdout_days` days and score their forecasts of those days.
+
+        Returns a DataFrame with one row per pair (MAE and MAPE per engine)
+        and prints the totals and fit times.
+        """
+        df = self.trainer.load_and_prepare(commodities, markets)
+        train, test = [], {}
+        for commodity, market, merged in self.prepared_series(df):
+            if len(merged) - holdout_days < self.trainer.min_records:
+                print(f"⚠️ Not enough history to hold out {holdout_days} days for {commodity} at {market}")
+                continue
+            train.append((commodity, market, merged.iloc[:-holdout_days].reset_index(drop=True)))
+            test[(commodity, market)] = merged['y'].to_numpy()[-holdout_days:]
+        if not train:
+            print("❌ No pairs to compare.")
+            return pd.DataFrame()
+
+        start = time.perf_counter()
+        pooled = self.fit(train)
+        pooled_seconds = time.perf_counter() - start
+
+        rows = []
+        prophet_seconds = 0.0
+        for commodity, market, history in train:
+            actual = test[(commodity, market)]
+            start = time.perf_counter()
+            model = self.trainer.build_model(len(history))
+            model.fit(history[['ds', 'y', 'buffer_stock_qty_kg']])
+            prophet_seconds += time.perf_counter() - start
+            forecasts = {'prophet': make_forecast(load_fast_predictor(model) or model, holdout_days),
+                         'pooled': pooled.predictor(commodity, market).forecast(holdout_days)}
+            failed = [engine for engine, forecast in forecasts.items() if forecast is None]
+            if failed:
+                print(f"⚠️ Skipping {commodity} at {market}: {', '.join(failed)} forecast failed")
+                continue
+
+            row = {'commodity': commodity, 'market': market, 'train_rows': len(history)}
+            for engine, forecast in forecasts.items():
+                error = np.abs(forecast['yhat'].to_numpy() - actual)
+                row[f'{engine}_mae'] = float(error.mean())
+                row[f'{engine}_mape'] = float((error / np.maximum(np.abs(actual), 1e-9)).mean() * 100)
+            rows.append(row)
+
+        if not rows:
+            print("❌ No pair could be forecast by both engines.")
+            return pd.DataFrame()
+        results = pd.DataFrame(rows)
+        print(f"\n{'engine':>8} {'fit_seconds':>12} {'mean_mae':>9} {'mean_mape':>10} {'pairs_better':>13}")
+        for engine, seconds, other in (('prophet', prophet_seconds, 'pooled'), ('pooled', pooled_seconds, 'prophet')):
+            better = int((results[f'{engine}_mae'] < results[f'{other}_mae']).sum())
+            print(f"{engine:>8} {seconds:12.2f} {results[f'{engine}_mae'].mean():9.3f} "
+                  f"{results[f'{engine}_mape'].mean():9.2f}% {better:>13}")
+        return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Fit one pooled model across all commodity/market pairs")
+    parser.add_argument("--partitions", default=None,
+                        help="stream the datasets into this partitioned directory and train from it")
+    parser.add_argument("--commodities", nargs="+", default=None, help="train only these commodities")
+    parser.add_argument("--markets", nargs="+", default=None,
+                        help="train only these markets (normalized names, e.g. Azadpur_APMC)")
+    parser.add_argument("--n-changepoints", type=int, default=N_CHANGEPOINTS)
+    parser.add_argument("--changepoint-penalty", type=float, default=CHANGEPOINT_PENALTY)
+    parser.add_argument("--deviation-penalty", type=float, default=DEVIATION_PENALTY,
+                        help="shrinkage of each commodity's seasonality towards the shared one")
+    parser.add_argument("--compare", type=int, nargs="?", const=HOLDOUT_DAYS, default=None, metavar="DAYS",
+                        help="instead of training, score pooled vs per-pair Prophet on the last DAYS days "
+                             f"(default: {HOLDOUT_DAYS}) and write {COMPARISON_NAME}")
+    args = parser.parse_args()
+
+    pooled_trainer = PooledTrainer(ModelTrainer(partitions_dir=args.partitions),
+                                   n_changepoints=args.n_changepoints,
+                                   changepoint_penalty=args.changepoint_penalty,
+                                   deviation_penalty=args.deviation_penalty)
+    if args.compare is not None:
+        comparison = pooled_trainer.compare(args.compare, args.commodities, args.markets)
+        if not comparison.empty:
+            path = os.path.join(pooled_trainer.trainer.models_dir, COMPARISON_NAME)
+            comparison.to_csv(path, index=False)
+            print(f"✅ Per-pair comparison written to {path}")
+    else:
+        pooled_trainer.train(args.commodities, args.markets)
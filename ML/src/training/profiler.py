@@ -0,0 +1,227 @@
+import os
+import re
+import csv
+import json
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+
+PROFILE_NAME = "training_profile.json"
+# per-pair stages in the order they run; "prophet" is Prophet.fit minus Stan
+PAIR_STAGES = ["warm_start", "build", "prophet", "stan", "save"]
+RUN_STAGES = ["load", "prepare", "train", "finalize"]
+SLOWEST_PAIRS = 10
+
+# iteration rows of CmdStan's optimize output: L-BFGS/BFGS tables and Newton lines
+_LBFGS_ITER = re.compile(r"^\s*(\d+)\s+-?[\d.]+(?:e[-+]?\d+)?\s", re.IGNORECASE)
+_NEWTON_ITER = re.compile(r"^\s*Iteration\s+(\d+)\.")
+
+
+# ---------- measuring ----------
+class Stopwatch:
+    """Wall time accumulated per named stage."""
+
+    def __init__(self):
+        self.seconds = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] = self.seconds.get(name, 0.0) + time.perf_counter() - start
+
+    def timed_iter(self, name, iterable):
+        """Yield from `iterable`, charging the time spent producing items to `name`."""
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+
+def stage(watch, name):
+    """`watch.stage(name)`, or a no-op when profiling is off (`watch` is None)."""
+    return watch.stage(name) if watch is not None else nullcontext()
+
+
+@contextmanager
+def timed_stan(model, watch):
+    """Charge the Stan optimization inside `model.fit` to the "stan" stage.
+
+    The backend's fit is wrapped on the instance only for the duration of
+    the block, so the pickled model is unchanged. No-op without a `watch`.
+    """
+    if watch is None:
+        yield
+        return
+    backend = model.stan_backend
+    fit = backend.fit
+
+    def timed_fit(*args, **kwargs):
+        with watch.stage("stan"):
+            return fit(*args, **kwargs)
+
+    backend.fit = timed_fit
+    try:
+        yield
+    finally:
+        del backend.fit
+
+
+def stan_stats(model):
+    """{algorithm, iterations} of the model's last Stan optimization, read
+    from CmdStan's console output; empty when it is not available."""
+    fit = getattr(model, "stan_fit", None)
+    try:
+        paths = fit.runset.stdout_files
+    except AttributeError:
+        return {}
+    algorithm, iterations = None, None
+    for path in paths:
+        try:
+            with open(path) as f:
+                for line in f:
+                    if algorithm is None and line.strip().startswith("algorithm ="):
+                        algorithm = line.split("=", 1)[1].split()[0]
+                    match = _NEWTON_ITER.match(line) or _LBFGS_ITER.match(line)
+                    if match:
+                        iterations = int(match.group(1))
+        except OSError:
+            continue
+    return {"algorithm": algorithm, "iterations": iterations}
+
+
+def reset_peak_rss():
+    """Reset the peak RSS counter where the kernel allows it (Linux); returns
+    False when peaks can only grow for the life of the process."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB, or None where it cannot be read."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource     # Unix only
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+# ---------- report ----------
+def _pair_row(result):
+    profile = result.get("profile") or {}
+    row = {
+        "commodity": result["commodity"],
+        "market": result["market"],
+        "status": result["status"],
+        "raw_rows": profile.get("raw_rows"),
+        "rows": result.get("rows"),
+        "n_changepoints": profile.get("n_changepoints"),
+        "algorithm": profile.get("algorithm"),
+        "stan_iterations": profile.get("iterations"),
+        "warm_started": result.get("warm_started"),
+        "total_seconds": profile.get("total_seconds"),
+    }
+    for name in PAIR_STAGES:
+        row[f"{name}_seconds"] = profile.get("seconds", {}).get(name)
+    row["peak_rss_mb"] = profile.get("peak_rss_mb")
+    return row
+
+
+def build_profile(results, run_seconds, workers):
+    """Run report: run-level stage times, one row per fitted pair and fit
+    time grouped by number of changepoints."""
+    pairs = sorted((_pair_row(r) for r in results if r.get("profile")),
+                   key=lambda row: -row["total_seconds"])
+    stage_totals = {name: sum(row[f"{name}_seconds"] or 0.0 for row in pairs) for name in PAIR_STAGES}
+
+    by_changepoints = {}
+    for row in pairs:
+        group = by_changepoints.setdefault(row["n_changepoints"], [])
+        group.append(row)
+    changepoints = []
+    for n, group in sorted(by_changepoints.items(), key=lambda item: (item[0] is None, item[0])):
+        fit_seconds = [(row["prophet_seconds"] or 0.0) + (row["stan_seconds"] or 0.0) for row in group]
+        iterations = [row["stan_iterations"] for row in group if row["stan_iterations"] is not None]
+        changepoints.append({
+            "n_changepoints": n,
+            "pairs": len(group),
+            "mean_fit_seconds": sum(fit_seconds) / len(group),
+            "max_fit_seconds": max(fit_seconds),
+            "mean_stan_iterations": sum(iterations) / len(iterations) if iterations else None,
+            "mean_rows": sum(row["rows"] or 0 for row in group) / len(group),
+        })
+
+    return {
+        "run": {
+            "workers": workers,
+            "pairs_fitted": len(pairs),
+            "wall_seconds": sum(run_seconds.values()),
+            "stages": {name: run_seconds.get(name, 0.0) for name in RUN_STAGES},
+            "pair_stage_totals": stage_totals,
+        },
+        "by_changepoints": changepoints,
+        "pairs": pairs,
+    }
+
+
+def write_profile(profile, path):
+    """Write the report as JSON at `path` and the pair rows as CSV next to it."""
+    csv_path = os.path.splitext(path)[0] + ".csv"
+    try:
+        with open(path, "w") as f:
+            json.dump(profile, f, indent=2)
+        with open(csv_path, "w", newline="") as f:
+            columns = list(_pair_row({"commodity": None, "market": None, "status": None}))
+            writer = csv.DictWriter(f, fieldnames=columns)
+            writer.writeheader()
+            writer.writerows(profile["pairs"])
+    except OSError as e:
+        print(f"⚠️ Could not write training profile {path}: {e}")
+        return None
+    return path, csv_path
+
+
+def print_summary(profile, top=SLOWEST_PAIRS):
+    run = profile["run"]
+    print(f"\n⏱️ Training profile: {run['pairs_fitted']} pairs fitted in {run['wall_seconds']:.1f}s "
+          f"({run['workers']} worker{'s' if run['workers'] != 1 else ''})")
+    print("   run:   " + ", ".join(f"{name} {seconds:.1f}s" for name, seconds in run["stages"].items()))
+    print("   pairs: " + ", ".join(f"{name} {seconds:.1f}s" for name, seconds in run["pair_stage_totals"].items()))
+
+    if profile["pairs"]:
+        print(f"\n   Slowest {min(top, len(profile['pairs']))} pairs:")
+        print(f"   {'commodity':<16} {'market':<24} {'rows':>6} {'cp':>3} {'iters':>6} "
+              f"{'stan_s':>7} {'save_s':>7} {'total_s':>8} {'peak_mb':>8}")
+        for row in profile["pairs"][:top]:
+            cells = {k: "-" if row[k] is None else row[k] for k in ("rows", "n_changepoints", "stan_iterations")}
+            print(f"   {str(row['commodity'])[:16]:<16} {str(row['market'])[:24]:<24} {cells['rows']:>6} "
+                  f"{cells['n_changepoints']:>3} {cells['stan_iterations']:>6} {row['stan_seconds'] or 0:7.2f} "
+                  f"{row['save_seconds'] or 0:7.2f} {row['total_seconds']:8.2f} {row['peak_rss_mb'] or 0:8.0f}")
+
+    if profile["by_changepoints"]:
+        print("\n   Fit time by n_changepoints:")
+        for group in profile["by_changepoints"]:
+            iters = group["mean_stan_iterations"]
+            iters = f"{iters:.0f}" if iters is not None else "-"
+            print(f"   {group['n_changepoints']:>4}: {group['pairs']:>5} pairs, "
+                  f"mean {group['mean_fit_seconds']:.2f}s, max {group['max_fit_seconds']:.2f}s, "
+                  f"mean iterations {iters}")
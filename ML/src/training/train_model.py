@@ -3,7 +3,20 @@ import joblib
 import pandas as pd
 import numpy as np
 from prophet import Prophet
+import json
+import time
 import warnings
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from src.prediction.compact_model import COMPACT_SUFFIX, export_compact, load_compact
+from src.prediction.fast_predict import FastPredictor
+from src.preprocessing.keys import (
+    canonical_commodities, canonical_market, canonical_markets, file_part, model_basename,
+)
+from src.storage.model_store import TRAINING_MANIFEST_NAME, ModelStore
+from src.storage.partition_store import PartitionStore
+from src.training import profiler
 
 warnings.filterwarnings("ignore")
 
@@ -14,46 +27,145 @@ MODELS_DIR = r"D:\avfs303_backend\saved_models"
 
 MIN_RECORDS = 20
 DEFAULT_BUFFER_STOCK = 5000
+TRAINING_REPORT_NAME = "training_report.json"
+# "pickle" (full Prophet object), "compact" (see src.prediction.compact_model) or "both"
+MODEL_FORMAT = "pickle"
+# published runs whose models stay in the model store after a training run
+KEEP_STORE_RUNS = 2
+
+# streaming loader: rows per CSV chunk, the expected date format (others are
+# parsed by inference) and the columns read from each dataset with their dtypes
+CHUNK_ROWS = 250_000
+DATE_FORMAT = "%Y-%m-%d"
+MAIN_DTYPES = {
+    'date': str, 'commodity': 'category', 'commodity_name': 'category',
+    'market': 'category', 'centre_name': 'category', 'market_name': 'category',
+    'modal_price': 'float64', 'price': 'float64', 'price_retail': 'float64', 'max_price': 'float64',
+    'buffer_stock_qty_kg': 'float64',
+}
+WAREHOUSE_DTYPES = {
+    'entry_date': str, 'date': str, 'commodity': 'category', 'commodity_name': 'category',
+    'location': 'category', 'modal_price': 'float64', 'price': 'float64', 'modalprice': 'float64',
+    'modal price': 'float64', 'quantity_mt': 'float64',
+}
 
 os.makedirs(MODELS_DIR, exist_ok=True)
 
 
+def parse_dates(values):
+    """Dates in DATE_FORMAT, falling back to inference for other spellings."""
+    dates = pd.to_datetime(values, format=DATE_FORMAT, errors='coerce')
+    retry = dates.isna() & values.notna()
+    if retry.any():
+        dates[retry] = pd.to_datetime(values[retry].astype(str), errors='coerce', format='mixed')
+    return dates
+
+
+def concat_categorical(frames, columns):
+    """Concatenate frames, keeping `columns` categorical over the sorted union
+    of their categories."""
+    if not frames:
+        return pd.DataFrame(columns=['date', 'commodity', 'market', 'price', 'buffer_stock_qty_kg'])
+    frames = list(frames)
+    for col in columns:
+        categories = sorted(set().union(*(f[col].cat.categories for f in frames)))
+        frames = [f.assign(**{col: f[col].cat.set_categories(categories)}) for f in frames]
+    return pd.concat(frames, ignore_index=True)
+
+
 class ModelTrainer:
     def __init__(self,
                  main_path=MAIN_DATA_PATH,
                  warehouse_path=WAREHOUSE_DATA_PATH,
                  models_dir=MODELS_DIR,
                  min_records=MIN_RECORDS,
-                 default_buffer=DEFAULT_BUFFER_STOCK):
+                 default_buffer=DEFAULT_BUFFER_STOCK,
+                 model_format=MODEL_FORMAT,
+                 model_store=None,
+                 partitions_dir=None,
+                 profile=False,
+                 keep_runs=KEEP_STORE_RUNS):
+        if model_format not in ("pickle", "compact", "both"):
+            raise ValueError(f"Unknown model format: {model_format}")
         self.main_path = main_path
         self.warehouse_path = warehouse_path
         self.models_dir = models_dir
         self.min_records = min_records
         self.default_buffer = default_buffer
+        self.model_format = model_format
+        # path of a ModelStore; when set, models go there instead of loose files
+        self.model_store = model_store
+        self.keep_runs = keep_runs
+        self._store = None
+        # directory of a PartitionStore; when set, training reads pairs from it
+        self.partitions_dir = partitions_dir
+        # record per-pair stage timings and write a profile report (see profiler.py)
+        self.profile = profile
+
+    def __getstate__(self):
+        # workers open their own store; SQLite connections do not cross processes
+        state = self.__dict__.copy()
+        state['_store'] = None
+        return state
+
+    @property
+    def store(self):
+        """The ModelStore at `model_store`, opened once per process."""
+        if self._store is None:
+            self._store = ModelStore(self.model_store)
+        return self._store
 
     # ---------- helpers ----------
     @staticmethod
     def safe_market_name(raw_market):
-        if pd.isna(raw_market):
-            return "Unknown_APMC"
-        m = str(raw_market).strip().replace("/", "_").replace(" ", "_")
-        if not m.upper().endswith("APMC"):
-            m = m + "_APMC"
-        return m
+        return canonical_market(raw_market)
 
     @staticmethod
     def safe_filename(name: str):
-        return str(name).replace(" ", "_").replace("/", "_")
+        return file_part(name)
 
     # ---------- load datasets ----------
-    def load_main_dataset(self):
+    @staticmethod
+    def read_csv_chunks(path, dtypes, chunk_rows=CHUNK_ROWS, tolerant=False):
+        """Yield DataFrames of `path` with stripped, lower-case column names.
+
+        Only columns named in `dtypes` (normalized name -> dtype) are read,
+        with those dtypes. With `tolerant`, numeric columns are read as text
+        so malformed values can be coerced to NaN by the caller instead of
+        failing the parse. `chunk_rows=None` reads the whole file at once
+        with pandas' type inference (the original loader, kept for
+        benchmarking).
+        """
+        if chunk_rows is None:
+            df = pd.read_csv(path)
+            df.columns = df.columns.str.strip().str.lower()
+            yield df
+            return
+        header = pd.read_csv(path, nrows=0).columns
+        names = {raw: raw.strip().lower() for raw in header}
+        usecols = [raw for raw in header if names[raw] in dtypes]
+        types = {}
+        for raw in usecols:
+            dtype = dtypes[names[raw]]
+            types[raw] = object if tolerant and dtype == 'float64' else dtype
+        for chunk in pd.read_csv(path, usecols=usecols, dtype=types, chunksize=chunk_rows):
+            yield chunk.rename(columns=names)
+
+    def main_chunks(self, chunk_rows=CHUNK_ROWS, tolerant=False):
         if not os.path.exists(self.main_path):
             print(f"❌ Main dataset missing: {self.main_path}")
-            return pd.DataFrame(columns=['date', 'commodity', 'market', 'price', 'buffer_stock_qty_kg'])
+            return
+        for chunk in self.read_csv_chunks(self.main_path, MAIN_DTYPES, chunk_rows, tolerant):
+            yield self.normalize_main_chunk(chunk)
 
-        df = pd.read_csv(self.main_path)
-        df.columns = df.columns.str.strip().str.lower()
+    def warehouse_chunks(self, chunk_rows=CHUNK_ROWS, tolerant=False):
+        # Warehouse dataset likely has no price; we will try to parse and skip rows without price
+        if not os.path.exists(self.warehouse_path):
+            return
+        for chunk in self.read_csv_chunks(self.warehouse_path, WAREHOUSE_DTYPES, chunk_rows, tolerant):
+            yield self.normalize_warehouse_chunk(chunk)
 
+    def normalize_main_chunk(self, df):
         # unify columns
         # prefer modal_price but allow alternate names
         price_col = None
@@ -70,7 +182,7 @@ class ModelTrainer:
 
         # normalize other columns
         if 'date' in df.columns:
-            df['date'] = pd.to_datetime(df['date'], errors='coerce', infer_datetime_format=True)
+            df['date'] = parse_dates(df['date'])
         else:
             df['date'] = pd.NaT
 
@@ -98,19 +210,12 @@ class ModelTrainer:
         df = df.dropna(subset=['date', 'commodity', 'market'])
         return df
 
-    def load_warehouse_dataset(self):
-        # Warehouse dataset likely has no price; we will try to parse and skip rows without price
-        if not os.path.exists(self.warehouse_path):
-            return pd.DataFrame(columns=['date', 'commodity', 'market', 'price', 'buffer_stock_qty_kg'])
-
-        df = pd.read_csv(self.warehouse_path)
-        df.columns = df.columns.str.strip().str.lower()
-
+    def normalize_warehouse_chunk(self, df):
         # entry_date -> date
         if 'entry_date' in df.columns:
-            df['date'] = pd.to_datetime(df['entry_date'], errors='coerce', infer_datetime_format=True)
+            df['date'] = parse_dates(df['entry_date'])
         elif 'date' in df.columns:
-            df['date'] = pd.to_datetime(df['date'], errors='coerce', infer_datetime_format=True)
+            df['date'] = parse_dates(df['date'])
         else:
             df['date'] = pd.NaT
 
@@ -146,41 +251,324 @@ class ModelTrainer:
         df = df.dropna(subset=['date', 'commodity', 'market', 'price'])
         return df
 
-    # ---------- merge and normalize ----------
-    def load_and_prepare(self):
-        main = self.load_main_dataset()
-        ware = self.load_warehouse_dataset()
-        combined = pd.concat([main, ware], ignore_index=True, sort=False)
+    @staticmethod
+    def read_all(chunks, chunk_rows=CHUNK_ROWS):
+        """list(chunks(chunk_rows)), re-read tolerantly if a numeric column holds text."""
+        try:
+            return list(chunks(chunk_rows))
+        except ValueError as e:
+            print(f"⚠️ Malformed numbers in the dataset ({e}); re-reading with coercion")
+            return list(chunks(chunk_rows, tolerant=True))
+
+    def load_main_dataset(self, chunk_rows=CHUNK_ROWS):
+        frames = self.read_all(self.main_chunks, chunk_rows)
+        if not frames:
+            return pd.DataFrame(columns=['date', 'commodity', 'market', 'price', 'buffer_stock_qty_kg'])
+        return pd.concat(frames, ignore_index=True)
 
-        if combined.empty:
-            print("❌ Combined dataset is empty after loading.")
-            return combined
+    def load_warehouse_dataset(self, chunk_rows=CHUNK_ROWS):
+        frames = self.read_all(self.warehouse_chunks, chunk_rows)
+        if not frames:
+            return pd.DataFrame(columns=['date', 'commodity', 'market', 'price', 'buffer_stock_qty_kg'])
+        return pd.concat(frames, ignore_index=True)
 
+    # ---------- merge and normalize ----------
+    def prepare_chunk(self, df):
+        """Normalize commodity/market names (once per distinct value, as
+        categoricals) and drop rows missing required values."""
+        df = df.copy()
         # normalize commodity and market strings
-        combined['commodity'] = combined['commodity'].astype(str).str.strip()
-        combined['market'] = combined['market'].astype(str).apply(self.safe_market_name)
+        df['commodity'] = canonical_commodities(df['commodity'])
+        df['market'] = canonical_markets(df['market'])
 
         # ensure price numeric
-        combined['price'] = pd.to_numeric(combined['price'], errors='coerce')
+        df['price'] = pd.to_numeric(df['price'], errors='coerce')
+        df['buffer_stock_qty_kg'] = df['buffer_stock_qty_kg'].astype(np.float64)
 
         # drop rows missing required
-        combined = combined.dropna(subset=['date', 'commodity', 'market', 'price'])
+        return df.dropna(subset=['date', 'commodity', 'market', 'price'])
+
+    def prepared_chunks(self, chunk_rows=CHUNK_ROWS, tolerant=False):
+        """Prepared chunks of the main then the warehouse dataset."""
+        for chunk in self.main_chunks(chunk_rows, tolerant):
+            yield self.prepare_chunk(chunk)
+        for chunk in self.warehouse_chunks(chunk_rows, tolerant):
+            yield self.prepare_chunk(chunk)
+
+    def source_signature(self):
+        """Identity of the input files, recorded in the partition store."""
+        signature = []
+        for path in (self.main_path, self.warehouse_path):
+            if os.path.exists(path):
+                st = os.stat(path)
+                signature.append([os.path.abspath(path), st.st_size, st.st_mtime_ns])
+        return signature
+
+    def build_partitions(self, chunk_rows=CHUNK_ROWS, force=False):
+        """Stream both datasets into the partition store unless it is
+        already built from the current files. Returns the store."""
+        store = PartitionStore(self.partitions_dir)
+        source = self.source_signature()
+        if not force and store.is_current(source):
+            return store
+        try:
+            rows = store.write(self.prepared_chunks(chunk_rows), source=source)
+        except ValueError as e:
+            print(f"⚠️ Malformed numbers in the dataset ({e}); re-reading with coercion")
+            rows = store.write(self.prepared_chunks(chunk_rows, tolerant=True), source=source)
+        print(f"✅ Partitioned {rows} rows into {len(store.partitions())} pairs at {self.partitions_dir}")
+        return store
+
+    def load_and_prepare(self, commodities=None, markets=None, chunk_rows=CHUNK_ROWS):
+        """Combined training rows sorted by date, optionally only some pairs.
+
+        Datasets are streamed in chunks with explicit dtypes; commodity and
+        market come back as categoricals. With a partition store configured
+        only the partitions of the requested pairs are read from disk.
+        """
+        if self.partitions_dir:
+            combined = self.build_partitions(chunk_rows).read(commodities, markets)
+        else:
+            frames = [f for f in self.read_all(self.prepared_chunks, chunk_rows) if len(f)]
+            if commodities is not None:
+                frames = [f[f['commodity'].isin(commodities)] for f in frames]
+            if markets is not None:
+                frames = [f[f['market'].isin(markets)] for f in frames]
+            combined = concat_categorical(frames, ['commodity', 'market'])
+
+        if combined.empty:
+            print("❌ Combined dataset is empty after loading.")
+            return combined
 
         # sort
-        combined = combined.sort_values('date').reset_index(drop=True)
+        combined = combined.sort_values('date', kind='stable').reset_index(drop=True)
         return combined
 
-    # ---------- train pipeline ----------
-    def train_pipeline(self):
-        df = self.load_and_prepare()
-        if df.empty:
-            print("❌ No data to train on.")
+    # ---------- per-pair steps ----------
+    def prepare_pair(self, df, commodity, market):
+        """Daily-resampled training frame for one pair, or (None, reason) if unusable."""
+        # subset for this pair
+        subset = df[(df['commodity'] == commodity) & (df['market'] == market)].copy()
+        subset = subset.rename(columns={'date': 'ds', 'price': 'y', 'buffer_stock_qty_kg': 'buffer_stock_qty_kg'})
+
+        # ensure ds sorted
+        subset = subset.sort_values('ds').reset_index(drop=True)
+
+        # resample to daily frequency from min to max date
+        start = subset['ds'].min().normalize()
+        end = subset['ds'].max().normalize()
+        if pd.isna(start) or pd.isna(end) or start >= end:
+            return None, f"Bad date range for {commodity} at {market}. Skipping."
+
+        idx_range = pd.date_range(start=start, end=end, freq='D')
+        # create daily frame
+        daily = pd.DataFrame({'ds': idx_range})
+        # merge existing values into daily
+        merged = pd.merge(daily, subset[['ds', 'y', 'buffer_stock_qty_kg']], on='ds', how='left')
+
+        # fill buffer stock: forward fill then fill remaining with default
+        if 'buffer_stock_qty_kg' in merged.columns:
+            merged['buffer_stock_qty_kg'] = merged['buffer_stock_qty_kg'].ffill().bfill().fillna(self.default_buffer)
+        else:
+            merged['buffer_stock_qty_kg'] = self.default_buffer
+
+        # fill y by interpolation (linear), then forward/back fill as fallback
+        merged['y'] = pd.to_numeric(merged['y'], errors='coerce')
+        merged['y'] = merged['y'].interpolate(method='linear', limit_direction='both')
+        merged['y'] = merged['y'].ffill().bfill()
+
+        # drop rows still missing y
+        merged = merged.dropna(subset=['y'])
+        if len(merged) < self.min_records:
+            return None, f"After resampling, not enough points for {commodity} at {market} ({len(merged)}). Skipping."
+        return merged, None
+
+    @staticmethod
+    def build_model(n_rows):
+        # Configure Prophet - choose a stable number of changepoints relative to data size
+        n_changepoints = min(25, max(1, n_rows // 7))  # roughly one changepoint per week of data, capped at 25
+        m = Prophet(daily_seasonality=True, yearly_seasonality=True,
+                    n_changepoints=n_changepoints, changepoint_range=0.8)
+        # add regressor
+        m.add_regressor('buffer_stock_qty_kg')
+        return m
+
+    def model_path(self, commodity, market):
+        return os.path.join(self.models_dir, f"{model_basename(commodity, market)}.pkl")
+
+    def compact_path(self, commodity, market):
+        return self.model_path(commodity, market)[:-len(".pkl")] + COMPACT_SUFFIX
+
+    def has_model(self, commodity, market):
+        if self.model_store:
+            return self.store.lookup(commodity, market) is not None
+        return (os.path.exists(self.model_path(commodity, market))
+                or os.path.exists(self.compact_path(commodity, market)))
+
+    def previous_params(self, commodity, market):
+        """Warm-start values from the pair's existing model, if any."""
+        if self.model_store:
+            entry = self.store.lookup(commodity, market)
+            return self.warm_start_params(self.store.load(entry)) if entry else None
+        if os.path.exists(self.model_path(commodity, market)):
+            return self.warm_start_params(joblib.load(self.model_path(commodity, market)))
+        if os.path.exists(self.compact_path(commodity, market)):
+            return self.warm_start_params(load_compact(self.compact_path(commodity, market), mmap=False))
+        return None
+
+    def save_model(self, m, commodity, market):
+        """Persist a fitted model in the configured format; returns the primary path."""
+        saved_path = None
+        if self.model_format in ("pickle", "both"):
+            saved_path = self.model_path(commodity, market)
+            joblib.dump(m, saved_path)
+        if self.model_format in ("compact", "both"):
+            try:
+                compact = export_compact(m, self.compact_path(commodity, market))
+                saved_path = saved_path or compact
+            except ValueError as e:
+                if saved_path is None:
+                    # not representable as a compact bundle, keep the full model
+                    print(f"⚠️ Saving {commodity} at {market} as pickle: {e}")
+                    saved_path = self.model_path(commodity, market)
+                    joblib.dump(m, saved_path)
+        return saved_path
+
+    @staticmethod
+    def warm_start_params(model):
+        """Stan init values taken from a previously fitted model."""
+        if isinstance(model, FastPredictor):
+            # compact models carry no sigma_obs; Prophet keeps its default for it
+            return {'k': model.k, 'm': model.m,
+                    'delta': np.array(model.deltas), 'beta': np.array(model.beta)}
+        res = {}
+        for pname in ['k', 'm', 'sigma_obs']:
+            res[pname] = float(np.asarray(model.params[pname]).ravel()[0])
+        for pname in ['delta', 'beta']:
+            res[pname] = np.asarray(model.params[pname])[0]
+        return res
+
+    def fit_and_save(self, commodity, market, merged, warm_start=False):
+        """Fit and persist one pair. Returns a result dict for the run report.
+
+        With `warm_start`, Stan is initialised from the pair's existing model
+        (Prophet falls back to its default init for parameters whose shape
+        changed, e.g. a different number of changepoints). With profiling on,
+        the result carries a 'profile' dict of stage timings and Stan stats.
+        """
+        result = {'commodity': commodity, 'market': market, 'rows': len(merged),
+                  'last_date': merged['ds'].max().strftime('%Y-%m-%d'), 'warm_started': False}
+        watch = profiler.Stopwatch() if self.profile else None
+        if watch is not None:
+            profiler.reset_peak_rss()
+            started = time.perf_counter()
+            result['profile'] = {}
+        try:
+            self._fit_and_save(commodity, market, merged, warm_start, result, watch)
+        finally:
+            if watch is not None:
+                seconds = watch.seconds
+                # Prophet.fit includes the Stan call; keep only its own share
+                seconds['prophet'] = seconds.pop('fit', 0.0) - seconds.get('stan', 0.0)
+                result['profile'].update(seconds=seconds, total_seconds=time.perf_counter() - started,
+                                         peak_rss_mb=profiler.peak_rss_mb())
+        return result
+
+    def _fit_and_save(self, commodity, market, merged, warm_start, result, watch):
+        fit_kwargs = {}
+        if warm_start and self.has_model(commodity, market):
+            try:
+                with profiler.stage(watch, 'warm_start'):
+                    fit_kwargs['init'] = self.previous_params(commodity, market)
+                result['warm_started'] = True
+            except Exception as e:
+                print(f"⚠️ Cold start for {commodity} at {market}, previous model unusable: {e}")
+        try:
+            with profiler.stage(watch, 'build'):
+                m = self.build_model(len(merged))
+            # fit
+            with profiler.stage(watch, 'fit'), profiler.timed_stan(m, watch):
+                m.fit(merged[['ds', 'y', 'buffer_stock_qty_kg']], **fit_kwargs)
+        except Exception as e:
+            result.update(status='failed', reason=f"Failed to train model for {commodity} at {market}: {e}")
+            return
+        if watch is not None:
+            result['profile'].update(n_changepoints=int(m.n_changepoints), **profiler.stan_stats(m))
+
+        if self.model_store:
+            # serialized here, written to the store by the coordinating process
+            with profiler.stage(watch, 'save'):
+                payload = ModelStore.serialize(m)
+            result.update(status='saved', path=f"{self.model_store}#{commodity}/{market}", payload=payload)
             return
 
+        # save model
+        try:
+            with profiler.stage(watch, 'save'):
+                model_path = self.save_model(m, commodity, market)
+        except Exception as e:
+            result.update(status='failed', reason=f"Failed to save model for {commodity} at {market}: {e}")
+            return
+        result.update(status='saved', path=model_path)
+
+    def write_report(self, results, report_path=None):
+        """Write the per-pair success/skip/failure summary as JSON."""
+        report_path = report_path or os.path.join(self.models_dir, TRAINING_REPORT_NAME)
+        results = sorted(results, key=lambda r: (r['commodity'], r['market']))
+        summary = {
+            'total_pairs': len(results),
+            'saved': sum(r['status'] == 'saved' for r in results),
+            'skipped': sum(r['status'] == 'skipped' for r in results),
+            'failed': sum(r['status'] == 'failed' for r in results),
+            'unchanged': sum(r['status'] == 'unchanged' for r in results),
+            'pairs': results,
+        }
+        try:
+            with open(report_path, 'w') as f:
+                json.dump(summary, f, indent=2, default=str)
+        except OSError as e:
+            print(f"⚠️ Could not write training report {report_path}: {e}")
+        return summary
+
+    # ---------- manifest (last-seen date per pair) ----------
+    def manifest_path(self):
+        return os.path.join(self.models_dir, TRAINING_MANIFEST_NAME)
+
+    @staticmethod
+    def manifest_key(commodity, market):
+        return f"{commodity}|{market}"
+
+    def load_manifest(self):
+        try:
+            with open(self.manifest_path()) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Ignoring unreadable training manifest: {e}")
+            return {}
+
+    def save_manifest(self, manifest):
+        # write-then-rename so a crash never leaves a truncated manifest
+        tmp_path = self.manifest_path() + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path())
+
+    def is_up_to_date(self, manifest, commodity, market, merged):
+        entry = manifest.get(self.manifest_key(commodity, market))
+        if not entry or not self.has_model(commodity, market):
+            return False
+        return entry.get('last_date', '') >= merged['ds'].max().strftime('%Y-%m-%d')
+
+    # ---------- train pipeline ----------
+    def iter_prepared_pairs_masked(self, df):
+        """Per-pair reference path: one boolean-mask subset and merge per pair.
+
+        Kept for benchmarking and cross-checking `iter_prepared_pairs`.
+        """
         # group by normalized commodity & market
-        pairs = df.groupby(['commodity', 'market']).size().reset_index(name='count')
-        total_pairs = len(pairs)
-        saved = 0
+        pairs = df.groupby(['commodity', 'market'], observed=True).size().reset_index(name='count')
 
         for idx, row in pairs.iterrows():
             commodity = row['commodity']
@@ -188,73 +576,301 @@ class ModelTrainer:
             count = int(row['count'])
 
             if count < self.min_records:
-                print(f"⚠️ Skipping {commodity} at {market}: only {count} records (need >= {self.min_records})")
+                yield commodity, market, count, None, \
+                    f"Skipping {commodity} at {market}: only {count} records (need >= {self.min_records})"
                 continue
 
-            # subset for this pair
-            subset = df[(df['commodity'] == commodity) & (df['market'] == market)].copy()
-            subset = subset.rename(columns={'date': 'ds', 'price': 'y', 'buffer_stock_qty_kg': 'buffer_stock_qty_kg'})
-
-            # ensure ds sorted
-            subset = subset.sort_values('ds').reset_index(drop=True)
+            merged, reason = self.prepare_pair(df, commodity, market)
+            yield commodity, market, count, merged, reason
+
+    def iter_prepared_pairs(self, df):
+        """Yield (commodity, market, count, merged, skip_reason) for every pair.
+
+        Vectorized equivalent of `iter_prepared_pairs_masked`: all pairs are
+        resampled to daily rows, buffer-filled and linearly interpolated in
+        one grouped pass, so preparation is O(rows) instead of O(pairs x rows).
+        Pairs come out in the same (commodity, market) order with the same
+        values; rows sharing a date keep their input order.
+        """
+        grouped = df.groupby(['commodity', 'market'], sort=True, observed=True)
+        group_ids = grouped.ngroup().to_numpy()
+        counts = grouped.size()
+        keys = counts.index
+        counts = counts.to_numpy()
+        n_groups = len(counts)
+
+        dates = df['date'].to_numpy(dtype='datetime64[ns]')
+        days = dates.astype('datetime64[D]')
+        start = np.full(n_groups, np.datetime64('NaT'), dtype='datetime64[D]')
+        end = start.copy()
+        if len(df):
+            order = np.lexsort((days, group_ids))
+            first = np.r_[0, np.flatnonzero(np.diff(group_ids[order])) + 1]
+            last = np.r_[first[1:] - 1, len(order) - 1]
+            start[group_ids[order][first]] = days[order][first]
+            end[group_ids[order][last]] = days[order][last]
+
+        enough = counts >= self.min_records
+        eligible = enough & (start < end)
+
+        # -- daily grid per eligible group, laid out contiguously --
+        span = np.where(eligible, (end - start).astype(np.int64) + 1, 0)
+        grid_offset = np.r_[0, np.cumsum(span)[:-1]]
+
+        # only rows falling exactly on a grid date survive the left merge
+        on_grid = eligible[group_ids] & (dates == days.astype('datetime64[ns]'))
+        row_group = group_ids[on_grid]
+        row_day = (days[on_grid] - start[row_group]).astype(np.int64)
+        present = np.zeros(span.sum(), dtype=bool)
+        present[grid_offset[row_group] + row_day] = True
+
+        missing = np.flatnonzero(~present)
+        miss_group = np.repeat(np.arange(n_groups), span)[missing]
+        miss_day = missing - grid_offset[miss_group]
+
+        all_group = np.concatenate([row_group, miss_group])
+        all_day = np.concatenate([row_day, miss_day])
+        y = np.concatenate([df['price'].to_numpy(dtype=float)[on_grid],
+                            np.full(len(missing), np.nan)])
+        buffer = np.concatenate([df['buffer_stock_qty_kg'].to_numpy(dtype=float)[on_grid],
+                                 np.full(len(missing), np.nan)])
+        order = np.lexsort((all_day, all_group))  # stable: duplicates keep input order
+        all_group, all_day, y, buffer = all_group[order], all_day[order], y[order], buffer[order]
+
+        by_group = pd.Series(all_group)
+
+        # fill buffer stock: forward fill then back fill within pair, then default
+        buffer = pd.Series(buffer).groupby(by_group).ffill()
+        buffer = buffer.groupby(by_group).bfill().fillna(self.default_buffer).to_numpy()
+
+        # linear interpolation by position within pair (matches Series.interpolate)
+        valid = ~np.isnan(y)
+        pos = np.arange(len(y), dtype=float)
+        known_pos = pd.Series(np.where(valid, pos, np.nan))
+        known_y = pd.Series(y)
+        prev_pos = known_pos.groupby(by_group).ffill().to_numpy()
+        prev_y = known_y.groupby(by_group).ffill().to_numpy()
+        next_pos = known_pos.groupby(by_group).bfill().to_numpy()
+        next_y = known_y.groupby(by_group).bfill().to_numpy()
+
+        between = ~valid & ~np.isnan(prev_pos) & ~np.isnan(next_pos)
+        slope = (next_y[between] - prev_y[between]) / (next_pos[between] - prev_pos[between])
+        y[between] = slope * (pos[between] - prev_pos[between]) + prev_y[between]
+        # outside the known range the edge value is carried (limit_direction='both')
+        leading = ~valid & np.isnan(prev_pos)
+        y[leading] = next_y[leading]
+        trailing = ~valid & ~between & ~leading
+        y[trailing] = prev_y[trailing]
+
+        # drop rows still missing y
+        keep = ~np.isnan(y)
+        all_group, all_day, y, buffer = all_group[keep], all_day[keep], y[keep], buffer[keep]
+        bounds = np.searchsorted(all_group, np.arange(n_groups + 1))
+
+        for g, (commodity, market) in enumerate(keys):
+            count = int(counts[g])
+            if not enough[g]:
+                yield commodity, market, count, None, \
+                    f"Skipping {commodity} at {market}: only {count} records (need >= {self.min_records})"
+                continue
+            if not eligible[g]:
+                yield commodity, market, count, None, f"Bad date range for {commodity} at {market}. Skipping."
+                continue
 
-            # resample to daily frequency from min to max date
-            start = subset['ds'].min().normalize()
-            end = subset['ds'].max().normalize()
-            if pd.isna(start) or pd.isna(end) or start >= end:
-                print(f"⚠️ Bad date range for {commodity} at {market}. Skipping.")
+            lo, hi = bounds[g], bounds[g + 1]
+            if hi - lo < self.min_records:
+                yield commodity, market, count, None, \
+                    f"After resampling, not enough points for {commodity} at {market} ({hi - lo}). Skipping."
                 continue
 
-            idx_range = pd.date_range(start=start, end=end, freq='D')
-            # create daily frame
-            daily = pd.DataFrame({'ds': idx_range})
-            # merge existing values into daily
-            merged = pd.merge(daily, subset[['ds', 'y', 'buffer_stock_qty_kg']], on='ds', how='left')
+            merged = pd.DataFrame({
+                'ds': (start[g] + all_day[lo:hi]).astype('datetime64[ns]'),
+                'y': y[lo:hi],
+                'buffer_stock_qty_kg': buffer[lo:hi],
+            })
+            yield commodity, market, count, merged, None
+
+    def train_pipeline(self, workers=1, report_path=None, incremental=False, commodities=None, markets=None,
+                       profile_path=None):
+        """Train every pair; `workers` > 1 fits pairs in a process pool.
+
+        Each worker process runs Stan single-threaded. Results stream back as
+        pairs finish and the same set of .pkl files is written as in the
+        serial path. Returns the run summary written to `report_path`.
+
+        With `incremental`, pairs whose latest date is already recorded in
+        the training manifest are left untouched and the rest are refit
+        warm-started from their previous model.
+
+        `commodities` / `markets` restrict training to those pairs (only
+        their partitions are read when a partition store is configured).
+
+        With profiling on (`self.profile`), per-pair stage timings, peak
+        memory and Stan iteration counts are written to `profile_path`
+        (JSON, plus a CSV of the pairs) and the slowest pairs are printed.
+        """
+        watch = profiler.Stopwatch() if self.profile else None
+        with profiler.stage(watch, 'load'):
+            df = self.load_and_prepare(commodities, markets)
+        if df.empty:
+            print("❌ No data to train on.")
+            return
 
-            # fill buffer stock: forward fill then fill remaining with default
-            if 'buffer_stock_qty_kg' in merged.columns:
-                merged['buffer_stock_qty_kg'] = merged['buffer_stock_qty_kg'].ffill().bfill().fillna(self.default_buffer)
-            else:
-                merged['buffer_stock_qty_kg'] = self.default_buffer
+        total_pairs = df.groupby(['commodity', 'market'], observed=True).ngroups
+        results = []
+        saved = 0
 
-            # fill y by interpolation (linear), then forward/back fill as fallback
-            merged['y'] = pd.to_numeric(merged['y'], errors='coerce')
-            merged['y'] = merged['y'].interpolate(method='linear', limit_direction='both')
-            merged['y'] = merged['y'].ffill().bfill()
+        manifest = self.load_manifest()
+        store = self.store if self.model_store else None
+        run_id = store.begin_run("incremental" if incremental else "full") if store is not None else None
 
-            # drop rows still missing y
-            merged = merged.dropna(subset=['y'])
-            if len(merged) < self.min_records:
-                print(f"⚠️ After resampling, not enough points for {commodity} at {market} ({len(merged)}). Skipping.")
-                continue
+        raw_rows = {}
 
-            # Configure Prophet - choose a stable number of changepoints relative to data size
-            n_changepoints = min(25, max(1, len(merged) // 7))  # roughly one changepoint per week of data, capped at 25
-            try:
-                m = Prophet(daily_seasonality=True, yearly_seasonality=True,
-                            n_changepoints=n_changepoints, changepoint_range=0.8)
-                # add regressor
-                m.add_regressor('buffer_stock_qty_kg')
+        def record(result):
+            nonlocal saved
+            results.append(result)
+            if 'profile' in result:
+                result['profile']['raw_rows'] = raw_rows.get((result['commodity'], result['market']))
+            if 'payload' in result:
+                store.put_payload(run_id, result['commodity'], result['market'], *result.pop('payload'))
+            if result['status'] == 'saved':
+                saved += 1
+                print(f"Saved: {result['path']} ({saved}/{total_pairs})")
+                manifest[self.manifest_key(result['commodity'], result['market'])] = {
+                    'commodity': result['commodity'],
+                    'market': result['market'],
+                    'last_date': result['last_date'],
+                    'rows': result['rows'],
+                    'model_file': None if store is not None else os.path.basename(result['path']),
+                }
+            elif result['status'] == 'unchanged':
+                pass
+            elif result['status'] == 'skipped':
+                print(f"⚠️ {result['reason']}")
+            else:
+                print(f"❌ {result['reason']}")
+
+        def to_fit():
+            pairs = self.iter_prepared_pairs(df)
+            if watch is not None:
+                pairs = watch.timed_iter('prepare', pairs)
+            for commodity, market, count, merged, reason in pairs:
+                raw_rows[(commodity, market)] = count
+                if merged is None:
+                    record({'commodity': commodity, 'market': market, 'rows': count,
+                            'status': 'skipped', 'reason': reason})
+                elif incremental and self.is_up_to_date(manifest, commodity, market, merged):
+                    record({'commodity': commodity, 'market': market, 'rows': len(merged),
+                            'status': 'unchanged'})
+                else:
+                    yield commodity, market, merged
+
+        train_started = time.perf_counter()
+        try:
+            if workers is None or workers <= 1:
+                for commodity, market, merged in to_fit():
+                    record(self.fit_and_save(commodity, market, merged, warm_start=incremental))
+            else:
+                with ProcessPoolExecutor(max_workers=workers, initializer=_init_training_worker) as pool:
+                    in_flight = {}   # future -> (commodity, market, rows)
+
+                    def collect(futures):
+                        for future in futures:
+                            commodity, market, rows = in_flight.pop(future)
+                            try:
+                                record(future.result())
+                            except Exception as e:
+                                record(_failed_result(commodity, market, rows, e))
+
+                    for commodity, market, merged in to_fit():
+                        # bound the number of prepared pairs held in memory
+                        while len(in_flight) >= workers * 2:
+                            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                            collect(finished)
+                        try:
+                            future = pool.submit(self.fit_and_save, commodity, market, merged, incremental)
+                        except BrokenProcessPool as e:
+                            record(_failed_result(commodity, market, len(merged), e))
+                            continue
+                        in_flight[future] = (commodity, market, len(merged))
+                    while in_flight:
+                        finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                        collect(finished)
+        except BaseException:
+            if store is not None:
+                # drop the staged models; readers keep the published run
+                store.abort(run_id)
+            raise
+        if watch is not None:
+            # pairs are prepared while fitting; keep the two apart
+            watch.seconds['train'] = time.perf_counter() - train_started - watch.seconds.get('prepare', 0.0)
+
+        with profiler.stage(watch, 'finalize'):
+            if store is not None:
+                # pairs not refit in this run keep their previous model
+                store.publish(run_id, carry_over=True)
+                store.prune(keep=self.keep_runs)
+            self.save_manifest(manifest)
+            summary = self.write_report(results, report_path)
+        if incremental:
+            unchanged = sum(r['status'] == 'unchanged' for r in results)
+            print(f"\n✅ Incremental Training Finished → {saved} models refit, {unchanged} up to date")
+        else:
+            print(f"\n✅ Training Finished → {saved} models saved out of {total_pairs}")
+        if watch is not None:
+            profile = profiler.build_profile(results, watch.seconds, workers or 1)
+            profiler.print_summary(profile)
+            written = profiler.write_profile(profile, profile_path or os.path.join(self.models_dir,
+                                                                                   profiler.PROFILE_NAME))
+            if written:
+                print(f"✅ Training profile written to {written[0]} and {written[1]}")
+        return summary
 
-                # fit
-                m.fit(merged[['ds', 'y', 'buffer_stock_qty_kg']])
-            except Exception as e:
-                print(f"❌ Failed to train model for {commodity} at {market}: {e}")
-                continue
 
-            # save model
-            safe_name = f"{self.safe_filename(commodity)}_{market}"
-            model_path = os.path.join(self.models_dir, f"{safe_name}.pkl")
-            try:
-                joblib.dump(m, model_path)
-                saved += 1
-                print(f"Saved: {model_path} ({saved}/{total_pairs})")
-            except Exception as e:
-                print(f"❌ Failed to save model for {commodity} at {market}: {e}")
+def _failed_result(commodity, market, rows, error):
+    """Result for a pair whose worker raised instead of returning a result."""
+    return {'commodity': commodity, 'market': market, 'rows': rows, 'status': 'failed',
+            'reason': f"Failed to train model for {commodity} at {market}: {error!r}"}
+
 
-        print(f"\n✅ Training Finished → {saved} models saved out of {total_pairs}")
+def _init_training_worker():
+    # keep each worker (and the Stan process it spawns) on a single thread
+    for var in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'STAN_NUM_THREADS'):
+        os.environ[var] = '1'
+    warnings.filterwarnings("ignore")
 
 
 if __name__ == "__main__":
-    trainer = ModelTrainer()
-    trainer.train_pipeline()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Train Prophet models per commodity/market pair")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of training processes (default: 1, serial)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="refit only pairs with new rows since the last run, warm-started")
+    parser.add_argument("--format", choices=["pickle", "compact", "both"], default=MODEL_FORMAT,
+                        help="model serialization format (default: %(default)s)")
+    parser.add_argument("--store", default=None,
+                        help="write models to this model store (SQLite file) instead of loose files")
+    parser.add_argument("--keep-runs", type=int, default=KEEP_STORE_RUNS,
+                        help="published runs kept in the model store (default: %(default)s)")
+    parser.add_argument("--partitions", default=None,
+                        help="stream the datasets into this partitioned directory and train from it")
+    parser.add_argument("--commodities", nargs="+", default=None, help="train only these commodities")
+    parser.add_argument("--markets", nargs="+", default=None,
+                        help="train only these markets (normalized names, e.g. Azadpur_APMC)")
+    parser.add_argument("--profile", nargs="?", const="", default=None, metavar="PATH",
+                        help="record per-pair stage timings to PATH (default: <models_dir>/training_profile.json)")
+    parser.add_argument("--materialize", action="store_true",
+                        help="precompute forecasts for changed models into the forecast cache afterwards")
+    args = parser.parse_args()
+
+    trainer = ModelTrainer(model_format=args.format, model_store=args.store, partitions_dir=args.partitions,
+                           profile=args.profile is not None, keep_runs=args.keep_runs)
+    trainer.train_pipeline(workers=args.workers, incremental=args.incremental,
+                           commodities=args.commodities, markets=args.markets,
+                           profile_path=args.profile or None)
+    if args.materialize:
+        from src.prediction.forecast_cache import materialize_forecasts
+        computed, skipped = materialize_forecasts(trainer.models_dir, workers=args.workers)
+        print(f"✅ Forecast cache: {computed} computed, {skipped} up to date")
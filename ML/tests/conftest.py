@@ -0,0 +1,5 @@
+import os
+import sys
+
+# tests import the ML code as `src.*`, the same way the scripts do when run from ML/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
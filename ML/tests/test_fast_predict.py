@@ -0,0 +1,31 @@
+import glob
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.prediction.fast_predict import verify_models
+
+SAVED_MODELS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "saved_models")
+
+
+def test_fast_predictor_matches_small_fitted_model(tmp_path):
+    prophet = pytest.importorskip("prophet")
+    days = pd.date_range("2024-01-01", periods=120, freq="D")
+    rng = np.random.default_rng(0)
+    prices = 100 + 0.2 * np.arange(len(days)) + 5 * np.sin(np.arange(len(days)) / 7) + rng.normal(0, 1, len(days))
+    model = prophet.Prophet(daily_seasonality=False, yearly_seasonality=False)
+    model.fit(pd.DataFrame({"ds": days, "y": prices}))
+    joblib.dump(model, tmp_path / "Test_Market.pkl")
+
+    results = verify_models(str(tmp_path))
+    assert [r[1] for r in results] == ['match']
+
+
+@pytest.mark.skipif(not glob.glob(os.path.join(SAVED_MODELS, "*.pkl")), reason="no saved models")
+def test_fast_predictor_matches_saved_models():
+    results = verify_models(SAVED_MODELS)
+    bad = [r for r in results if r[1] not in ('match', 'both_failed')]
+    assert results and not bad, f"FastPredictor disagrees with Prophet: {bad}"
@@ -1,34 +1,285 @@
+import os
 import csv
-from firebase_config import db
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+import threading
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 
-# Open the CSV file
-with open('commodity_dataset2.csv', 'r') as file:
-    reader = csv.DictReader(file)
-    
-    for row in reader:
-        # Skip rows where min_price, modal_price, or max_price are empty
-        if not row['min_price'] or not row['modal_price'] or not row['max_price']:
-            continue
+COLLECTION = "commodities"
+# bumped after every upload so cached readers (services/firebase_service.py) reload
+VERSION_COLLECTION = "meta"
+VERSION_DOCUMENT = "commodities"
 
-        # Convert price_date to datetime (MM/DD/YYYY)
+MAX_BATCH_SIZE = 500            # Firestore limit on writes per batched commit
+DEFAULT_WORKERS = 8
+MAX_RETRIES = 5
+DATE_FORMATS = ("%m/%d/%Y", "%Y-%m-%d")
+# fields that identify a price record; they determine its document id
+KEY_FIELDS = ("commodity", "variety", "grade", "state", "district", "market")
+
+
+def parse_date(value):
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except (TypeError, ValueError):
+            pass
+    return None
+
+
+def row_to_doc(row):
+    """Firestore document for a CSV row, or None if a price is missing."""
+    # Skip rows where min_price, modal_price, or max_price are empty
+    if not row['min_price'] or not row['modal_price'] or not row['max_price']:
+        return None
+    return {
+        "commodity": row['commodity'],
+        "variety": row['variety'],
+        "grade": row['grade'],
+        "min_price": float(row['min_price']),
+        "modal_price": float(row['modal_price']),
+        "max_price": float(row['max_price']),
+        "price_date": parse_date(row['date']),
+        "state": row['state'],
+        "district": row['district'],
+        "market": row['market']
+    }
+
+
+def document_id(row):
+    """Deterministic id from the record key and raw date, so re-uploads overwrite."""
+    key = "|".join([row.get(f, "") for f in KEY_FIELDS] + [row.get('date', "")])
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def iter_batches(csv_path, batch_size, skip_batches=0):
+    """Stream the CSV as (batch_index, [(doc_id, doc)]) without loading it whole."""
+    batch = []
+    index = 0
+    with open(csv_path, 'r', newline='') as file:
+        for row in csv.DictReader(file):
+            doc = row_to_doc(row)
+            if doc is None:
+                continue
+            batch.append((document_id(row), doc))
+            if len(batch) == batch_size:
+                if index >= skip_batches:
+                    yield index, batch
+                index += 1
+                batch = []
+    if batch and index >= skip_batches:
+        yield index, batch
+
+
+# ---------- checkpoint ----------
+class Checkpoint:
+    """Number of leading batches known to be committed, for resuming.
+
+    Batches finish out of order; only the contiguous prefix is persisted,
+    so a resumed run may rewrite a few batches (harmless with
+    deterministic ids) but never skips one.
+    """
+
+    def __init__(self, path, csv_path, batch_size):
+        self.path = path
+        st = os.stat(csv_path)
+        self.source = {"csv": os.path.abspath(csv_path), "size": st.st_size,
+                       "mtime_ns": st.st_mtime_ns, "batch_size": batch_size}
+        self.done_through = 0
+        self._pending = set()
+        self._lock = threading.Lock()
+        try:
+            with open(path) as f:
+                saved = json.load(f)
+            if saved.get("source") == self.source:
+                self.done_through = saved["done_through"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def mark_done(self, index):
+        with self._lock:
+            self._pending.add(index)
+            advanced = False
+            while self.done_through in self._pending:
+                self._pending.remove(self.done_through)
+                self.done_through += 1
+                advanced = True
+            if advanced:
+                self._save()
+
+    def _save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"source": self.source, "done_through": self.done_through}, f)
+        os.replace(tmp, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+# ---------- upload ----------
+def commit_batch(db, docs, retries=MAX_RETRIES):
+    """Write one batch with set() (idempotent), retrying with backoff."""
+    for attempt in range(retries + 1):
         try:
-            price_date = datetime.strptime(row['date'], '%m/%d/%Y')
-        except:
-            price_date = None
-
-        # Add row to Firestore
-        db.collection('commodities').add({
-            "commodity": row['commodity'],
-            "variety": row['variety'],
-            "grade": row['grade'],
-            "min_price": float(row['min_price']),
-            "modal_price": float(row['modal_price']),
-            "max_price": float(row['max_price']),
-            "price_date": price_date,
-            "state": row['state'],
-            "district": row['district'],
-            "market": row['market']
-        })
-
-print("All commodities uploaded successfully!")
+            batch = db.batch()
+            collection = db.collection(COLLECTION)
+            for doc_id, doc in docs:
+                batch.set(collection.document(doc_id), doc)
+            batch.commit()
+            return len(docs)
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = min(2 ** attempt * 0.5, 30)
+            print(f"⚠️ Batch commit failed ({e}); retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def upload(db, csv_path, batch_size=MAX_BATCH_SIZE, workers=DEFAULT_WORKERS,
+           checkpoint_path=None, restart=False):
+    """Upload every row of `csv_path`; returns the number of documents written."""
+    if not 1 <= batch_size <= MAX_BATCH_SIZE:
+        raise ValueError(f"batch_size must be between 1 and {MAX_BATCH_SIZE}")
+    checkpoint = Checkpoint(checkpoint_path or csv_path + ".upload_checkpoint.json", csv_path, batch_size)
+    if restart:
+        checkpoint.done_through = 0
+    if checkpoint.done_through:
+        print(f"↪️ Resuming after {checkpoint.done_through} committed batches")
+
+    written = 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        in_flight = {}
+        for index, docs in iter_batches(csv_path, batch_size, checkpoint.done_through):
+            # bound the number of batches held in memory
+            while len(in_flight) >= workers * 2:
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    written += future.result()
+                    checkpoint.mark_done(in_flight.pop(future))
+            in_flight[pool.submit(commit_batch, db, docs)] = index
+        for future in list(in_flight):
+            written += future.result()
+            checkpoint.mark_done(in_flight.pop(future))
+
+    db.collection(VERSION_COLLECTION).document(VERSION_DOCUMENT).set(
+        {"version": time.time_ns()}, merge=True)
+    checkpoint.clear()
+    elapsed = time.perf_counter() - started
+    print(f"✅ Uploaded {written} commodities in {elapsed:.1f}s ({written / max(elapsed, 1e-9):.0f} docs/s)")
+    return written
+
+
+# ---------- local fake ----------
+class FakeFirestore:
+    """Minimal stand-in for the Firestore client used by `upload`.
+
+    Documents go to a SQLite file with the same layout as
+    services.firebase_service.SQLiteSource reads, so uploads can be
+    read back by the cached API. `latency` is added to every commit to
+    mimic a network round trip.
+    """
+
+    def __init__(self, path, latency=0.0):
+        self.path = path
+        self.latency = latency
+        self.commits = 0
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS docs (id TEXT PRIMARY KEY, data TEXT NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def collection(self, name):
+        return _FakeCollection(self, name)
+
+    def batch(self):
+        return _FakeBatch(self)
+
+    def _write(self, writes):
+        if self.latency:
+            time.sleep(self.latency)
+        docs = [(ref.id, json.dumps(data, default=_encode_dates))
+                for ref, data in writes if ref.collection == COLLECTION]
+        with self._conn() as conn:
+            conn.executemany("INSERT OR REPLACE INTO docs VALUES (?, ?)", docs)
+            for ref, data in writes:
+                if ref.collection == VERSION_COLLECTION and "version" in data:
+                    conn.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (str(data["version"]),))
+        self.commits += 1
+
+    def count(self):
+        return self._conn().execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+
+class _FakeCollection:
+    def __init__(self, db, name):
+        self.db = db
+        self.name = name
+
+    def document(self, doc_id):
+        return _FakeDocument(self.db, self.name, doc_id)
+
+
+class _FakeDocument:
+    def __init__(self, db, collection, doc_id):
+        self.db = db
+        self.collection = collection
+        self.id = doc_id
+
+    def set(self, data, merge=False):
+        self.db._write([(self, data)])
+
+
+class _FakeBatch:
+    def __init__(self, db):
+        self.db = db
+        self.writes = []
+
+    def set(self, ref, data):
+        self.writes.append((ref, data))
+
+    def commit(self):
+        self.db._write(self.writes)
+
+
+def _encode_dates(value):
+    if isinstance(value, datetime):
+        return {"$date": value.isoformat()}
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk upload commodity prices to Firestore")
+    parser.add_argument("csv", nargs="?", default="commodity_dataset2.csv")
+    parser.add_argument("--batch-size", type=int, default=MAX_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="concurrent batch commits (default: %(default)s)")
+    parser.add_argument("--checkpoint", default=None,
+                        help="progress file (default: <csv>.upload_checkpoint.json)")
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    parser.add_argument("--fake", metavar="SQLITE_PATH", default=None,
+                        help="write to a local fake Firestore instead of the real one")
+    parser.add_argument("--fake-latency", type=float, default=0.0,
+                        help="seconds added to every fake commit")
+    args = parser.parse_args()
+
+    if args.fake:
+        db = FakeFirestore(args.fake, latency=args.fake_latency)
+    else:
+        from firebase_config import db
+
+    upload(db, args.csv, batch_size=args.batch_size, workers=args.workers,
+           checkpoint_path=args.checkpoint, restart=args.restart)
@@ -1,7 +1,10 @@
 from flask import Flask, jsonify, request
 from flask_cors import CORS
 from routes.auth_routes import auth_routes
-from firebase_config import db
+from services.firebase_service import get_commodity_cache
+from datetime import datetime
+import gzip
+import hashlib
 import random
 import pandas as pd
 
@@ -12,18 +15,78 @@ CORS(app)
 app.register_blueprint(auth_routes, url_prefix='/pricepulse')
 
 # Commodities API
+MAX_PAGE_SIZE = 5000
+GZIP_MIN_BYTES = 1024
+
+def query_list(name):
+    """Values of a query parameter given repeated and/or comma separated"""
+    values = []
+    for raw in request.args.getlist(name):
+        values.extend(v.strip() for v in raw.split(",") if v.strip())
+    return values
+
+def json_response(payload, etag):
+    """JSON response with an ETag (304 on match) and gzip when accepted"""
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+    else:
+        body = (app.json.dumps(payload()) + "\n").encode("utf-8")
+        use_gzip = "gzip" in request.accept_encodings and len(body) >= GZIP_MIN_BYTES
+        response = app.response_class(gzip.compress(body, compresslevel=6) if use_gzip else body,
+                                      mimetype="application/json")
+        if use_gzip:
+            response.headers["Content-Encoding"] = "gzip"
+    response.headers["Vary"] = "Accept-Encoding"
+    response.set_etag(etag, weak=True)
+    return response
+
 @app.route("/api/commodities", methods=["GET"])
 def get_commodities():
+    """
+    Query parameters (all optional, values may be comma separated):
+      commodity, market, state   exact match on any of the values
+      start_date, end_date       inclusive YYYY-MM-DD bounds on `price_date`
+      fields                     fields to return
+      limit, cursor              page size and the `next_cursor` of the previous page
+    Served from the cached collection snapshot (services.firebase_service).
+    """
     try:
-        collection_ref = db.collection("commodities")
-        docs = collection_ref.stream()
-        data = []
-        for doc in docs:
-            item = doc.to_dict()
-            for key in ["min_price", "modal_price", "max_price"]:
-                item[key] = float(item.get(key, 0))
-            data.append(item)
-        return jsonify({"success": True, "data": data})
+        filters = {field: query_list(field) for field in ("commodity", "market", "state") if query_list(field)}
+
+        try:
+            start_date = request.args.get("start_date")
+            end_date = request.args.get("end_date")
+            start = datetime.strptime(start_date, "%Y-%m-%d").date() if start_date else None
+            end = datetime.strptime(end_date, "%Y-%m-%d").date() if end_date else None
+        except ValueError:
+            return jsonify({"success": False, "error": "Dates must be YYYY-MM-DD"}), 400
+
+        fields = query_list("fields")
+        try:
+            limit = int(request.args["limit"]) if request.args.get("limit") else None
+        except ValueError:
+            return jsonify({"success": False, "error": "'limit' must be an integer"}), 400
+        cursor = request.args.get("cursor") or None
+        if limit is not None and not 1 <= limit <= MAX_PAGE_SIZE:
+            return jsonify({"success": False, "error": f"'limit' must be between 1 and {MAX_PAGE_SIZE}"}), 400
+
+        snapshot = get_commodity_cache().get()
+        query = app.json.dumps([snapshot.token, sorted(filters.items()), start_date, end_date,
+                                fields, limit, cursor])
+        etag = hashlib.sha1(query.encode("utf-8")).hexdigest()
+
+        def payload():
+            positions = snapshot.select(filters, start, end)
+            positions, next_cursor = snapshot.page(positions, cursor, limit)
+            records = [snapshot.records[p] for p in positions]
+            if fields:
+                records = [{f: r[f] for f in fields if f in r} for r in records]
+            result = {"success": True, "data": records}
+            if limit is not None:
+                result["next_cursor"] = next_cursor
+            return result
+
+        return json_response(payload, etag)
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
@@ -1,6 +1,5 @@
 from flask import Blueprint, request, jsonify
 from firebase_admin import auth, firestore
-from firebase_config import db
 import requests
 
 auth_routes = Blueprint('auth_routes', __name__)
@@ -14,6 +13,8 @@ def register_user():
     password = data.get("password")
 
     try:
+        from firebase_config import db
+
         # create user in firebase auth
         user = auth.create_user(email=email, password=password)
 
@@ -58,6 +59,7 @@ def login_user():
 
     if "idToken" in result:
         # On successful login, we also fetch user firestore data
+        from firebase_config import db
         user_id = result["localId"]
         user_doc = db.collection("users").document(user_id).get()
 
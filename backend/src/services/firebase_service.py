@@ -0,0 +1,268 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from bisect import bisect_right
+from datetime import date, datetime
+
+COMMODITIES_COLLECTION = "commodities"
+# document bumped by writers (e.g. upload_commodities.py) whenever the collection changes
+VERSION_COLLECTION = "meta"
+VERSION_DOCUMENT = "commodities"
+
+PRICE_FIELDS = ["min_price", "modal_price", "max_price"]
+INDEXED_FIELDS = ["commodity", "market", "state"]
+DEFAULT_PAGE_SIZE = 1000
+DEFAULT_TTL_SECONDS = 300
+
+
+# ---------- sources ----------
+class FirestoreSource:
+    """Reads the commodities collection in document-id order, page by page."""
+
+    def __init__(self, db, collection=COMMODITIES_COLLECTION):
+        self.db = db
+        self.collection = collection
+
+    def read_all(self, page_size=DEFAULT_PAGE_SIZE):
+        """Yield (doc_id, dict) for every document using paged queries."""
+        from google.cloud.firestore_v1.field_path import FieldPath
+
+        query = self.db.collection(self.collection).order_by(FieldPath.document_id()).limit(page_size)
+        last = None
+        while True:
+            page = list((query.start_after(last) if last is not None else query).stream())
+            for doc in page:
+                yield doc.id, doc.to_dict()
+            if len(page) < page_size:
+                return
+            last = page[-1]
+
+    def version(self):
+        """Writer-maintained collection version, or None if not tracked."""
+        doc = self.db.collection(VERSION_COLLECTION).document(VERSION_DOCUMENT).get()
+        return (doc.to_dict() or {}).get("version") if doc.exists else None
+
+
+class SQLiteSource:
+    """Local stand-in for FirestoreSource: documents as JSON rows in SQLite.
+
+    `latency` adds a sleep per page read, to mimic network round trips
+    when benchmarking.
+    """
+
+    def __init__(self, path, latency=0.0):
+        self.path = path
+        self.latency = latency
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS docs (id TEXT PRIMARY KEY, data TEXT NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def read_all(self, page_size=DEFAULT_PAGE_SIZE):
+        last = ""
+        with self._connect() as conn:
+            while True:
+                if self.latency:
+                    time.sleep(self.latency)
+                page = conn.execute("SELECT id, data FROM docs WHERE id > ? ORDER BY id LIMIT ?",
+                                    (last, page_size)).fetchall()
+                for doc_id, data in page:
+                    yield doc_id, json.loads(data, object_hook=_decode_dates)
+                if len(page) < page_size:
+                    return
+                last = page[-1][0]
+
+    def version(self):
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        return int(row[0]) if row else None
+
+    def put_many(self, docs):
+        """Upsert (doc_id, dict) pairs and bump the version."""
+        with self._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO docs VALUES (?, ?)",
+                             ((doc_id, json.dumps(data, default=_encode_dates)) for doc_id, data in docs))
+            conn.execute("INSERT INTO meta VALUES ('version', '1') "
+                         "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1")
+
+
+def _encode_dates(value):
+    if isinstance(value, (datetime, date)):
+        return {"$date": value.isoformat()}
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def _decode_dates(obj):
+    if len(obj) == 1 and "$date" in obj:
+        return datetime.fromisoformat(obj["$date"])
+    return obj
+
+
+# ---------- snapshot ----------
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, str):
+        try:
+            return datetime.strptime(value[:10], "%Y-%m-%d").date()
+        except ValueError:
+            return None
+    return None
+
+
+class CommoditySnapshot:
+    """Immutable in-memory copy of the collection, sorted by document id,
+    with value -> positions indexes on commodity, market and state."""
+
+    def __init__(self, docs, version, token):
+        docs = sorted(docs, key=lambda d: d[0])
+        self.ids = [doc_id for doc_id, _ in docs]
+        self.records = []
+        for _, item in docs:
+            for key in PRICE_FIELDS:
+                item[key] = float(item.get(key) or 0)
+            self.records.append(item)
+        self.dates = [_as_date(r.get("price_date")) for r in self.records]
+        self.indexes = {field: {} for field in INDEXED_FIELDS}
+        for pos, record in enumerate(self.records):
+            for field in INDEXED_FIELDS:
+                self.indexes[field].setdefault(record.get(field), []).append(pos)
+        self.version = version
+        # changes whenever a new snapshot is loaded; usable in ETags
+        self.token = token
+        self.loaded_at = time.time()
+
+    def select(self, filters=None, start=None, end=None):
+        """Ascending positions matching {field: [values]} and the inclusive
+        price_date range (datetime.date bounds)."""
+        positions = None
+        for field, values in (filters or {}).items():
+            matched = set()
+            for value in values:
+                matched.update(self.indexes[field].get(value, ()))
+            positions = matched if positions is None else positions & matched
+        positions = range(len(self.records)) if positions is None else sorted(positions)
+        if start is not None or end is not None:
+            positions = [p for p in positions
+                         if self.dates[p] is not None
+                         and (start is None or self.dates[p] >= start)
+                         and (end is None or self.dates[p] <= end)]
+        return list(positions)
+
+    def page(self, positions, cursor=None, limit=None):
+        """(positions, next_cursor): the page after document id `cursor`."""
+        if cursor is not None:
+            first = bisect_right(positions, cursor, key=lambda p: self.ids[p])
+            positions = positions[first:]
+        if limit is not None and len(positions) > limit:
+            positions = positions[:limit]
+            return positions, self.ids[positions[-1]]
+        return positions, None
+
+
+class CommodityCache:
+    """Read-through cache of the commodities collection.
+
+    The whole collection is loaded in pages into a CommoditySnapshot. After
+    `ttl` seconds the next `get` asks the source for its version and only
+    re-reads the collection when the version changed (or is not tracked).
+    Concurrent callers share one reload; the others keep the previous
+    snapshot until it is ready.
+    """
+
+    def __init__(self, source, ttl=DEFAULT_TTL_SECONDS, page_size=DEFAULT_PAGE_SIZE):
+        self.source = source
+        self.ttl = ttl
+        self.page_size = page_size
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._loads = 0
+
+    def get(self):
+        snapshot = self._snapshot
+        if snapshot is not None and time.time() - self._checked_at < self.ttl:
+            return snapshot
+        # only the first load blocks; during a refresh other callers keep the old snapshot
+        if not self._lock.acquire(blocking=snapshot is None):
+            return snapshot
+        try:
+            snapshot = self._snapshot
+            if snapshot is not None and time.time() - self._checked_at < self.ttl:
+                return snapshot
+            version = self.source.version()
+            if snapshot is None or version is None or version != snapshot.version:
+                self._loads += 1
+                self._snapshot = CommoditySnapshot(
+                    self.source.read_all(self.page_size), version, f"{version}-{self._loads}")
+            self._checked_at = time.time()
+            return self._snapshot
+        finally:
+            self._lock.release()
+
+    def invalidate(self):
+        """Force a version check on the next `get`."""
+        self._checked_at = 0.0
+
+
+_commodity_cache = None
+
+def get_commodity_cache():
+    """Process-wide CommodityCache.
+
+    Uses Firestore unless PRICEPULSE_COMMODITY_SOURCE=sqlite:<path> selects
+    the local SQLite stand-in; PRICEPULSE_COMMODITY_TTL overrides the TTL.
+    """
+    global _commodity_cache
+    if _commodity_cache is None:
+        spec = os.environ.get("PRICEPULSE_COMMODITY_SOURCE", "firestore")
+        if spec.startswith("sqlite:"):
+            source = SQLiteSource(spec[len("sqlite:"):])
+        else:
+            from firebase_config import db
+            source = FirestoreSource(db)
+        ttl = float(os.environ.get("PRICEPULSE_COMMODITY_TTL", DEFAULT_TTL_SECONDS))
+        _commodity_cache = CommodityCache(source, ttl=ttl)
+    return _commodity_cache
+
+
+if __name__ == "__main__":
+    # python services/firebase_service.py <commodity_dataset.csv> [page_latency_seconds]
+    import csv
+    import sys
+    import tempfile
+
+    if len(sys.argv) < 2:
+        print("Usage: python services/firebase_service.py <commodity_dataset.csv> [page_latency_seconds]")
+        sys.exit(1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = SQLiteSource(os.path.join(tmp, "commodities.sqlite"))
+        with open(sys.argv[1], newline="") as f:
+            source.put_many((f"{i:08d}", row) for i, row in enumerate(csv.DictReader(f)))
+        source.latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+
+        started = time.perf_counter()
+        rows = [dict(item, **{k: float(item.get(k) or 0) for k in PRICE_FIELDS})
+                for _, item in source.read_all()]
+        uncached = time.perf_counter() - started
+        print(f"Full read per request : {uncached * 1000:9.2f} ms ({len(rows)} docs)")
+
+        cache = CommodityCache(source, ttl=60)
+        started = time.perf_counter()
+        cache.get()
+        print(f"Cache cold load       : {(time.perf_counter() - started) * 1000:9.2f} ms")
+        started = time.perf_counter()
+        for _ in range(1000):
+            cache.get()
+        print(f"Cache hit             : {(time.perf_counter() - started) / 1000 * 1000:9.4f} ms")
+        cache.invalidate()
+        started = time.perf_counter()
+        cache.get()
+        print(f"TTL expiry, unchanged : {(time.perf_counter() - started) * 1000:9.2f} ms (version check only)")